@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+import pycparser
+import compare_main
+from services.synthetic_corpus import TRANSFORMATIONS, generate_corpus
+
+try:
+    import resource
+except ImportError:
+    # Windows: sem medição de memória
+    resource = None
+
+# Arquivo que marca a pasta como gerada pelo benchmark (só ela pode ser apagada)
+MARCADOR = ".benchmark"
+
+
+# -------------------------------
+# Medição
+# -------------------------------
+def memoria_pico_mb():
+    """Maior uso de memória (RSS) até agora do processo e dos processos filhos
+    já encerrados (pools de análise e comparação)."""
+    if resource is None:
+        return None
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    unidade = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "processo": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unidade, 1),
+        "filhos": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unidade, 1),
+    }
+
+
+class Fases:
+    """Tempo de cada fase em cada repetição e o pico de memória ao fim dela."""
+
+    def __init__(self):
+        self.tempos = {}
+        self.memoria = {}
+
+    def medir(self, nome, funcao, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        self.tempos.setdefault(nome, []).append(time.perf_counter() - inicio)
+        self.memoria[nome] = memoria_pico_mb()
+        return resultado
+
+    def resumo(self):
+        return {
+            nome: {
+                "segundos": [round(t, 4) for t in tempos],
+                "minimo": round(min(tempos), 4),
+                "mediana": round(statistics.median(tempos), 4),
+                "memoria_pico_mb": self.memoria[nome],
+            }
+            for nome, tempos in self.tempos.items()
+        }
+
+
+# -------------------------------
+# Corpus
+# -------------------------------
+def pasta_lista(lista):
+    base = os.path.dirname(__file__)
+    raiz = os.path.abspath(os.path.join(base, ".."))
+    return os.path.join(raiz, "Downloads", lista)
+
+
+def preparar_pasta(pasta):
+    if os.path.exists(pasta):
+        if not os.path.isfile(os.path.join(pasta, MARCADOR)):
+            raise SystemExit(
+                f"{pasta} já existe e não foi criada pelo benchmark; use outra --lista."
+            )
+        shutil.rmtree(pasta)
+    os.makedirs(pasta)
+    with open(os.path.join(pasta, MARCADOR), "w", encoding="utf-8") as f:
+        f.write("Pasta gerada por benchmark_main.py\n")
+
+
+def ler_arquivos(lista):
+    """Leitura e limpeza de todos os arquivos, sem a análise."""
+    submissions = os.path.join(pasta_lista(lista), "submissions")
+    codigos = []
+    for aluno in sorted(os.listdir(submissions)):
+        caminho_aluno = os.path.join(submissions, aluno)
+        for arquivo in sorted(os.listdir(caminho_aluno)):
+            with open(os.path.join(caminho_aluno, arquivo), "r", encoding="utf-8") as f:
+                codigo = f.read()
+            codigos.append(compare_main.remover_hashtag(compare_main.remover_comentarios(codigo)))
+    return codigos
+
+
+# -------------------------------
+# Qualidade
+# -------------------------------
+def avaliar(plantados, sinalizados):
+    """Precisão e recall dos pares sinalizados contra as cópias plantadas, e o
+    recall de cada transformação."""
+    acertos = sinalizados & plantados.keys()
+    por_transformacao = {}
+    for transformacao in TRANSFORMATIONS:
+        pares = {par for par, aplicadas in plantados.items() if transformacao in aplicadas}
+        por_transformacao[transformacao] = (
+            round(len(pares & acertos) / len(pares), 4) if pares else None
+        )
+    return {
+        "pares_plantados": len(plantados),
+        "pares_sinalizados": len(sinalizados),
+        "verdadeiros_positivos": len(acertos),
+        "precisao": round(len(acertos) / len(sinalizados), 4) if sinalizados else None,
+        "recall": round(len(acertos) / len(plantados), 4) if plantados else None,
+        "recall_por_transformacao": por_transformacao,
+    }
+
+
+def versao_codigo():
+    try:
+        resultado = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        return resultado.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# -------------------------------
+# Main
+# -------------------------------
+def ler_argumentos():
+    parser = argparse.ArgumentParser(
+        description="Mede o compare_main numa turma sintética com cópias plantadas "
+        "e grava o resultado em JSON."
+    )
+    parser.add_argument("--alunos", type=int, default=200)
+    parser.add_argument("--questoes", type=int, default=4)
+    parser.add_argument(
+        "--copias",
+        type=float,
+        default=0.1,
+        help="fração dos alunos de cada questão que copia de outro (padrão: 0.1)",
+    )
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument(
+        "--repeticoes",
+        type=int,
+        default=1,
+        help="quantas vezes medir cada fase (o corpus é gerado uma vez só)",
+    )
+    parser.add_argument("--motor", choices=compare_main.MOTORES, default="python")
+    parser.add_argument("--analisador", choices=compare_main.ANALISADORES, default="ast")
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument(
+        "--limiar-candidato", type=float, default=compare_main.LIMIAR_CANDIDATO
+    )
+    parser.add_argument("--top-k", type=int, default=compare_main.TOP_K)
+    parser.add_argument(
+        "--lista",
+        default="BENCHMARK",
+        help="pasta em Downloads onde a turma sintética é gerada (padrão: BENCHMARK)",
+    )
+    parser.add_argument(
+        "--manter", action="store_true", help="não apaga a turma sintética no fim"
+    )
+    parser.add_argument(
+        "--saida",
+        default=None,
+        help="arquivo JSON do resultado (padrão: Downloads/.benchmark/benchmark_<data>.json)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = ler_argumentos()
+    pasta = pasta_lista(args.lista)
+    fases = Fases()
+
+    preparar_pasta(pasta)
+    try:
+        plantados = fases.medir(
+            "geracao",
+            generate_corpus,
+            pasta,
+            students=args.alunos,
+            questions=args.questoes,
+            copy_rate=args.copias,
+            seed=args.semente,
+        )
+        for _ in range(args.repeticoes):
+            fases.medir("leitura", ler_arquivos, args.lista)
+            # Sem cache de assinaturas: mede a análise de verdade
+            alunos = fases.medir(
+                "carregamento",
+                compare_main.carregar_questoes,
+                args.lista,
+                None,
+                args.processos,
+                args.analisador,
+            )
+            pares = fases.medir(
+                "comparacao",
+                compare_main.comparar_questoes,
+                alunos,
+                args.limiar_candidato,
+                motor=args.motor,
+                processos=args.processos,
+                top_k=args.top_k,
+            )
+            fases.medir("salvar", compare_main.salvar_json, args.lista, alunos)
+    finally:
+        if not args.manter:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    sinalizados = {
+        (k + 1, *sorted((alunos[i].email, alunos[j].email))) for i, j, k, _ in pares
+    }
+    resultado = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "versao": versao_codigo(),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pycparser": pycparser.__version__,
+        },
+        "parametros": {
+            "alunos": args.alunos,
+            "questoes": args.questoes,
+            "copias": args.copias,
+            "semente": args.semente,
+            "repeticoes": args.repeticoes,
+            "motor": args.motor,
+            "analisador": args.analisador,
+            "processos": args.processos,
+            "limiar_candidato": args.limiar_candidato,
+            "top_k": args.top_k,
+        },
+        "arquivos": sum(1 for aluno in alunos for q in aluno.questoes if q),
+        # Somado nas repetições
+        "arquivos_por_caminho": dict(compare_main.CAMINHOS_ANALISE),
+        "fases": fases.resumo(),
+        "qualidade": avaliar(plantados, sinalizados),
+    }
+
+    saida = args.saida
+    if not saida:
+        saida = os.path.join(
+            os.path.dirname(pasta_lista(args.lista)),
+            ".benchmark",
+            f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=4, ensure_ascii=False)
+
+    for nome, fase in resultado["fases"].items():
+        print(f"Tempo de {nome}: {fase['mediana']:.2f}s")
+    qualidade = resultado["qualidade"]
+    print(
+        f"Precisão {qualidade['precisao']}, recall {qualidade['recall']} "
+        f"({qualidade['verdadeiros_positivos']}/{qualidade['pares_plantados']} pares plantados)"
+    )
+    print(f"Resultado salvo em {saida}")
+
+
+if __name__ == "__main__":
+    main()
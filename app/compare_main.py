@@ -3,11 +3,32 @@ from pycparser import c_parser, c_ast
 import re
 import math
 import time
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from array import array
+from multiprocessing import shared_memory
+import inspect
 from collections import Counter
 from itertools import combinations
+import argparse
+import hashlib
+import heapq
 import json
-import sys
+import pycparser
+from services.similarity_matrix import final_similarity_matrix, matrix_engine_available
+from infrastructure.signature_cache import SignatureCache, signature_key
+from infrastructure.similarity_store import SimilarityStore
+from infrastructure.c_preprocessor import CPreprocessor, main_file_code
+from infrastructure.fingerprint_corpus import FingerprintCorpus
+from core.models.list_metadata import ListMetadata
+from services.winnowing import copy_percentage, fingerprints, winnowing_results
+from services.c_tokenizer import LexerSignature, lex_signature
+from services.greedy_tiling import (
+    MIN_MATCH,
+    greedy_string_tiling,
+    tile_coverage,
+    tiles_to_line_spans,
+)
+from infrastructure.moss_handler import update_moss_results_json
 
 # -------------------------------
 # Parser global (evita recriar)
@@ -15,6 +36,12 @@ import sys
 PARSER = c_parser.CParser()
 
 
+def iniciar_parser():
+    # Cada processo do pool de carregamento tem o seu próprio CParser
+    global PARSER
+    PARSER = c_parser.CParser()
+
+
 def gerar_ast(code: str):
     try:
         return PARSER.parse(code)
@@ -28,8 +55,10 @@ def gerar_ast(code: str):
 class ASTSignature(c_ast.NodeVisitor):
     """Cria uma assinatura normalizada da AST"""
 
-    def __init__(self):
+    def __init__(self, com_linhas=False):
         self.tokens = []
+        # Linha de origem de cada token, só quando pedida
+        self.linhas = [] if com_linhas else None
 
     def generic_visit(self, node):
         token = type(node).__name__
@@ -54,6 +83,13 @@ class ASTSignature(c_ast.NodeVisitor):
         else:
             self.tokens.append(token)
 
+        if self.linhas is not None:
+            coord = getattr(node, "coord", None)
+            if coord and coord.line:
+                self.linhas.append(coord.line)
+            else:
+                self.linhas.append(self.linhas[-1] if self.linhas else 1)
+
         super().generic_visit(node)
 
 
@@ -63,6 +99,39 @@ def extrair_assinatura(ast):
     return visitor.tokens
 
 
+# -------------------------------
+# Codificação compacta dos tokens (envio entre processos)
+# -------------------------------
+# Vocabulário fixo e igual em todos os processos: nós da AST, tokens
+# normalizados e operadores. Tokens fora dele seguem como texto.
+TOKENS_BASE = tuple(
+    sorted(
+        nome
+        for nome, classe in inspect.getmembers(c_ast, inspect.isclass)
+        if issubclass(classe, c_ast.Node)
+    )
+) + (
+    "VAR", "FUNC", "CONST_INT", "CONST_FLOAT", "CONST_CHAR", "CONST_DOUBLE", "CONST",
+    "+", "-", "*", "/", "%", "<<", ">>", "<", "<=", ">", ">=", "==", "!=",
+    "&", "^", "|", "&&", "||", "~", "!", "++", "--", "p++", "p--",
+    "sizeof", "_Alignof",
+)
+ID_TOKEN_BASE = {t: i for i, t in enumerate(TOKENS_BASE)}
+
+
+def codificar_tokens(tokens):
+    try:
+        return array("H", [ID_TOKEN_BASE[t] for t in tokens])
+    except KeyError:
+        return list(tokens)
+
+
+def decodificar_tokens(dados):
+    if isinstance(dados, array):
+        return [TOKENS_BASE[i] for i in dados]
+    return dados
+
+
 # -------------------------------
 # Funções por função
 # -------------------------------
@@ -91,64 +160,162 @@ TOKEN_PESOS = {
 }
 
 
-def jaccard_similarity(commom_tokens, all_tokens):
-    return len(commom_tokens) / len(all_tokens)
+NGRAM_N = 4
 
 
-def weighted_cosine_similarity(seq1, seq2, all_tokens):
-    idx = {t: i for i, t in enumerate(all_tokens)}
-    v1 = [0.0] * len(all_tokens)
-    v2 = [0.0] * len(all_tokens)
+# -------------------------------
+# Extração de características (uma vez por submissão)
+# -------------------------------
+# Tokens e n-gramas viram ids inteiros; o kernel por par só faz produtos
+# escalares entre dicionários esparsos id -> valor.
+VOCABULARIO = {}
+PESOS_VOCABULARIO = []  # peso de TOKEN_PESOS de cada id de token
+NGRAMAS = {}
+
+
+def internar(tabela, chave):
+    id_ = tabela.get(chave)
+    if id_ is None:
+        id_ = tabela[chave] = len(tabela)
+    return id_
+
+
+def ids_tokens(seq):
+    ids = []
+    for t in seq:
+        id_ = VOCABULARIO.get(t)
+        if id_ is None:
+            id_ = VOCABULARIO[t] = len(PESOS_VOCABULARIO)
+            PESOS_VOCABULARIO.append(TOKEN_PESOS.get(t, 1.0))
+        ids.append(id_)
+    return ids
+
+
+class Caracteristicas:
+    __slots__ = ("tamanho", "tokens", "pesos", "norma_pesos", "ngramas", "norma_ngramas")
+
+    def __init__(self, ids, pesos_vocabulario=None, n=NGRAM_N):
+        if pesos_vocabulario is None:
+            pesos_vocabulario = PESOS_VOCABULARIO
+        self.tamanho = len(ids)
+        self.tokens = frozenset(ids)
+
+        self.pesos = {}
+        for id_ in ids:
+            self.pesos[id_] = self.pesos.get(id_, 0.0) + pesos_vocabulario[id_]
+        self.norma_pesos = math.sqrt(sum(v * v for v in self.pesos.values()))
+
+        self.ngramas = dict(
+            Counter(
+                internar(NGRAMAS, tuple(ids[i : i + n]))
+                for i in range(len(ids) - n + 1)
+            )
+        )
+        self.norma_ngramas = math.sqrt(sum(v * v for v in self.ngramas.values()))
+
+    def remover_ngramas(self, ignorados):
+        self.ngramas = {g: c for g, c in self.ngramas.items() if g not in ignorados}
+        self.norma_ngramas = math.sqrt(sum(v * v for v in self.ngramas.values()))
+
+
+class IndiceFuncoes:
+    """Impressões das funções de um arquivo, montado uma vez por aluno (e de
+    novo quando o código base sai das características).
+
+    A impressão de uma função é o conjunto dos seus n-gramas: comparar duas
+    custa uma interseção de conjuntos, bem menos que a similaridade
+    completa. As posições seguem a ordem das funções no arquivo."""
+
+    __slots__ = ("funcoes", "impressoes")
+
+    def __init__(self, funcoes):
+        self.funcoes = list(funcoes)
+        # (tamanho, n-gramas, raiz do número de n-gramas) de cada função
+        self.impressoes = [
+            (c.tamanho, frozenset(c.ngramas), math.sqrt(len(c.ngramas)))
+            for c in self.funcoes
+        ]
 
-    for t in seq1:
-        v1[idx[t]] += TOKEN_PESOS.get(t, 1.0)
-    for t in seq2:
-        v2[idx[t]] += TOKEN_PESOS.get(t, 1.0)
+    def __len__(self):
+        return len(self.funcoes)
+
+    def candidatas(self, outro):
+        """Pares (-valor, pos, pos_outro) das funções de tamanho compatível
+        com algum n-grama em comum; valor é o cosseno das impressões."""
+        pares = []
+        for pos_b, (tamanho_b, ngramas_b, raiz_b) in enumerate(outro.impressoes):
+            for pos_a, (tamanho_a, ngramas_a, raiz_a) in enumerate(self.impressoes):
+                # Fora da faixa [metade, dobro] a similaridade é zero
+                if 2 * tamanho_a < tamanho_b or tamanho_a > 2 * tamanho_b:
+                    continue
+                comuns = len(ngramas_a & ngramas_b)
+                if comuns:
+                    pares.append((-comuns / (raiz_a * raiz_b), pos_a, pos_b))
+        return pares
 
-    dot = sum(a * b for a, b in zip(v1, v2))
-    norm1 = math.sqrt(sum(a * a for a in v1))
-    norm2 = math.sqrt(sum(b * b for b in v2))
-    return dot / (norm1 * norm2 + 1e-9)
 
+def extrair_caracteristicas(questao):
+    questao.caracteristicas = Caracteristicas(ids_tokens(questao.assinatura))
+    questao.caracteristicas_funcoes = {
+        nome: Caracteristicas(ids_tokens(tokens))
+        for nome, tokens in questao.funcoes.items()
+    }
+    questao.indice_funcoes = IndiceFuncoes(questao.caracteristicas_funcoes.values())
 
-def ngram_similarity(seq1, seq2, n=4):
-    if len(seq1) < n or len(seq2) < n:
-        return 0.0
 
-    def ngrams(seq, n):
-        return [" ".join(seq[i : i + n]) for i in range(len(seq) - n + 1)]
+def produto_esparso(v1, v2):
+    if len(v1) > len(v2):
+        v1, v2 = v2, v1
+    return sum(valor * v2.get(chave, 0) for chave, valor in v1.items())
 
-    c1, c2 = Counter(ngrams(seq1, n)), Counter(ngrams(seq2, n))
-    all_keys = set(c1) | set(c2)
-    dot = sum(c1[k] * c2[k] for k in all_keys)
-    norm1 = math.sqrt(sum(v * v for v in c1.values()))
-    norm2 = math.sqrt(sum(v * v for v in c2.values()))
-    return dot / (norm1 * norm2 + 1e-9)
 
-
-def similaridade_combinada(seq1, seq2):
-    if len(seq1) == 0 or len(seq2) == 0:
+def similaridade_caracteristicas(c1, c2):
+    if c1.tamanho == 0 or c2.tamanho == 0:
         return 0.0
-    if len(seq1) < 0.5 * len(seq2) or len(seq1) > 2 * len(seq2):
+    if c1.tamanho < 0.5 * c2.tamanho or c1.tamanho > 2 * c2.tamanho:
         return 0.0
-    inter = len(set(seq1) & set(seq2))
+    inter = len(c1.tokens & c2.tokens)
     if inter < 2:
         return 0.0
-    seq1_set, seq2_set = set(seq1), set(seq2)
-    all_tokens = seq1_set | seq2_set
-    commom_tokens = seq1_set & seq2_set
-    jacc = jaccard_similarity(commom_tokens, all_tokens)
-    cos = weighted_cosine_similarity(seq1, seq2, all_tokens)
-    ngram = ngram_similarity(seq1, seq2, n=4)
+    jacc = inter / (len(c1.tokens) + len(c2.tokens) - inter)
+    cos = produto_esparso(c1.pesos, c2.pesos) / (
+        c1.norma_pesos * c2.norma_pesos + 1e-9
+    )
+    if c1.ngramas and c2.ngramas:
+        ngram = produto_esparso(c1.ngramas, c2.ngramas) / (
+            c1.norma_ngramas * c2.norma_ngramas + 1e-9
+        )
+    else:
+        ngram = 0.0
     return 0.7 * ngram + 0.1 * cos + 0.2 * jacc
 
 
-def similaridade_funcoes(funcoes1, funcoes2):
-    comuns = set(funcoes1) & set(funcoes2)
-    if not comuns:
+def emparelhamento_guloso(pares):
+    """Pares (pos_a, pos_b) escolhidos, do maior valor para o menor, entre
+    (-valor, pos_a, pos_b), sem repetir função de nenhum dos lados."""
+    usadas_a = set()
+    usadas_b = set()
+    escolhidos = []
+    for _, pos_a, pos_b in sorted(pares):
+        if pos_a in usadas_a or pos_b in usadas_b:
+            continue
+        usadas_a.add(pos_a)
+        usadas_b.add(pos_b)
+        escolhidos.append((pos_a, pos_b))
+    return escolhidos
+
+
+def similaridade_funcoes_caracteristicas(indice1, indice2):
+    """Cada função é emparelhada com a mais parecida do outro arquivo, qualquer
+    que seja o nome; funções sem par contam zero. O emparelhamento guloso é
+    feito sobre as impressões (IndiceFuncoes.candidatas) e a similaridade
+    completa só é calculada para os pares escolhidos."""
+    if not indice1 or not indice2:
         return 0.0
-    similaridades = [similaridade_combinada(funcoes1[f], funcoes2[f]) for f in comuns]
-    return sum(similaridades) / len(similaridades)
+    total = 0.0
+    for pos_a, pos_b in emparelhamento_guloso(indice1.candidatas(indice2)):
+        total += similaridade_caracteristicas(indice1.funcoes[pos_a], indice2.funcoes[pos_b])
+    return total / min(len(indice1), len(indice2))
 
 
 # -------------------------------
@@ -158,13 +325,17 @@ RE_COMENTARIOS = re.compile(r"/\*.*?\*/", re.DOTALL)
 RE_BARRA = re.compile(r"//.*")
 
 
+# As duas limpezas preservam a numeração das linhas, para os trechos do
+# Greedy String Tiling apontarem para as linhas do arquivo original.
 def remover_comentarios(codigo):
-    return RE_COMENTARIOS.sub("", RE_BARRA.sub("", codigo))
+    return RE_COMENTARIOS.sub(
+        lambda m: "\n" * m.group(0).count("\n"), RE_BARRA.sub("", codigo)
+    )
 
 
 def remover_hashtag(codigo):
     return "\n".join(
-        linha for linha in codigo.splitlines() if not linha.strip().startswith("#")
+        "" if linha.strip().startswith("#") else linha for linha in codigo.splitlines()
     )
 
 
@@ -172,36 +343,246 @@ def remover_hashtag(codigo):
 # Classes
 # -------------------------------
 class Questao:
-    def __init__(self, numero, assinatura, funcoes):
+    def __init__(
+        self, numero, assinatura, funcoes, hash_arquivo=None, caminho=None, codigo_limpo=None
+    ):
         self.numero = numero
         self.assinatura = assinatura
         self.funcoes = funcoes
+        self.hash_arquivo = hash_arquivo
+        self.caminho = caminho
+        # Código que gerou a assinatura, só quando os trechos vão precisar dele
+        self.codigo_limpo = codigo_limpo
+        self.caracteristicas = None
+        self.caracteristicas_funcoes = None
+        self.indice_funcoes = None
         self.max_sim = 0
 
 
 class Aluno:
-    def __init__(self, email):
+    def __init__(self, email, num_questoes):
         self.email = email
-        self.questoes: list[Questao] = [None for _ in range(4)]
+        self.questoes: list[Questao] = [None for _ in range(num_questoes)]
         self.comentarios = []
 
     def addQuestao(self, questao):
         self.questoes[questao.numero - 1] = questao
 
 
+class Progresso:
+    """Imprime uma linha de progresso com ETA a cada ~10% do trabalho."""
+
+    def __init__(self, descricao, total, passos=10):
+        self.descricao = descricao
+        self.total = total
+        self.feito = 0
+        self.passo = max(1, total / passos)
+        self.proximo = self.passo
+        self.inicio = time.time()
+
+    def avancar(self, quantidade, rotulo=""):
+        self.feito += quantidade
+        if self.feito < self.proximo and self.feito < self.total:
+            return
+        while self.proximo <= self.feito:
+            self.proximo += self.passo
+        decorrido = time.time() - self.inicio
+        fracao = self.feito / self.total if self.total else 1
+        eta = decorrido * (1 - fracao) / fracao if fracao else 0
+        print(
+            f"{self.descricao}: {rotulo or f'{self.feito}/{self.total}'} "
+            f"({fracao * 100:.0f}%), ETA {eta:.1f}s",
+            flush=True,
+        )
+
+
 # -------------------------------
 # Carregar dados
 # -------------------------------
-def carregar_questoes(lista):
+# Mude sempre que ASTSignature/ASTFunctionVisitor ou a limpeza do código mudarem:
+# invalida as entradas antigas do cache de assinaturas.
+VERSAO_NORMALIZADOR = 2
+VERSAO_CACHE = f"pycparser-{pycparser.__version__}/normalizador-{VERSAO_NORMALIZADOR}"
+CACHE_MAX_MB = 64
+
+# "ast": pycparser, com o analisador léxico só nos arquivos que ele não aceita.
+# "lexer": só o analisador léxico, bem mais rápido, para turmas muito grandes.
+ANALISADORES = ("ast", "lexer")
+# Quantos arquivos passaram por cada caminho: ast, lexer, falha ou cache
+CAMINHOS_ANALISE = Counter()
+
+
+def caminho_cache_assinaturas():
+    base = os.path.dirname(__file__)
+    raiz = os.path.abspath(os.path.join(base, ".."))
+    return os.path.join(raiz, "Downloads", ".cache", "assinaturas.sqlite")
+
+
+def caminho_cache_preprocessador():
+    return os.path.join(
+        os.path.dirname(caminho_cache_assinaturas()), "preprocessados.sqlite"
+    )
+
+
+def remover_cabecalhos(ast):
+    # Declarações vindas dos cabeçalhos falsos da libc não fazem parte do aluno
+    ast.ext = [
+        no for no in ast.ext if not (no.coord and no.coord.file.endswith(".h"))
+    ]
+    return ast
+
+
+def processar_codigo(codigo_limpo, analisador="ast"):
+    """Retorna (caminho, assinatura, funcoes); caminho é "ast", "lexer" ou "falha"."""
+    if analisador == "ast":
+        ast = gerar_ast(codigo_limpo)
+        if ast:
+            remover_cabecalhos(ast)
+            assinatura = extrair_assinatura(ast)
+            func_visitor = ASTFunctionVisitor()
+            func_visitor.visit(ast)
+            return "ast", assinatura, func_visitor.functions
+
+    # pycparser não aceitou o arquivo (ou modo rápido): tokens do analisador léxico
+    assinatura, funcoes = lex_signature(main_file_code(codigo_limpo))
+    if assinatura is None:
+        return "falha", None, None
+    return "lexer", assinatura, funcoes
+
+
+def processar_lote(codigos, analisador="ast"):
+    resultados = []
+    for codigo_limpo in codigos:
+        caminho, assinatura, funcoes = processar_codigo(codigo_limpo, analisador)
+        if assinatura is None:
+            resultados.append((caminho, None))
+            continue
+        resultados.append(
+            (
+                caminho,
+                (
+                    codificar_tokens(assinatura),
+                    {nome: codificar_tokens(t) for nome, t in funcoes.items()},
+                ),
+            )
+        )
+    return resultados
+
+
+def decodificar_registro(registro):
+    caminho, dados = registro
+    if dados is None:
+        return caminho, None, None
+    assinatura, funcoes = dados
+    return caminho, decodificar_tokens(assinatura), {
+        nome: decodificar_tokens(t) for nome, t in funcoes.items()
+    }
+
+
+# Abaixo disso o custo de subir o pool não compensa
+MIN_ARQUIVOS_POOL = 32
+TAMANHO_LOTE_PARSE = 8
+
+
+def processar_pendentes(codigos, processos=None, analisador="ast"):
+    """Gera (posição, caminho, assinatura, funcoes) para cada código, em qualquer ordem."""
+    processos = processos or os.cpu_count()
+    total = len(codigos)
+    if total < MIN_ARQUIVOS_POOL or processos <= 1:
+        for pos, codigo_limpo in enumerate(codigos):
+            yield (pos, *processar_codigo(codigo_limpo, analisador))
+        return
+
+    progresso = Progresso("Analisando arquivos", total)
+    with ProcessPoolExecutor(max_workers=processos, initializer=iniciar_parser) as executor:
+        futures = {
+            executor.submit(
+                processar_lote, codigos[i : i + TAMANHO_LOTE_PARSE], analisador
+            ): i
+            for i in range(0, total, TAMANHO_LOTE_PARSE)
+        }
+        for future in as_completed(futures):
+            inicio = futures[future]
+            registros = future.result()
+            for deslocamento, registro in enumerate(registros):
+                yield (inicio + deslocamento, *decodificar_registro(registro))
+            progresso.avancar(len(registros))
+
+
+RE_ARQUIVO_QUESTAO = re.compile(r"^q(\d+)_", re.IGNORECASE)
+RE_METADATA = re.compile(r"metadata_turma[A-Z]\.json", re.IGNORECASE)
+
+
+def numero_questao(arquivo):
+    m = RE_ARQUIVO_QUESTAO.match(arquivo)
+    return int(m.group(1)) if m else None
+
+
+def descobrir_num_questoes(pasta_lista):
+    """Maior entre o num_questions dos metadata_turma*.json e o maior qN_ dos
+    arquivos em submissions."""
+    num_questoes = 0
+    for nome in os.listdir(pasta_lista):
+        if RE_METADATA.fullmatch(nome):
+            metadata = ListMetadata.load_metadata_from_json(
+                os.path.join(pasta_lista, nome)
+            )
+            if metadata and metadata.num_questions:
+                num_questoes = max(num_questoes, int(metadata.num_questions))
+
+    downloads = os.path.join(pasta_lista, "submissions")
+    for aluno in os.listdir(downloads):
+        caminho_aluno = os.path.join(downloads, aluno)
+        if not os.path.isdir(caminho_aluno):
+            continue
+        for arquivo in os.listdir(caminho_aluno):
+            q_numero = numero_questao(arquivo)
+            if arquivo.endswith(".c") and q_numero:
+                num_questoes = max(num_questoes, q_numero)
+    return num_questoes
+
+
+def limpar_codigos(arquivos, preprocessador=None):
+    """Código limpo de cada (aluno_obj, q_numero, caminho, codigo): a saída do
+    pré-processador quando ele funciona, senão sem comentários e sem as
+    linhas com #."""
+    limpos = [None] * len(arquivos)
+    if preprocessador:
+        por_questao = {}
+        for pos, (_, q_numero, _, _) in enumerate(arquivos):
+            por_questao.setdefault(q_numero, []).append(pos)
+        for posicoes in por_questao.values():
+            # Os arquivos de uma questão vão juntos para o gcc -E
+            saidas = preprocessador.preprocess_many([arquivos[p][3] for p in posicoes])
+            for pos, saida in zip(posicoes, saidas):
+                limpos[pos] = saida
+    return [
+        limpo if limpo is not None else remover_hashtag(remover_comentarios(codigo))
+        for limpo, (_, _, _, codigo) in zip(limpos, arquivos)
+    ]
+
+
+def carregar_questoes(
+    lista,
+    cache=None,
+    processos=None,
+    analisador="ast",
+    preprocessador=None,
+    guardar_codigo=False,
+):
     alunos = []
+    arquivos = []
+    pendentes = []
     base = os.path.dirname(__file__)
     raiz = os.path.abspath(os.path.join(base, ".."))
-    downloads = os.path.join(raiz, "Downloads", lista, "submissions")
+    pasta_lista = os.path.join(raiz, "Downloads", lista)
+    downloads = os.path.join(pasta_lista, "submissions")
+    num_questoes = descobrir_num_questoes(pasta_lista)
     for aluno in os.listdir(downloads):
         caminho_aluno = os.path.join(downloads, aluno)
         if not os.path.isdir(caminho_aluno):
             continue
-        aluno_obj = Aluno(aluno)
+        aluno_obj = Aluno(aluno, num_questoes)
         for arquivo in os.listdir(caminho_aluno):
             if arquivo.endswith(".c"):
                 caminho_arquivo = os.path.join(caminho_aluno, arquivo)
@@ -212,97 +593,1153 @@ def carregar_questoes(lista):
                     continue
                 if not codigo.strip():
                     continue
-                codigo_limpo = remover_hashtag(remover_comentarios(codigo))
-                ast = gerar_ast(codigo_limpo)
-                if not ast:
+
+                q_numero = numero_questao(arquivo)
+                if not q_numero or not 1 <= q_numero <= num_questoes:
                     continue
-                assinatura = extrair_assinatura(ast)
-                func_visitor = ASTFunctionVisitor()
-                func_visitor.visit(ast)
-                q_numero = int(arquivo.split("_")[0][1:])
-                if 0 <= q_numero <= 4:
-                    questao = Questao(q_numero, assinatura, func_visitor.functions)
-                    aluno_obj.addQuestao(questao)
+                arquivos.append((aluno_obj, q_numero, caminho_arquivo, codigo))
 
         alunos.append(aluno_obj)
+
+    versao = f"{VERSAO_CACHE}/{analisador}"
+    for (aluno_obj, q_numero, caminho_arquivo, _), codigo_limpo in zip(
+        arquivos, limpar_codigos(arquivos, preprocessador)
+    ):
+        chave = signature_key(codigo_limpo, versao)
+        registro = cache.get(chave) if cache else None
+        if registro is None:
+            pendentes.append((aluno_obj, q_numero, chave, caminho_arquivo, codigo_limpo))
+            continue
+        CAMINHOS_ANALISE["cache"] += 1
+        assinatura, funcoes = registro
+        if assinatura is not None:
+            aluno_obj.addQuestao(
+                Questao(
+                    q_numero, assinatura, funcoes, chave, caminho_arquivo,
+                    codigo_limpo if guardar_codigo else None,
+                )
+            )
+
+    # Só os arquivos fora do cache são analisados, em paralelo
+    codigos = [pendente[-1] for pendente in pendentes]
+    for pos, caminho, assinatura, funcoes in processar_pendentes(
+        codigos, processos, analisador
+    ):
+        aluno_obj, q_numero, chave, caminho_arquivo, codigo_limpo = pendentes[pos]
+        CAMINHOS_ANALISE[caminho] += 1
+        if cache:
+            cache.put(chave, assinatura, funcoes)
+        if assinatura is not None:
+            aluno_obj.addQuestao(
+                Questao(
+                    q_numero, assinatura, funcoes, chave, caminho_arquivo,
+                    codigo_limpo if guardar_codigo else None,
+                )
+            )
     return alunos
 
 
+# -------------------------------
+# Código base (esqueleto entregue pelo professor)
+# -------------------------------
+# Os n-gramas do código base saem das características antes da comparação:
+# não contam na similaridade nem entram no índice de candidatos. Vêm dos
+# modelos em Downloads/<LISTA>/base/qN*.c e, opcionalmente, dos n-gramas que
+# aparecem em mais que uma fração da turma.
+RE_ARQUIVO_BASE = re.compile(r"^q(\d+)(?:[_.]|$)", re.IGNORECASE)
+# Abaixo disso a frequência na turma não diz nada sobre o que é código base
+MIN_ARQUIVOS_BASE_AUTOMATICA = 10
+
+
+def carregar_modelos(lista, analisador="ast", preprocessador=None):
+    """({k: ids dos n-gramas dos modelos da questão k}, chave do conteúdo dos modelos).
+
+    Os modelos passam pela mesma limpeza (ou pré-processador) e pelo mesmo
+    analisador das submissões, senão seus n-gramas não batem com os delas."""
+    base = os.path.dirname(__file__)
+    raiz = os.path.abspath(os.path.join(base, ".."))
+    pasta = os.path.join(raiz, "Downloads", lista, "base")
+    modelos = {}
+    codigos = []
+    if not os.path.isdir(pasta):
+        return modelos, ""
+    arquivos = []
+    for arquivo in sorted(os.listdir(pasta)):
+        m = RE_ARQUIVO_BASE.match(arquivo)
+        if not m or not arquivo.endswith(".c"):
+            continue
+        caminho = os.path.join(pasta, arquivo)
+        with open(caminho, "r", encoding="utf-8") as f:
+            arquivos.append((arquivo, int(m.group(1)), caminho, f.read()))
+    for (arquivo, q_numero, _, _), codigo_limpo in zip(
+        arquivos, limpar_codigos(arquivos, preprocessador)
+    ):
+        _, assinatura, _ = processar_codigo(codigo_limpo, analisador)
+        if assinatura is None:
+            print(f"Modelo {arquivo} não pôde ser analisado; ignorando.")
+            continue
+        codigos.append(f"{arquivo}\0{codigo_limpo}")
+        caracteristicas = Caracteristicas(ids_tokens(assinatura))
+        modelos.setdefault(q_numero - 1, set()).update(caracteristicas.ngramas)
+    return modelos, signature_key("\0".join(codigos), "modelos") if codigos else ""
+
+
+def detectar_codigo_base(alunos, modelos=None, fracao=0.0):
+    """{k: ids dos n-gramas de código base da questão k}."""
+    base = {}
+    for k in range(contar_questoes(alunos)):
+        ignorados = set(modelos.get(k, ())) if modelos else set()
+        presentes = [a.questoes[k] for a in alunos if a.questoes[k]]
+        if fracao > 0 and len(presentes) >= MIN_ARQUIVOS_BASE_AUTOMATICA:
+            frequencia = Counter(g for q in presentes for g in q.caracteristicas.ngramas)
+            limite = fracao * len(presentes)
+            ignorados.update(g for g, total in frequencia.items() if total > limite)
+        if ignorados:
+            base[k] = ignorados
+    return base
+
+
+def subtrair_codigo_base(alunos, base):
+    for aluno in alunos:
+        for k, questao in enumerate(aluno.questoes):
+            if questao and k in base:
+                questao.caracteristicas.remover_ngramas(base[k])
+                for caracteristicas in questao.caracteristicas_funcoes.values():
+                    caracteristicas.remover_ngramas(base[k])
+                questao.indice_funcoes = IndiceFuncoes(
+                    questao.caracteristicas_funcoes.values()
+                )
+
+
+def ngramas_do_codigo_base(base):
+    # Os ids de n-grama são de cada processo; entre processos vai a sequência
+    # de ids de token, que é a mesma em todos
+    sequencias = list(NGRAMAS)
+    return {k: frozenset(sequencias[g] for g in ids) for k, ids in base.items()}
+
+
+# Winnowing, histórico e trechos não usam as características: neles o código
+# base sai da sequência de tokens, nas posições cobertas pelos seus n-gramas
+def posicoes_codigo_base(ids, ngramas_base, n=NGRAM_N, minimo=MIN_MATCH):
+    """bytearray com 1 nas posições de ids cobertas pelo código base: trechos
+    de pelo menos `minimo` tokens em que todos os n-gramas são do código
+    base. Trechos menores são estruturas comuns (um for, um if) que também
+    aparecem no código do próprio aluno."""
+    cobertas = bytearray(len(ids))
+    if not ngramas_base:
+        return cobertas
+    inicio = None
+    for i in range(len(ids) - n + 2):
+        if i <= len(ids) - n and tuple(ids[i : i + n]) in ngramas_base:
+            if inicio is None:
+                inicio = i
+        elif inicio is not None:
+            # N-gramas do código base de inicio até i - 1
+            if i - 1 + n - inicio >= minimo:
+                cobertas[inicio : i - 1 + n] = b"\1" * (i - 1 + n - inicio)
+            inicio = None
+    return cobertas
+
+
+def sem_codigo_base(assinatura, ngramas_base):
+    """Tokens da assinatura com None no lugar do código base (ver fingerprints)."""
+    if not ngramas_base:
+        return assinatura
+    cobertas = posicoes_codigo_base(ids_tokens(assinatura), ngramas_base)
+    return [None if coberta else token for token, coberta in zip(assinatura, cobertas)]
+
+
+# -------------------------------
+# Cópias idênticas
+# -------------------------------
+# Arquivos com a mesma assinatura (iguais a menos de espaços, comentários e
+# nomes de variáveis) têm as mesmas características: cada grupo entra na
+# comparação uma vez só, pelo representante, e o resultado vale para todos.
+def impressao_questao(questao):
+    # Os nomes das funções não entram: o emparelhamento não olha para eles
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(" ".join(questao.assinatura).encode("utf-8"))
+    for tokens in questao.funcoes.values():
+        digest.update(f"\0{' '.join(tokens)}".encode("utf-8"))
+    return digest.digest()
+
+
+def agrupar_identicos(alunos):
+    """{k: {representante: [membros do grupo, a começar pelo representante]}}"""
+    grupos = {}
+    for k in range(contar_questoes(alunos)):
+        por_impressao = {}
+        for i, aluno in enumerate(alunos):
+            if aluno.questoes[k]:
+                por_impressao.setdefault(impressao_questao(aluno.questoes[k]), []).append(i)
+        grupos[k] = {membros[0]: membros for membros in por_impressao.values()}
+    return grupos
+
+
+def expandir_identicos(alunos, lotes, grupos):
+    """Repete o resultado de cada par de representantes para os membros dos
+    dois grupos e acrescenta os pares dentro de cada grupo (uma comparação
+    por grupo, barata o bastante para refazer também no modo incremental)."""
+    for lote in lotes:
+        yield [
+            (min(a, b), max(a, b), k, sim_final)
+            for i, j, k, sim_final in lote
+            for a in grupos[k][i]
+            for b in grupos[k][j]
+        ]
+
+    internos = []
+    for k, por_representante in grupos.items():
+        for representante, membros in por_representante.items():
+            if len(membros) < 2:
+                continue
+            questao = alunos[representante].questoes[k]
+            sim_final = similaridade_final(
+                questao.caracteristicas,
+                questao.indice_funcoes,
+                questao.caracteristicas,
+                questao.indice_funcoes,
+            )
+            internos.extend((a, b, k, sim_final) for a, b in combinations(membros, 2))
+    if internos:
+        yield internos
+
+
+def resumir_identicos(grupos):
+    partes = []
+    for k, por_representante in sorted(grupos.items()):
+        repetidos = [membros for membros in por_representante.values() if len(membros) > 1]
+        if repetidos:
+            partes.append(
+                f"q{k + 1}={len(repetidos)} grupos "
+                f"({sum(len(membros) for membros in repetidos)} arquivos)"
+            )
+    return ", ".join(partes)
+
+
+# -------------------------------
+# Geração de candidatos (índice invertido de n-gramas)
+# -------------------------------
+# Fração mínima dos n-gramas distintos do menor arquivo que precisa ser
+# compartilhada para o par ser comparado. Quanto menor, maior o recall;
+# 0 desliga a poda e compara todos os pares.
+LIMIAR_CANDIDATO = 0.25
+# n-gramas presentes em mais que essa fração dos alunos, ou em mais que
+# MAX_POSTAGEM_CANDIDATO arquivos, não entram no índice. Cada n-grama custa
+# um incremento por par da sua lista (quadrático no tamanho dela); com o
+# teto o custo cresce linearmente com a turma. Cópias compartilham os
+# n-gramas raros, não os comuns a toda a turma.
+MAX_DF_CANDIDATO = 0.2
+MAX_POSTAGEM_CANDIDATO = 100
+
+
+def gerar_candidatos(
+    alunos,
+    k,
+    limiar=LIMIAR_CANDIDATO,
+    max_df=MAX_DF_CANDIDATO,
+    presentes=None,
+    max_postagem=MAX_POSTAGEM_CANDIDATO,
+):
+    """Pares (i, j) da questão k que compartilham n-gramas suficientes."""
+    if presentes is None:
+        presentes = [i for i, a in enumerate(alunos) if a.questoes[k]]
+    indice = {}
+    ngramas = {}
+    for i in presentes:
+        ngramas[i] = alunos[i].questoes[k].caracteristicas.ngramas.keys()
+        for g in ngramas[i]:
+            indice.setdefault(g, []).append(i)
+
+    limite_df = max(2, min(int(max_df * len(presentes)), max_postagem))
+    frequentes = {g for g, postagem in indice.items() if len(postagem) > limite_df}
+    tamanho = {i: len(ngramas[i] - frequentes) for i in presentes}
+
+    compartilhados = Counter()
+    for g, postagem in indice.items():
+        if g in frequentes:
+            continue
+        for a, b in combinations(postagem, 2):
+            compartilhados[(a, b)] += 1
+
+    pares = set()
+    for (a, b), total in compartilhados.items():
+        if total >= limiar * min(tamanho[a], tamanho[b]):
+            pares.add((a, b))
+
+    # Arquivos formados apenas por n-gramas frequentes (ou curtos demais para
+    # gerar n-gramas) não aparecem no índice: compara com todos para não perdê-los.
+    sem_indice = [i for i in presentes if tamanho[i] == 0]
+    for i in sem_indice:
+        for j in presentes:
+            if i != j:
+                pares.add((min(i, j), max(i, j)))
+
+    return sorted(pares)
+
+
+def contar_questoes(alunos):
+    return len(alunos[0].questoes) if alunos else 0
+
+
+def presentes_questao(alunos, k, grupos=None):
+    if grupos is not None:
+        return list(grupos[k])
+    return [i for i, a in enumerate(alunos) if a.questoes[k]]
+
+
+def gerar_tarefas(alunos, limiar=LIMIAR_CANDIDATO, grupos=None, amostras=None, extras=None):
+    """Gera as tarefas uma questão por vez, como (k, número de pares, pares
+    (i, j)): a lista com os pares de todas as questões nunca fica inteira na
+    memória e sem poda os pares nem chegam a virar lista. Com grupos, só entre
+    os representantes. Com amostras ({k: amostra}, de sortear_amostras),
+    acrescenta os pares da amostra que a poda descartou e os registra em
+    extras, antes de entregá-los."""
+    for k in range(contar_questoes(alunos)):
+        presentes = presentes_questao(alunos, k, grupos)
+        if limiar <= 0:
+            yield k, len(presentes) * (len(presentes) - 1) // 2, combinations(presentes, 2)
+            continue
+        pares = gerar_candidatos(alunos, k, limiar, presentes=presentes)
+        if amostras:
+            descartados = pares_da_amostra(pares, presentes, amostras[k])
+            extras.update((i, j, k) for i, j in descartados)
+            pares += descartados
+        yield k, len(pares), pares
+
+
+# Alunos por questão comparados com todos os outros para estimar quanto a
+# poda baixa a média dos max_sim, que define o limiar dos pares sinalizados.
+# Os pares podados têm similaridade baixa, mas não zero: sem a correção a
+# média cai e a poda sinaliza pares que a execução completa não sinalizaria.
+AMOSTRA_MEDIA = 40
+
+
+def sortear_amostras(alunos, grupos=None, tamanho=AMOSTRA_MEDIA):
+    """{k: amostra} de cada questão.
+
+    O sorteio é pelo hash do email, não pela posição na lista: um aluno novo
+    muda no máximo um membro da amostra, e o modo incremental reaproveita os
+    pares salvos dos demais."""
+    amostras = {}
+    for k in range(contar_questoes(alunos)):
+        amostras[k] = set(
+            sorted(
+                presentes_questao(alunos, k, grupos),
+                key=lambda i: hashlib.blake2b(
+                    f"{k}/{alunos[i].email}".encode(), digest_size=8
+                ).digest(),
+            )[:tamanho]
+        )
+    return amostras
+
+
+def pares_da_amostra(pares, presentes, amostra):
+    """Pares entre a amostra e os demais alunos que não estão em pares."""
+    comparados = {(i, j) for i, j in pares if i in amostra or j in amostra}
+    descartados = []
+    for a in sorted(amostra):
+        for b in presentes:
+            par = (min(a, b), max(a, b))
+            if a != b and par not in comparados:
+                comparados.add(par)
+                descartados.append(par)
+    return descartados
+
+
+# -------------------------------
+# Memória compartilhada com as assinaturas
+# -------------------------------
+# Um único bloco de inteiros com várias tabelas, descritas em `layout` como
+# nome -> (início, tamanho):
+#   tokens            ids de token de todas as assinaturas, concatenados
+#   segmento_inicio   início de cada assinatura (arquivo ou função) em tokens
+#   segmento_fim      fim de cada assinatura
+#   questao_arquivo   segmento do arquivo de cada (aluno, questão), ou -1
+#   questao_funcoes   primeira função de cada (aluno, questão) na tabela abaixo;
+#                     a posição seguinte marca o fim
+#   funcao_segmento   segmento de cada função
+#
+# Os pares a comparar não ficam no bloco: cada lote leva os seus.
+
+
+def empacotar_assinaturas(alunos):
+    tabelas = {
+        "tokens": array("i"),
+        "segmento_inicio": array("i"),
+        "segmento_fim": array("i"),
+        "questao_arquivo": array("i"),
+        "questao_funcoes": array("i"),
+        "funcao_segmento": array("i"),
+    }
+
+    def adicionar_segmento(seq):
+        tabelas["segmento_inicio"].append(len(tabelas["tokens"]))
+        tabelas["tokens"].extend(ids_tokens(seq))
+        tabelas["segmento_fim"].append(len(tabelas["tokens"]))
+        return len(tabelas["segmento_fim"]) - 1
+
+    for aluno in alunos:
+        for q in aluno.questoes:
+            tabelas["questao_funcoes"].append(len(tabelas["funcao_segmento"]))
+            if not q:
+                tabelas["questao_arquivo"].append(-1)
+                continue
+            tabelas["questao_arquivo"].append(adicionar_segmento(q.assinatura))
+            for tokens in q.funcoes.values():
+                tabelas["funcao_segmento"].append(adicionar_segmento(tokens))
+    tabelas["questao_funcoes"].append(len(tabelas["funcao_segmento"]))
+
+    layout = {}
+    posicao = 0
+    for nome, tabela in tabelas.items():
+        layout[nome] = (posicao, len(tabela))
+        posicao += len(tabela)
+
+    item = array("i").itemsize
+    memoria = shared_memory.SharedMemory(create=True, size=max(1, posicao * item))
+    visao = memoria.buf.cast("i")
+    for nome, tabela in tabelas.items():
+        inicio, tamanho = layout[nome]
+        visao[inicio : inicio + tamanho] = tabela
+    visao.release()
+    return memoria, layout
+
+
+def anexar_memoria(nome):
+    try:
+        return shared_memory.SharedMemory(name=nome, track=False)
+    except TypeError:
+        # Python < 3.13 não tem track=False; os processos do pool usam o
+        # resource_tracker do processo principal, que é quem apaga o bloco.
+        return shared_memory.SharedMemory(name=nome)
+
+
+# Estado de cada processo de comparação
+_MEMORIA = None
+_TABELAS = {}
+_PESOS = None
+_NUM_QUESTOES = 0
+_CARACTERISTICAS = {}
+_CODIGO_BASE = {}
+
+
+def anexar_assinaturas(nome, layout, pesos_vocabulario, num_questoes, codigo_base=None):
+    global _MEMORIA, _PESOS, _NUM_QUESTOES
+    _MEMORIA = anexar_memoria(nome)
+    visao = _MEMORIA.buf.cast("i")
+    for tabela, (inicio, tamanho) in layout.items():
+        _TABELAS[tabela] = visao[inicio : inicio + tamanho]
+    _PESOS = pesos_vocabulario
+    _NUM_QUESTOES = num_questoes
+    _CARACTERISTICAS.clear()
+    _CODIGO_BASE.clear()
+    for k, sequencias in (codigo_base or {}).items():
+        _CODIGO_BASE[k] = {internar(NGRAMAS, g) for g in sequencias}
+
+
+def caracteristicas_segmento(segmento):
+    inicio = _TABELAS["segmento_inicio"][segmento]
+    fim = _TABELAS["segmento_fim"][segmento]
+    return Caracteristicas(_TABELAS["tokens"][inicio:fim].tolist(), _PESOS)
+
+
+def caracteristicas_compartilhadas(i, k):
+    # Cada processo extrai as características e o índice de funções de um
+    # (aluno, questão) uma vez só
+    chave = i * _NUM_QUESTOES + k
+    if chave not in _CARACTERISTICAS:
+        arquivo = caracteristicas_segmento(_TABELAS["questao_arquivo"][chave])
+        funcoes = [
+            caracteristicas_segmento(_TABELAS["funcao_segmento"][f])
+            for f in range(
+                _TABELAS["questao_funcoes"][chave], _TABELAS["questao_funcoes"][chave + 1]
+            )
+        ]
+        if k in _CODIGO_BASE:
+            for caracteristicas in (arquivo, *funcoes):
+                caracteristicas.remover_ngramas(_CODIGO_BASE[k])
+        _CARACTERISTICAS[chave] = (arquivo, IndiceFuncoes(funcoes))
+    return _CARACTERISTICAS[chave]
+
+
 # -------------------------------
 # Otimização: Comparação em chunks
 # -------------------------------
-def comparar_par_chunk(chunk, alunos_serializavel):
+def similaridade_final(arquivo_a, funcoes_a, arquivo_b, funcoes_b):
+    sim_arquivo = similaridade_caracteristicas(arquivo_a, arquivo_b)
+    sim_funcoes = similaridade_funcoes_caracteristicas(funcoes_a, funcoes_b)
+    return round((sim_arquivo + sim_funcoes) / 2, 4)
+
+
+def comparar_lote(k, pares):
+    """pares: array com os pares (i, j) da questão k achatados."""
     resultados = []
-    for i, j in chunk:
-        aluno_a, aluno_b = alunos_serializavel[i], alunos_serializavel[j]
-        for k in range(4):
-            qa, qb = aluno_a["questoes"][k], aluno_b["questoes"][k]
-            if not qa or not qb:
-                continue
-            sim_arquivo = similaridade_combinada(qa["assinatura"], qb["assinatura"])
-            sim_funcoes = similaridade_funcoes(qa["funcoes"], qb["funcoes"])
-            sim_final = round((sim_arquivo + sim_funcoes) / 2, 4)
-            resultados.append((i, j, k, sim_final))
+    for pos in range(0, len(pares), 2):
+        i, j = pares[pos], pares[pos + 1]
+        arquivo_a, funcoes_a = caracteristicas_compartilhadas(i, k)
+        arquivo_b, funcoes_b = caracteristicas_compartilhadas(j, k)
+        resultados.append((i, j, k, similaridade_final(arquivo_a, funcoes_a, arquivo_b, funcoes_b)))
     return resultados
 
 
+def preparar_caracteristicas(alunos):
+    for aluno in alunos:
+        for questao in aluno.questoes:
+            if questao and questao.caracteristicas is None:
+                extrair_caracteristicas(questao)
+
+
+# Lotes pequenos e de custo parecido: o pool entrega um novo lote a cada
+# processo que termina, então nenhum fica parado esperando os outros.
+LOTES_POR_PROCESSO = 16
+# Lotes enviados ao pool e ainda não terminados, por processo. Os próximos
+# só são gerados quando algum termina.
+LOTES_PENDENTES_POR_PROCESSO = 2
+
+
+def custo_tarefa(alunos, i, j, k):
+    tamanho_a = len(alunos[i].questoes[k].assinatura)
+    tamanho_b = len(alunos[j].questoes[k].assinatura)
+    custo = tamanho_a + tamanho_b
+    if tamanho_a < 0.5 * tamanho_b or tamanho_a > 2 * tamanho_b:
+        # A comparação do arquivo para no portão de tamanho; só restam as funções
+        custo //= 2
+    return max(1, custo)
+
+
+def dividir_lotes(alunos, k, quantidade, pares, processos):
+    """Agrupa os pares da questão k em lotes (arrays achatados) à medida que
+    são gerados. O custo alvo de um lote sai do tamanho médio das assinaturas
+    da questão, sem precisar somar o custo de todos os pares antes."""
+    tamanhos = [len(aluno.questoes[k].assinatura) for aluno in alunos if aluno.questoes[k]]
+    custo_medio = 2 * sum(tamanhos) / len(tamanhos) if tamanhos else 1
+    alvo = max(1, quantidade * custo_medio / (processos * LOTES_POR_PROCESSO))
+    lote = array("i")
+    acumulado = 0
+    for i, j in pares:
+        lote.extend((i, j))
+        acumulado += custo_tarefa(alunos, i, j, k)
+        if acumulado >= alvo:
+            yield lote
+            lote = array("i")
+            acumulado = 0
+    if lote:
+        yield lote
+
+
+def executar_em_fluxo(executor, trabalhos, limite):
+    """Submete os trabalhos (função, argumentos, rótulo) conforme são gerados,
+    com no máximo `limite` pendentes, e gera (rótulo, resultado) na ordem em
+    que terminam."""
+    pendentes = {}
+
+    def colher():
+        prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+        for future in prontos:
+            yield pendentes.pop(future), future.result()
+
+    for funcao, argumentos, rotulo in trabalhos:
+        if len(pendentes) >= limite:
+            yield from colher()
+        pendentes[executor.submit(funcao, *argumentos)] = rotulo
+    while pendentes:
+        yield from colher()
+
+
+def calcular_similaridades(alunos, tarefas, processos=None, codigo_base=None):
+    """Gera os resultados em lotes, na ordem em que os processos terminam.
+
+    tarefas vem de gerar_tarefas e é consumida aos poucos: os lotes de uma
+    questão são montados enquanto os processos comparam os anteriores."""
+    processos = processos or os.cpu_count()
+
+    def trabalhos():
+        for k, quantidade, pares in tarefas:
+            progresso = Progresso(f"Comparando q{k + 1}", quantidade, passos=5)
+            for lote in dividir_lotes(alunos, k, quantidade, pares, processos):
+                yield comparar_lote, (k, lote), progresso
+
+    # Os processos recebem o bloco uma vez, no initializer; cada lote leva
+    # só os seus pares.
+    memoria, layout = empacotar_assinaturas(alunos)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=processos,
+            initializer=anexar_assinaturas,
+            initargs=(
+                memoria.name,
+                layout,
+                list(PESOS_VOCABULARIO),
+                contar_questoes(alunos),
+                ngramas_do_codigo_base(codigo_base or {}),
+            ),
+        ) as executor:
+            for progresso, resultados in executar_em_fluxo(
+                executor, trabalhos(), processos * LOTES_PENDENTES_POR_PROCESSO
+            ):
+                progresso.avancar(len(resultados))
+                yield resultados
+    finally:
+        memoria.close()
+        memoria.unlink()
+
+
 # -------------------------------
-# Comparar todas as questões
+# Motor matricial (NumPy/SciPy): todos os pares de uma questão de uma vez
 # -------------------------------
-def comparar_questoes(alunos):
-    # Serializar alunos para envio leve
-    alunos_serializavel = [
-        {
-            "email": a.email,
-            "questoes": [
-                {"assinatura": q.assinatura, "funcoes": q.funcoes} if q else None
-                for q in a.questoes
-            ],
-        }
-        for a in alunos
-    ]
+MOTORES = ("python", "matricial")
 
-    pares = list(combinations(range(len(alunos)), 2))
-    chunk_size = math.ceil(len(pares) / os.cpu_count())  # ajustável
-    resultados = []
 
-    with ProcessPoolExecutor() as executor:
-        chunks = [pares[i : i + chunk_size] for i in range(0, len(pares), chunk_size)]
-        futures = [
-            executor.submit(comparar_par_chunk, c, alunos_serializavel) for c in chunks
-        ]
-        for f in futures:
-            resultados.extend(f.result())
+def calcular_similaridades_matriz(alunos, tarefas, processos=None):
+    """Gera os resultados de cada questão assim que a matriz dela fica pronta.
 
-    # Adicionar comentários finais
+    Cada questão é um trabalho independente no pool, submetido quando os
+    pares dela são gerados."""
+    if not matrix_engine_available():
+        raise RuntimeError(
+            "O motor matricial precisa de numpy e scipy (pip install numpy scipy)."
+        )
+
+    def trabalhos():
+        for k, _, pares in tarefas:
+            pares = list(pares)
+            if not pares:
+                continue
+            # A matriz só precisa dos alunos que aparecem nos pares pedidos
+            presentes = sorted({i for par in pares for i in par})
+            questoes = [alunos[i].questoes[k] for i in presentes]
+            yield final_similarity_matrix, (questoes,), (k, presentes, pares)
+
+    processos = min(processos or os.cpu_count(), max(1, contar_questoes(alunos)))
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        for (k, presentes, pares), matriz in executar_em_fluxo(
+            executor, trabalhos(), processos
+        ):
+            linha = {i: pos for pos, i in enumerate(presentes)}
+            yield [(i, j, k, float(matriz[linha[i], linha[j]])) for i, j in pares]
+
+
+def calcular_max_sim(alunos, resultados):
+    max_sim = [[0] * contar_questoes(alunos) for _ in alunos]
     for i, j, k, sim_final in resultados:
-        aluno_a, aluno_b = alunos[i], alunos[j]
-        if sim_final > aluno_a.questoes[k].max_sim:
-            aluno_a.questoes[k].max_sim = sim_final
-        if sim_final > aluno_b.questoes[k].max_sim:
-            aluno_b.questoes[k].max_sim = sim_final
+        if sim_final > max_sim[i][k]:
+            max_sim[i][k] = sim_final
+        if sim_final > max_sim[j][k]:
+            max_sim[j][k] = sim_final
+    return max_sim
+
+
+def verificar_candidatos(alunos, resultados, agregador, resultados_exaustivos, referencia):
+    """Compara a execução com a referência exaustiva (os dois agregadores já
+    consumiram seus resultados) e imprime o recall e os pares sinalizados a
+    mais, cada execução com o próprio limiar."""
+    max_exaustivo = calcular_max_sim(alunos, resultados_exaustivos)
+    num_questoes = contar_questoes(alunos)
+
+    sinalizados = {(i, j, k) for i, j, k, _ in referencia.pares_acima()}
+    podados = {(i, j, k) for i, j, k, _ in agregador.pares_acima()}
+    encontrados = podados & sinalizados
+    a_mais = podados - sinalizados
+    recall = len(encontrados) / len(sinalizados) if sinalizados else 1.0
+    referencia_par = {(i, j, k): sim_final for i, j, k, sim_final in resultados_exaustivos}
+    diferenca_par = max(
+        (abs(sim_final - referencia_par[(i, j, k)]) for i, j, k, sim_final in resultados),
+        default=0,
+    )
+    # O max_sim do agregador já não tem os pares extras da amostra
+    diferenca = max(
+        (
+            abs(max_exaustivo[i][k] - agregador.max_sim.get((i, k), 0))
+            for i, aluno in enumerate(alunos)
+            for k in range(num_questoes)
+            if aluno.questoes[k]
+        ),
+        default=0,
+    )
+    diferenca_media = max(
+        (abs(a - b) for a, b in zip(agregador.medias(), referencia.medias())), default=0
+    )
 
-    q_count = [0] * 4
-    avg_list = [0] * 4
+    print(
+        f"Verificação de candidatos: {len(resultados)}/{len(resultados_exaustivos)} pares "
+        f"comparados, recall dos pares sinalizados {recall * 100:.2f}% "
+        f"({len(encontrados)}/{len(sinalizados)}), {len(a_mais)} sinalizados a mais, "
+        f"maior diferença da média {diferenca_media:.4f}, "
+        f"maior diferença de max_sim {diferenca:.4f}, "
+        f"maior diferença por par {diferenca_par:.4f}"
+    )
+    return recall
 
-    for aluno in alunos:
-        for i, q in enumerate(aluno.questoes):
-            if q == None:
+
+# -------------------------------
+# Modo incremental
+# -------------------------------
+def caminho_similaridades(lista):
+    base = os.path.dirname(__file__)
+    raiz = os.path.abspath(os.path.join(base, ".."))
+    return os.path.join(raiz, "Downloads", lista, "output", "similaridades.sqlite")
+
+
+# Muda junto com a fórmula de similaridade (2: funções emparelhadas pela
+# mais parecida, não pelo nome; 3: emparelhadas pelas impressões)
+VERSAO_SIMILARIDADE = 3
+
+
+def parametros_incrementais(limiar_candidato, analisador="ast", codigo_base=""):
+    # Resultados salvos com outros parâmetros não são reaproveitados. Com
+    # --base-automatica o código base muda um pouco quando entram arquivos
+    # novos; os pares salvos mantêm o código base da execução em que foram feitos.
+    return (
+        f"{VERSAO_CACHE}/{analisador}|similaridade={VERSAO_SIMILARIDADE}"
+        f"|limiar_candidato={limiar_candidato}|codigo_base={codigo_base}"
+    )
+
+
+# Tarefas consultadas no armazenamento de cada vez
+LOTE_CONSULTA = 1000
+
+
+class ReaproveitamentoIncremental:
+    """Separa, lote a lote, as tarefas que já têm resultado salvo.
+
+    As tarefas são as mesmas da execução completa: um par que virou candidato
+    só porque outros arquivos mudaram (a poda por frequência depende da turma
+    toda) é comparado agora, e um par salvo que deixou de ser candidato não
+    entra no resultado. Assim o modo incremental dá o mesmo resultado que a
+    execução completa.
+
+    Com grupos de cópias idênticas, a tarefa entre dois representantes é
+    reaproveitada se todos os pares dos membros estão salvos; os resultados
+    reaproveitados vão direto para reaproveitar(i, j, k, sim), sem passar
+    pelos processos nem ser salvos de novo."""
+
+    def __init__(self, alunos, armazenamento, grupos, reaproveitar):
+        self.alunos = alunos
+        self.armazenamento = armazenamento
+        self.grupos = grupos
+        self.reaproveitar = reaproveitar
+        self.pendentes = 0
+        self.reaproveitados = 0
+        atuais = {
+            (aluno.email, q.numero): q.hash_arquivo
+            for aluno in alunos
+            for q in aluno.questoes
+            if q
+        }
+        self.alterados = armazenamento.sync_files(atuais)
+
+    def filtrar(self, tarefas):
+        """Recebe e gera tarefas no formato de gerar_tarefas, só com os pares
+        pendentes."""
+        for k, _, pares in tarefas:
+            pendentes = []
+            lote = []
+            for par in pares:
+                lote.append(par)
+                if len(lote) == LOTE_CONSULTA:
+                    pendentes.extend(self.separar(k, lote))
+                    lote = []
+            if lote:
+                pendentes.extend(self.separar(k, lote))
+            self.pendentes += len(pendentes)
+            yield k, len(pendentes), pendentes
+
+    def separar(self, k, lote):
+        membros = self.grupos[k]
+        alunos = self.alunos
+
+        def chave(a, b):
+            return tuple(sorted((alunos[a].email, alunos[b].email)))
+
+        salvos = self.armazenamento.load_scores(
+            k + 1, {chave(a, b) for i, j in lote for a in membros[i] for b in membros[j]}
+        )
+        pendentes = []
+        for i, j in lote:
+            pares = [(a, b) for a in membros[i] for b in membros[j]]
+            if not all(chave(a, b) in salvos for a, b in pares):
+                pendentes.append((i, j))
                 continue
-            avg_list[i] += q.max_sim
-            q_count[i] += 1
+            for a, b in pares:
+                self.reaproveitar(min(a, b), max(a, b), k, salvos[chave(a, b)])
+            self.reaproveitados += len(pares)
+        return pendentes
 
-    for i in range(4):
-        if q_count[i] > 0:
-            avg_list[i] /= q_count[i]
+    def resumo(self):
+        return (
+            f"Modo incremental: {len(self.alterados)} arquivos novos ou alterados, "
+            f"{self.pendentes} pares a comparar, {self.reaproveitados} reaproveitados"
+        )
 
-    for i, j, k, sim_final in resultados:
-        if sim_final < avg_list[k] + 0.1:
-            continue
+
+def salvar_lotes(alunos, lotes, armazenamento):
+    for lote in lotes:
+        armazenamento.save_pairs(
+            (k + 1, alunos[i].email, alunos[j].email, sim_final)
+            for i, j, k, sim_final in lote
+        )
+        yield lote
+
+
+# -------------------------------
+# Comparar todas as questões
+# -------------------------------
+def juntar_lotes(lotes):
+    return [resultado for lote in lotes for resultado in lote]
+
+
+# Parceiros mais parecidos guardados por aluno e questão
+TOP_K = 10
+
+
+class AgregadorSimilaridade:
+    """Consome os resultados em fluxo, sem guardar a lista de todos os pares.
+
+    Mantém, por aluno e questão, o max_sim e um heap com os TOP_K parceiros
+    mais parecidos, e por questão a soma dos max_sim (para a média). Com
+    grupos de cópias idênticas, os heaps são dos representantes: um grupo
+    conta como um parceiro só, os pares dentro do grupo ficam fora do top-k
+    e os membros são expandidos só em pares_acima. Sem isso, num grupo com
+    mais de TOP_K membros os pares entre eles empurrariam os outros para fora
+    dos heaps.
+
+    Com a poda, os pares extras da amostra (sortear_amostras) só corrigem a
+    média: não entram nos heaps nem no max_sim, para que os alunos sorteados
+    não tenham mais pares sinalizados que os outros. extras é o conjunto que
+    gerar_tarefas preenche enquanto gera as tarefas, antes dos resultados
+    chegarem."""
+
+    def __init__(self, alunos, top_k=TOP_K, grupos=None, amostras=None, extras=None):
+        self.alunos = alunos
+        self.top_k = top_k
+        self.grupos = grupos
+        num_questoes = contar_questoes(alunos)
+        self.soma_max = [0.0] * num_questoes
+        self.heaps = {}
+        self.internos = {}
+        self.representante = {}
+        self.max_sim = {}
+        self.amostras = amostras or {}
+        self.extras = extras if extras is not None else set()
+        self.max_amostra = {}
+        if grupos is not None:
+            self.representante = {
+                (membro, k): rep
+                for k, por_rep in grupos.items()
+                for rep, membros in por_rep.items()
+                for membro in membros
+            }
+
+    def membros(self, rep, k):
+        return self.grupos[k][rep] if self.grupos is not None else [rep]
+
+    def adicionar(self, i, j, k, sim_final):
+        rep_i = self.representante.get((i, k), i)
+        rep_j = self.representante.get((j, k), j)
+        if (min(rep_i, rep_j), max(rep_i, rep_j), k) in self.extras:
+            for aluno in (rep_i, rep_j):
+                if aluno in self.amostras[k]:
+                    chave = (aluno, k)
+                    self.max_amostra[chave] = max(self.max_amostra.get(chave, 0), sim_final)
+            return
+
+        for aluno in (i, j):
+            atual = self.max_sim.get((aluno, k), 0)
+            if sim_final > atual:
+                self.soma_max[k] += sim_final - atual
+                self.max_sim[(aluno, k)] = sim_final
+
+        if rep_i == rep_j:
+            self.internos[(rep_i, k)] = sim_final
+            return
+        for aluno, parceiro in ((rep_i, rep_j), (rep_j, rep_i)):
+            heap = self.heaps.setdefault((aluno, k), [])
+            # Os pares de membros de dois grupos repetem o par dos representantes
+            if (sim_final, parceiro) in heap:
+                continue
+            if len(heap) < self.top_k:
+                heapq.heappush(heap, (sim_final, parceiro))
+            elif (sim_final, parceiro) > heap[0]:
+                heapq.heapreplace(heap, (sim_final, parceiro))
+
+    def medias(self):
+        medias = []
+        for k, soma in enumerate(self.soma_max):
+            total = sum(1 for aluno in self.alunos if aluno.questoes[k])
+            medias.append(soma / total + self.correcao(k) if total else 0)
+        return medias
+
+    def correcao(self, k):
+        """Quanto a poda baixou, em média, o max_sim dos alunos da amostra;
+        cada representante pesa pelo tamanho do grupo."""
+        diferenca = 0.0
+        peso = 0
+        for rep in self.amostras.get(k, ()):
+            podado = self.max_sim.get((rep, k), 0)
+            exato = max(podado, self.max_amostra.get((rep, k), 0))
+            membros = len(self.membros(rep, k))
+            diferenca += membros * (exato - podado)
+            peso += membros
+        return diferenca / peso if peso else 0.0
+
+    def pares_acima(self, margem=0.1):
+        """Pares (i, j, k, sim) acima de média + margem, em ordem estável."""
+        medias = self.medias()
+        pares = set()
+        for (aluno, k), heap in self.heaps.items():
+            for sim_final, parceiro in heap:
+                if sim_final >= medias[k] + margem:
+                    for a in self.membros(aluno, k):
+                        for b in self.membros(parceiro, k):
+                            pares.add((min(a, b), max(a, b), k, sim_final))
+        for (rep, k), sim_final in self.internos.items():
+            if sim_final >= medias[k] + margem:
+                pares.update(
+                    (a, b, k, sim_final) for a, b in combinations(self.membros(rep, k), 2)
+                )
+        return sorted(pares)
+
+
+def comparar_questoes(
+    alunos,
+    limiar_candidato=LIMIAR_CANDIDATO,
+    verificar=False,
+    motor="python",
+    processos=None,
+    armazenamento=None,
+    top_k=TOP_K,
+    modelos=None,
+    fracao_base=0.0,
+    codigo_base=None,
+):
+    preparar_caracteristicas(alunos)
+    # main já detecta o código base, que também vale para os outros detectores
+    if codigo_base is None:
+        codigo_base = detectar_codigo_base(alunos, modelos, fracao_base)
+    if codigo_base:
+        subtrair_codigo_base(alunos, codigo_base)
+    grupos = agrupar_identicos(alunos)
+    resumo = resumir_identicos(grupos)
+    if resumo:
+        print(f"Cópias idênticas: {resumo}")
+    amostras, extras = {}, set()
+    if limiar_candidato > 0:
+        amostras = sortear_amostras(alunos, grupos)
+    tarefas = gerar_tarefas(alunos, limiar_candidato, grupos, amostras, extras)
+    agregador = AgregadorSimilaridade(alunos, top_k, grupos, amostras, extras)
+    incremental = None
+    if armazenamento and not verificar:
+        incremental = ReaproveitamentoIncremental(
+            alunos, armazenamento, grupos, agregador.adicionar
+        )
+        tarefas = incremental.filtrar(tarefas)
+
+    if motor == "matricial":
+        lotes = calcular_similaridades_matriz(alunos, tarefas, processos)
+    else:
+        lotes = calcular_similaridades(alunos, tarefas, processos, codigo_base)
+    lotes = expandir_identicos(alunos, lotes, grupos)
+    if incremental:
+        lotes = salvar_lotes(alunos, lotes, armazenamento)
+
+    # A referência é sempre o motor Python comparando todos os pares. O
+    # relatório continua sendo o da execução verificada.
+    verificando = verificar and (limiar_candidato > 0 or motor != "python")
+    if verificando:
+        lotes = [juntar_lotes(lotes)]
+        resultados_exaustivos = juntar_lotes(
+            calcular_similaridades(alunos, gerar_tarefas(alunos, 0), processos, codigo_base)
+        )
+        referencia = AgregadorSimilaridade(alunos, top_k)
+        for resultado in resultados_exaustivos:
+            referencia.adicionar(*resultado)
+
+    for lote in lotes:
+        for resultado in lote:
+            agregador.adicionar(*resultado)
+    if incremental:
+        print(incremental.resumo())
+    for (i, k), max_sim in agregador.max_sim.items():
+        alunos[i].questoes[k].max_sim = max_sim
+
+    if verificando:
+        verificar_candidatos(alunos, lotes[0], agregador, resultados_exaustivos, referencia)
+    pares = agregador.pares_acima()
+    for i, j, k, sim_final in pares:
         aluno_a, aluno_b = alunos[i], alunos[j]
         msg = f"SIMILARIDADE q{k + 1}_{aluno_b.email} {sim_final * 100:.2f}%"
         aluno_a.comentarios.append(msg)
         aluno_b.comentarios.append(msg.replace(aluno_b.email, aluno_a.email))
+    return pares
+
+
+# -------------------------------
+# Winnowing local (alternativa ao MOSS)
+# -------------------------------
+LIMIAR_COPIA = 80
+
+
+def detectar_winnowing(alunos, limiar_copia=LIMIAR_COPIA, ngramas_base=None):
+    """Resultados no formato de moss_script, a partir das assinaturas AST,
+    sem o código base ({k: n-gramas de ngramas_do_codigo_base})."""
+    ngramas_base = ngramas_base or {}
+    resultados = []
+    for k in range(contar_questoes(alunos)):
+        documentos = {
+            aluno.email: sem_codigo_base(aluno.questoes[k].assinatura, ngramas_base.get(k))
+            for aluno in alunos
+            if aluno.questoes[k]
+        }
+        resultados.extend(winnowing_results(f"q{k + 1}", documentos, limiar_copia))
+    return resultados
+
+
+# -------------------------------
+# Histórico (listas já processadas, de outros semestres)
+# -------------------------------
+PREFIXO_HISTORICO = "HISTORICO "
+HISTORICO_MAX_MB = 256
+
+
+def caminho_historico():
+    base = os.path.dirname(__file__)
+    raiz = os.path.abspath(os.path.join(base, ".."))
+    return os.path.join(raiz, "Downloads", ".historico", "impressoes.sqlite")
+
+
+def identificar_lista(lista, num_questoes):
+    """Origem da lista no histórico (semestre + nome) e a chave de cada questão:
+    o nome da questão na planilha quando o metadata tem, senão lista/qN."""
+    base = os.path.dirname(__file__)
+    raiz = os.path.abspath(os.path.join(base, ".."))
+    pasta_lista = os.path.join(raiz, "Downloads", lista)
+    semestre = ""
+    nomes = {}
+    for nome in sorted(os.listdir(pasta_lista)):
+        if RE_METADATA.fullmatch(nome):
+            metadata = ListMetadata.load_metadata_from_json(
+                os.path.join(pasta_lista, nome)
+            )
+            if metadata:
+                semestre = semestre or metadata.semester
+                for q, nome_questao in metadata.question_names.items():
+                    if nome_questao and not nomes.get(q):
+                        nomes[q] = nome_questao
+    chaves = [
+        nomes[f"q{k + 1}"].strip().lower() if nomes.get(f"q{k + 1}") else f"{lista}/q{k + 1}"
+        for k in range(num_questoes)
+    ]
+    return f"{semestre} {lista}".strip(), chaves
+
+
+def comparar_historico(lista, alunos, corpus, limiar_copia=LIMIAR_COPIA, ngramas_base=None):
+    """Compara cada submissão com as das listas anteriores do histórico, anota
+    a maior coincidência acima do limiar em comentarios e depois guarda as
+    impressões desta lista no histórico. O código base fica de fora das
+    impressões. Retorna quantos arquivos coincidiram."""
+    ngramas_base = ngramas_base or {}
+    origem, chaves = identificar_lista(lista, contar_questoes(alunos))
+    documentos = []
+    encontrados = 0
+    for aluno in alunos:
+        for k, questao in enumerate(aluno.questoes):
+            if not questao:
+                continue
+            impressoes = fingerprints(sem_codigo_base(questao.assinatura, ngramas_base.get(k)))
+            if not impressoes:
+                continue
+            documentos.append((chaves[k], aluno.email, impressoes))
+
+            tamanho, coincidencias = corpus.query(chaves[k], impressoes, origem)
+            melhor = None
+            for outra_origem, outro_aluno, em_comum, tamanho_outro in coincidencias:
+                percentual = copy_percentage(em_comum, min(tamanho, tamanho_outro))
+                if percentual >= limiar_copia and (melhor is None or percentual > melhor[0]):
+                    melhor = (percentual, outro_aluno, outra_origem)
+            if melhor:
+                encontrados += 1
+                percentual, outro_aluno, outra_origem = melhor
+                aluno.comentarios.append(
+                    f"{PREFIXO_HISTORICO}q{k + 1}_{outro_aluno} ({outra_origem}) {percentual}%"
+                )
+
+    corpus.add_origin(origem, documentos)
+    corpus.compact(keep=origem)
+    return encontrados
+
+
+# -------------------------------
+# Trechos copiados (Greedy String Tiling)
+# -------------------------------
+def assinatura_com_linhas(codigo_limpo, analisador="ast"):
+    """Tokens da assinatura e a linha de origem de cada um, pelo mesmo caminho
+    de processar_codigo: os tokens são os mesmos de questao.assinatura."""
+    if analisador == "ast":
+        ast = gerar_ast(codigo_limpo)
+        if ast:
+            remover_cabecalhos(ast)
+            visitor = ASTSignature(com_linhas=True)
+            visitor.visit(ast)
+            return ids_tokens(visitor.tokens), visitor.linhas
+    visitor = LexerSignature()
+    try:
+        if not visitor.run(main_file_code(codigo_limpo)):
+            return [], []
+    except RecursionError:
+        return [], []
+    return ids_tokens(visitor.tokens), visitor.lines
+
+
+def detectar_trechos(
+    alunos, pares, min_match=MIN_MATCH, analisador="ast", ngramas_base=None
+):
+    """Trechos em comum, com as linhas de cada arquivo, dos pares sinalizados.
+    Usa o questao.codigo_limpo guardado por carregar_questoes(guardar_codigo=True).
+    O código base não entra nos trechos nem na cobertura."""
+    ngramas_base = ngramas_base or {}
+    assinaturas = {}
+
+    def carregar(questao, k):
+        if questao.caminho not in assinaturas:
+            tokens, linhas = assinatura_com_linhas(questao.codigo_limpo, analisador)
+            base = posicoes_codigo_base(tokens, ngramas_base.get(k))
+            assinaturas[questao.caminho] = tokens, linhas, base
+        return assinaturas[questao.caminho]
+
+    relatorio = []
+    for i, j, k, sim_final in pares:
+        qa, qb = alunos[i].questoes[k], alunos[j].questoes[k]
+        tokens_a, linhas_a, base_a = carregar(qa, k)
+        tokens_b, linhas_b, base_b = carregar(qb, k)
+        ladrilhos = greedy_string_tiling(
+            tokens_a, tokens_b, min_match, ignored_a=base_a, ignored_b=base_b
+        )
+        cobertura = tile_coverage(
+            ladrilhos, len(tokens_a) - sum(base_a), len(tokens_b) - sum(base_b)
+        )
+        relatorio.append(
+            {
+                "question": f"q{k + 1}",
+                "student1": alunos[i].email,
+                "student2": alunos[j].email,
+                "similaridade": sim_final,
+                "cobertura": round(cobertura, 4),
+                "trechos": tiles_to_line_spans(ladrilhos, linhas_a, linhas_b),
+            }
+        )
+    return relatorio
+
+
+def salvar_trechos(lista, relatorio):
+    base = os.path.dirname(__file__)
+    raiz = os.path.abspath(os.path.join(base, ".."))
+    pasta = os.path.join(raiz, "Downloads", lista, "output")
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, "trechos_similares.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=4, ensure_ascii=False)
+    return caminho
 
 
 # -------------------------------
@@ -310,55 +1747,325 @@ def comparar_questoes(alunos):
 # -------------------------------
 
 
-def salvar_json(lista: str, alunos: list[Aluno]):
+RE_STUDENTS = re.compile(r"students_turma[A-Z]\.json", re.IGNORECASE)
+PREFIXO_SIMILARIDADE = "SIMILARIDADE "
+
+
+def salvar_json(lista: str, alunos: list[Aluno], prefixos=(PREFIXO_SIMILARIDADE,)):
     base = os.path.dirname(__file__)
     raiz = os.path.abspath(os.path.join(base, ".."))
     downloads = os.path.join(raiz, "Downloads", lista)
 
-    arquivos = ["students_turmaA.json", "students_turmaB.json", "students_turmaC.json"]
+    arquivos = sorted(nome for nome in os.listdir(downloads) if RE_STUDENTS.fullmatch(nome))
     dados = {}
+    originais = {}
 
     for arq in arquivos:
         caminho = os.path.join(downloads, arq)
         with open(caminho, "r", encoding="utf-8") as f:
             lista_alunos = json.load(f)
+            originais[arq] = json.dumps(lista_alunos, ensure_ascii=False)
             dados[arq] = {aluno["login"]: aluno for aluno in lista_alunos}
 
-    for aluno in alunos:
-        if len(aluno.comentarios) == 0:
-            continue
-        for arq in arquivos:
-            if aluno.email in dados[arq]:
-                if not dados[arq][aluno.email]["copia"]:
-                    dados[arq][aluno.email]["comentario"] += "\n" + "\n".join(
-                        aluno.comentarios
-                    )
-                    dados[arq][aluno.email]["copia"] = 1
-                break
+    comentarios = {aluno.email: aluno.comentarios for aluno in alunos}
+    for arq in arquivos:
+        for login, registro in dados[arq].items():
+            # Comentários de uma execução anterior são substituídos pelos atuais
+            linhas = registro["comentario"].split("\n")
+            mantidas = [l for l in linhas if not l.startswith(prefixos)]
+            marcado_antes = any(
+                l.startswith((PREFIXO_SIMILARIDADE, PREFIXO_HISTORICO)) for l in linhas
+            )
+            if len(mantidas) != len(linhas):
+                registro["comentario"] = "\n".join(mantidas)
+
+            novos = comentarios.get(login)
+            if novos and (marcado_antes or not registro["copia"]):
+                registro["comentario"] = "\n".join(filter(None, [registro["comentario"], *novos]))
+                registro["copia"] = 1
+            elif marcado_antes and not any(
+                l.startswith((PREFIXO_SIMILARIDADE, PREFIXO_HISTORICO)) for l in mantidas
+            ):
+                # A cópia tinha sido marcada só por estes comentários, que saíram
+                registro["copia"] = 0
 
     for arq in arquivos:
+        lista_alunos = [dados[arq][key] for key in dados[arq].keys()]
+        if json.dumps(lista_alunos, ensure_ascii=False) == originais[arq]:
+            continue
         caminho = os.path.join(downloads, arq)
         with open(caminho, "w", encoding="utf-8") as f:
-            lista_alunos = [dados[arq][key] for key in dados[arq].keys()]
             json.dump(lista_alunos, f, indent=4, ensure_ascii=False)
 
 
 # -------------------------------
 # Main
 # -------------------------------
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Detecção de plágio local")
+    parser.add_argument("lista", nargs="?", default="LISTA 01")
+    parser.add_argument(
+        "--limiar-candidato",
+        type=float,
+        default=LIMIAR_CANDIDATO,
+        help="fração mínima de n-gramas compartilhados para comparar um par "
+        "(0 compara todos os pares)",
+    )
+    parser.add_argument(
+        "--verificar",
+        action="store_true",
+        help="compara também todos os pares com o motor Python e informa o "
+        "recall da poda, os pares sinalizados a mais e a diferença entre os motores",
+    )
+    parser.add_argument(
+        "--motor",
+        choices=MOTORES,
+        default="python",
+        help="'matricial' calcula todos os pares de cada questão com NumPy/SciPy",
+    )
+    parser.add_argument(
+        "--analisador",
+        choices=ANALISADORES,
+        default="ast",
+        help="'lexer' dispensa o pycparser e usa só o analisador léxico (mais rápido); "
+        "no padrão ele só é usado nos arquivos que o pycparser não aceita",
+    )
+    parser.add_argument(
+        "--pre-processar",
+        action="store_true",
+        help="roda o pré-processador C (gcc -E) com os cabeçalhos falsos da libc "
+        "antes da análise, em vez de só apagar as linhas com #",
+    )
+    parser.add_argument(
+        "--sem-cache",
+        action="store_true",
+        help="não usa o cache de assinaturas em Downloads/.cache",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=CACHE_MAX_MB,
+        help="tamanho máximo do cache de assinaturas",
+    )
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=None,
+        help="número de processos para analisar e comparar os arquivos "
+        "(padrão: todos os núcleos)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="reaproveita as similaridades salvas em output/similaridades.sqlite "
+        "e só compara pares com arquivos novos ou alterados",
+    )
+    parser.add_argument(
+        "--base-automatica",
+        type=float,
+        default=0.0,
+        metavar="FRACAO",
+        help="ignora como código base os n-gramas presentes em mais que essa "
+        "fração dos arquivos da questão (ex.: 0.6); os modelos em "
+        "Downloads/<LISTA>/base/qN*.c são sempre ignorados",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=TOP_K,
+        help="parceiros mais parecidos guardados por aluno e questão para os comentários",
+    )
+    parser.add_argument(
+        "--winnowing",
+        action="store_true",
+        help="usa o winnowing local no lugar do MOSS e grava o resultado como o moss_main",
+    )
+    parser.add_argument(
+        "--limiar-copia",
+        type=int,
+        default=LIMIAR_COPIA,
+        help="porcentagem mínima para o winnowing marcar cópia",
+    )
+    parser.add_argument(
+        "--historico",
+        action="store_true",
+        help="compara as submissões com as das listas já processadas (outros "
+        "semestres) e guarda esta lista no histórico em Downloads/.historico",
+    )
+    parser.add_argument(
+        "--historico-max-mb",
+        type=int,
+        default=HISTORICO_MAX_MB,
+        help="tamanho máximo do histórico; as listas mais antigas saem primeiro",
+    )
+    parser.add_argument(
+        "--trechos",
+        action="store_true",
+        help="roda o Greedy String Tiling nos pares sinalizados e salva as linhas "
+        "em comum em output/trechos_similares.json",
+    )
+    parser.add_argument(
+        "--min-trecho",
+        type=int,
+        default=MIN_MATCH,
+        help="menor trecho, em tokens, considerado pelo Greedy String Tiling",
+    )
+    return parser.parse_args()
+
+
 def main():
-    lista_nome = sys.argv[1] if len(sys.argv) > 0 else "LISTA 01"
+    args = ler_argumentos()
+    lista_nome = args.lista
+
+    cache = None
+    if not args.sem_cache:
+        cache = SignatureCache(
+            caminho_cache_assinaturas(), max_bytes=args.cache_max_mb * 1024 * 1024
+        )
+
+    preprocessador = None
+    if args.pre_processar:
+        preprocessador = CPreprocessor(
+            None if args.sem_cache else caminho_cache_preprocessador(),
+            max_bytes=args.cache_max_mb * 1024 * 1024,
+        )
+        if not preprocessador.available:
+            print("Nenhum gcc/clang encontrado no PATH; seguindo sem pré-processador.")
+            preprocessador = None
 
     start_time = time.time()
-    alunos = carregar_questoes(lista_nome)
+    try:
+        alunos = carregar_questoes(
+            lista_nome,
+            cache,
+            args.processos,
+            args.analisador,
+            preprocessador,
+            guardar_codigo=args.trechos,
+        )
+        modelos, chave_modelos = carregar_modelos(
+            lista_nome, args.analisador, preprocessador
+        )
+    finally:
+        if cache:
+            cache.close()
+        if preprocessador:
+            preprocessador.close()
     print(f"Tempo de carregamento: {(time.time() - start_time):.2f}s")
+    if cache:
+        estatisticas = cache.stats()
+        print(
+            f"Cache de assinaturas: {estatisticas['hits']} acertos, "
+            f"{estatisticas['misses']} faltas, {estatisticas['evictions']} removidos"
+        )
+    if preprocessador:
+        estatisticas = preprocessador.stats()
+        print(
+            f"Pré-processador: {estatisticas['hits']} arquivos do cache, "
+            f"{estatisticas['runs']} chamadas, {estatisticas['failures']} falhas"
+        )
+    print(
+        "Arquivos por caminho: "
+        + ", ".join(f"{caminho}={total}" for caminho, total in sorted(CAMINHOS_ANALISE.items()))
+    )
+
+    # O código base sai de todos os detectores: das características na
+    # comparação e da sequência de tokens no histórico, winnowing e trechos
+    codigo_base = {}
+    if modelos or args.base_automatica > 0:
+        preparar_caracteristicas(alunos)
+        codigo_base = detectar_codigo_base(alunos, modelos, args.base_automatica)
+    ngramas_base = ngramas_do_codigo_base(codigo_base)
+    if codigo_base:
+        print(
+            "Código base ignorado: "
+            + ", ".join(f"q{k + 1}={len(ids)} n-gramas" for k, ids in sorted(codigo_base.items()))
+        )
+
+    prefixos = (PREFIXO_SIMILARIDADE,)
+    if args.historico:
+        start_time = time.time()
+        corpus = FingerprintCorpus(
+            caminho_historico(),
+            VERSAO_CACHE,
+            max_bytes=args.historico_max_mb * 1024 * 1024,
+        )
+        try:
+            encontrados = comparar_historico(
+                lista_nome, alunos, corpus, args.limiar_copia, ngramas_base
+            )
+            estatisticas = corpus.stats()
+        finally:
+            corpus.close()
+        print(
+            f"Histórico: {encontrados} arquivos parecidos com listas anteriores "
+            f"({estatisticas['origins']} listas, {estatisticas['documents']} arquivos no histórico)"
+        )
+        print(f"Tempo do histórico: {(time.time() - start_time):.2f}s")
+        prefixos += (PREFIXO_HISTORICO,)
+
+    if args.winnowing:
+        start_time = time.time()
+        resultados = detectar_winnowing(alunos, args.limiar_copia, ngramas_base)
+        print(f"Tempo do winnowing: {(time.time() - start_time):.2f}s")
+        for r in resultados:
+            print(
+                f"{r['question']}: {r['student1']} ({r['percentage1']}%) <-> "
+                f"{r['student2']} ({r['percentage2']}%)"
+            )
+        base = os.path.dirname(__file__)
+        raiz = os.path.abspath(os.path.join(base, ".."))
+        update_moss_results_json(
+            os.path.join(raiz, "Downloads", lista_nome), resultados, args.limiar_copia
+        )
+        if args.historico:
+            salvar_json(lista_nome, alunos, (PREFIXO_HISTORICO,))
+        return
+
+    armazenamento = None
+    if args.incremental:
+        armazenamento = SimilarityStore(
+            caminho_similaridades(lista_nome),
+            parametros_incrementais(
+                args.limiar_candidato,
+                args.analisador,
+                f"{chave_modelos}/{args.base_automatica}",
+            ),
+        )
 
     start_time = time.time()
-    comparar_questoes(alunos)
+    try:
+        pares = comparar_questoes(
+            alunos,
+            args.limiar_candidato,
+            args.verificar,
+            args.motor,
+            args.processos,
+            armazenamento,
+            args.top_k,
+            codigo_base=codigo_base,
+        )
+    except BaseException:
+        # sync_files já apagou os pares dos arquivos alterados e gravou os
+        # hashes novos: sem os pares novos, nada disso pode ficar salvo
+        if armazenamento:
+            armazenamento.close(commit=False)
+        raise
+    if armazenamento:
+        armazenamento.close()
     print(f"Tempo de comparação: {(time.time() - start_time):.2f}s")
 
+    if args.trechos:
+        start_time = time.time()
+        relatorio = detectar_trechos(
+            alunos, pares, args.min_trecho, args.analisador, ngramas_base
+        )
+        caminho = salvar_trechos(lista_nome, relatorio)
+        print(f"Trechos em comum de {len(pares)} pares salvos em {caminho}")
+        print(f"Tempo dos trechos: {(time.time() - start_time):.2f}s")
+
     start_time = time.time()
-    salvar_json(lista_nome, alunos)
+    salvar_json(lista_nome, alunos, prefixos)
     print(f"Tempo de salvar: {(time.time() - start_time):.2f}s")
 
 
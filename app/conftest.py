@@ -0,0 +1 @@
+# Os testes importam os módulos como os scripts, a partir de app/
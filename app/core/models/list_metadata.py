@@ -1,4 +1,4 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 import json
 import os
 from utils.utils import log_error, log_info
@@ -10,6 +10,8 @@ class ListMetadata:
     num_questions: int
     score: dict
     language: str = ""
+    semester: str = ""
+    question_names: dict = field(default_factory=dict)
 
     def save_metadata_to_json(self, path: str):
         try:
@@ -2,18 +2,22 @@ import os
 import re
 import sys
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 import utils.utils as utils
-from core.models.student_submission import save_students_to_json
+from core.models.student_submission import save_students_to_json, load_students_from_json
 from services.file_renamer import rename_files, integrate_renaming
-from infrastructure.submission_handler import download_submissions
-from utils.utils import log_error, format_list_title, read_id_from_file, log_info, get_available_turma_letters
+from infrastructure.submission_handler import download_submissions, DOWNLOAD_WORKERS
+from utils.utils import log_error, format_list_title, read_id_from_file, log_info
 from infrastructure.auth_google import get_credentials
-from infrastructure.classroom_gateway import list_classroom_data
-from utils.sheet_id_handler import semester_informations, list_questions
+from infrastructure.classroom_gateway import list_classroom_data, list_student_submissions, get_available_turma_letters
+from infrastructure.roster_cache import RosterCache
+from infrastructure.download_cache import DownloadCache
+from infrastructure.run_journal import RunJournal, JOURNAL_NAME, EXTRACTED, ORGANIZED, RENAMED, MERGED, FINISHED
+from utils.sheet_id_handler import semester_informations, list_questions, question_names
 from core.models.list_metadata import ListMetadata
 from infrastructure.folders_organizer import (
-    organize_extracted_files,
+    organize_student_archive,
     move_non_zip_files,
     if_there_is_a_folder_inside,
     delete_subfolders_in_student_folders,
@@ -22,6 +26,96 @@ from infrastructure.folders_organizer import (
 from services.code_analyzer import log_small_submissions, apply_small_files_penalties
 from services.submission_verifier import verify_and_comment_valid_questions_considering_penalties
 
+# Extração de .zip/.rar de uma turma enquanto os downloads continuam
+EXTRACTION_WORKERS = 2
+
+# Baixa a lista de novo numa pasta que já existe, reaproveitando do cache os
+# anexos que não mudaram no Drive
+REFRESH_FLAG = "--atualizar"
+
+def clear_download_outputs(base_path):
+    """Apaga o que o download gera na pasta da lista, mantendo o resto de
+    output (resultados da comparação, histórico)."""
+    for name in os.listdir(base_path):
+        path = os.path.join(base_path, name)
+        if name == "submissions" or name.startswith("zips_turma"):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name == JOURNAL_NAME or re.match(r'(students|metadata)_turma[A-Z]\.json$', name):
+            os.remove(path)
+    for name in ("small_files.txt", "check_rename.txt"):
+        path = os.path.join(base_path, "output", name)
+        if os.path.exists(path):
+            os.remove(path)
+    log_info(f"Download anterior removido de {base_path}")
+
+def extract_student(journal, zips_folder, submissions_folder, student):
+    # Uma extração interrompida pode ter deixado a pasta pela metade
+    shutil.rmtree(os.path.join(submissions_folder, student.login), ignore_errors=True)
+    organize_student_archive(zips_folder, submissions_folder, student)
+    journal.record(EXTRACTED, student)
+
+def process_class(creds, drive_service, download_executor, job):
+    """Baixa, extrai, organiza e renomeia as submissões de uma turma.
+
+    Cada turma roda na sua thread com o seu cliente do Classroom (httplib2 não
+    é thread-safe); os downloads de todas as turmas dividem download_executor.
+    O zip de cada aluno é extraído assim que termina de baixar, enquanto os
+    downloads dos próximos alunos continuam. As etapas já registradas no
+    diário de uma execução interrompida não são refeitas."""
+    class_letter = job["class_letter"]
+    zips_folder = job["zips_folder"]
+    formatted_class = f"turma{class_letter}"
+    submissions_folder = os.path.join(zips_folder, f"submissions_{formatted_class}")
+    students_path = job["students_path"]
+    journal = job["journal"].for_class(class_letter)
+
+    if journal.done(RENAMED):
+        print(f"\nTurma {class_letter} já foi baixada e renomeada antes da interrupção.")
+        return students_path
+
+    if journal.done(ORGANIZED):
+        student_list = load_students_from_json(students_path)
+    else:
+        os.makedirs(submissions_folder, exist_ok=True)
+        classroom_service = build("classroom", "v1", credentials=creds)
+
+        print(f"\nComeçando download da turma {class_letter} ...")
+        with ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS) as extractor:
+            extractions = []
+            student_list = download_submissions(
+                classroom_service, drive_service, job["submissions"],
+                zips_folder, job["classroom_id"], job["coursework_id"], job["num_questions"],
+                job["roster_cache"], creds,
+                executor=download_executor,
+                download_cache=job["download_cache"],
+                journal=journal,
+                on_student_ready=lambda student: extractions.append(
+                    extractor.submit(extract_student, journal, zips_folder, submissions_folder, student)
+                ),
+            )
+            for extraction in extractions:
+                extraction.result()
+
+        print(f"\nDownload da turma {class_letter} completo. Arquivos salvos em:", os.path.abspath(zips_folder))
+
+        move_non_zip_files(zips_folder, formatted_class)
+        if_there_is_a_folder_inside(student_list, submissions_folder)
+        delete_subfolders_in_student_folders(submissions_folder)
+        remove_empty_folders(submissions_folder)
+        save_students_to_json(student_list, students_path)
+        journal.record(ORGANIZED)
+
+        print("\nProcesso de organização de pastas finalizado:", os.path.abspath(submissions_folder))
+
+    language = rename_files(submissions_folder, job["list_title"], job["questions_data"], student_list)
+    remove_empty_folders(submissions_folder)
+
+    ListMetadata.update_language(job["metadata_path"], language)
+    save_students_to_json(student_list, students_path)
+    journal.record(RENAMED)
+    print(f"\nProcesso de verificação e renomeação da turma {class_letter} finalizado.")
+    return students_path
+
 def main():
     try:
         creds = get_credentials()
@@ -35,7 +129,9 @@ def main():
 
         semester = semester_informations(sheet_id)
       
-        desired_title = sys.argv[1].strip() if len(sys.argv) > 1 else None
+        args = [arg for arg in sys.argv[1:] if arg != REFRESH_FLAG]
+        refresh = REFRESH_FLAG in sys.argv[1:]
+        desired_title = args[0].strip() if args else None
 
         list_name = list_title = None
         list_title_a = None
@@ -43,8 +139,17 @@ def main():
         formatted_list = None
         script_dir = os.path.dirname(os.path.abspath(__file__))
         students_paths = {}
+        class_jobs = []
+        journal = None
+        roster_cache = RosterCache(
+            os.path.join(os.path.dirname(script_dir), "Downloads", ".cache", "rosters")
+        )
+        download_cache = DownloadCache(
+            os.path.join(os.path.dirname(script_dir), "Downloads", ".cache", "anexos")
+        )
         class_letters = get_available_turma_letters(classroom_service, semester) or ["A", "B"]
 
+        # Primeiro os dados de todas as turmas (a turma A define a lista das outras)...
         for class_letter in class_letters:
             turma_type = f"TURMA {class_letter}"
 
@@ -65,10 +170,18 @@ def main():
 
                 list_name_ref = list_name
                 formatted_list = format_list_title(list_name)
-                base_path = os.path.join(script_dir, "Downloads", formatted_list)
+                base_path = os.path.join(os.path.dirname(script_dir), "Downloads", formatted_list)
+                journal = RunJournal(os.path.join(base_path, JOURNAL_NAME))
                 if os.path.exists(base_path):
-                    print(f"Já existe uma pasta de download para a lista '{formatted_list}', não é possível continuar.\n")
-                    return
+                    if refresh:
+                        clear_download_outputs(base_path)
+                        journal = RunJournal(journal.path)
+                    elif journal.exists() and not journal.done(FINISHED):
+                        print(f"Retomando o download interrompido da lista '{formatted_list}'.\n")
+                    else:
+                        print(f"Já existe uma pasta de download para a lista '{formatted_list}', não é possível continuar "
+                              f"(use {REFRESH_FLAG} para baixar de novo só o que mudou).\n")
+                        return
 
             else:
                 if list_name != list_name_ref:
@@ -91,7 +204,6 @@ def main():
             base_path = os.path.join(project_root, "Downloads", formatted_list)
             utils.FOLDER_PATH = os.path.join(base_path, "output")
             zips_folder = os.path.join(base_path, f"zips_{formatted_class}")
-            submissions_folder = os.path.join(zips_folder, f"submissions_{formatted_class}")
 
             os.makedirs(zips_folder, exist_ok=True)
 
@@ -101,61 +213,67 @@ def main():
                 class_name=classroom_name,
                 list_name=list_title,
                 num_questions=num_questions,
-                score=score
+                score=score,
+                semester=semester or "",
+                question_names=question_names(questions_data)
             )
 
             metadata_filename = f"metadata_turma{class_letter.upper()}.json"
             metadata_path = os.path.join(base_path, metadata_filename)
-            ListMetadata.save_metadata_to_json(metadata, metadata_path)
-
-            submissions = classroom_service.courses().courseWork().studentSubmissions().list(
-                courseId=classroom_id, courseWorkId=coursework_id).execute()
-
-            print(f"\nComeçando download da turma {class_letter} ...")
-            student_list = download_submissions(
-                classroom_service, drive_service, submissions,
-                zips_folder, classroom_id, coursework_id, num_questions
-            )
-
-            print("\nDownload completo. Arquivos salvos em:", os.path.abspath(zips_folder))
-
-            students_filename = f"students_turma{class_letter.upper()}.json"
-            students_path = os.path.join(base_path, students_filename)
-            save_students_to_json(student_list, students_path)
-
-            organize_extracted_files(zips_folder, student_list, formatted_class)
-            move_non_zip_files(zips_folder, formatted_class)
-            if_there_is_a_folder_inside(student_list, submissions_folder)
-            delete_subfolders_in_student_folders(submissions_folder)
-            remove_empty_folders(submissions_folder)
-            save_students_to_json(student_list, students_path)
-
-            print("\nProcesso de organização de pastas finalizado:", os.path.abspath(submissions_folder))
-
-            language = rename_files(submissions_folder, list_title, questions_data, student_list)
-            remove_empty_folders(submissions_folder)
-
-            metadata_path = os.path.join(base_path, f"metadata_turma{class_letter.upper()}.json")
-            ListMetadata.update_language(metadata_path, language)
-            save_students_to_json(student_list, students_path)
-            students_paths[class_letter] = students_path
-            print("\nProcesso de verificação e renomeação finalizado.")
-
-        integrate_renaming(turma_folders, list_title, questions_data)
+            if not journal.done(RENAMED, class_letter):
+                # Já renomeada, a turma tem no metadata a linguagem detectada
+                ListMetadata.save_metadata_to_json(metadata, metadata_path)
+
+            submissions = {
+                "studentSubmissions": list(list_student_submissions(classroom_service, classroom_id, coursework_id))
+            }
+
+            class_jobs.append({
+                "class_letter": class_letter,
+                "classroom_id": classroom_id,
+                "coursework_id": coursework_id,
+                "submissions": submissions,
+                "zips_folder": zips_folder,
+                "num_questions": num_questions,
+                "list_title": list_title,
+                "questions_data": questions_data,
+                "metadata_path": metadata_path,
+                "students_path": os.path.join(base_path, f"students_turma{class_letter.upper()}.json"),
+                "roster_cache": roster_cache,
+                "download_cache": download_cache,
+                "journal": journal,
+            })
+
+        # ... depois as turmas em paralelo, com um limite de downloads para todas
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as download_executor:
+            with ThreadPoolExecutor(max_workers=len(class_jobs)) as class_executor:
+                class_futures = [
+                    class_executor.submit(process_class, creds, drive_service, download_executor, job)
+                    for job in class_jobs
+                ]
+                for job, future in zip(class_jobs, class_futures):
+                    students_paths[job["class_letter"]] = future.result()
 
         final_submissions_folder = os.path.join(project_root, "Downloads", formatted_list, "submissions")
         os.makedirs(final_submissions_folder, exist_ok=True)
 
-        for zips_folder in turma_folders:
-            class_name = os.path.basename(zips_folder).replace("zips_", "")
-            src_submission_path = os.path.join(zips_folder, f"submissions_{class_name}")
-            for student in os.listdir(src_submission_path):
-                src_path = os.path.join(src_submission_path, student)
-                dst_path = os.path.join(final_submissions_folder, student)
-                shutil.move(src_path, dst_path)
+        if not journal.done(MERGED):
+            integrate_renaming(turma_folders, list_title, questions_data)
+
+            for zips_folder in turma_folders:
+                class_name = os.path.basename(zips_folder).replace("zips_", "")
+                src_submission_path = os.path.join(zips_folder, f"submissions_{class_name}")
+                if not os.path.isdir(src_submission_path):
+                    # Já movida antes da interrupção
+                    continue
+                for student in os.listdir(src_submission_path):
+                    src_path = os.path.join(src_submission_path, student)
+                    dst_path = os.path.join(final_submissions_folder, student)
+                    shutil.move(src_path, dst_path)
 
-            shutil.rmtree(src_submission_path)
-            log_info(f"Pasta deletada: {src_submission_path}")
+                shutil.rmtree(src_submission_path)
+                log_info(f"Pasta deletada: {src_submission_path}")
+            journal.record(MERGED)
 
         print("\nSubmissões unificadas em:", final_submissions_folder)
 
@@ -173,6 +291,7 @@ def main():
             penalty_logs=[log_path],
             treat_zero_as_invalid=True
         )
+        journal.record(FINISHED)
 
     
     except Exception as e:
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from infrastructure.signature_cache import DEFAULT_MAX_BYTES, SQLiteCache, signature_key
+from utils.utils import log_error, log_info
+
+FAKE_LIBC_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "external_tools", "fake_libc_include"
+)
+COMPILERS = ("gcc", "clang", "cc")
+# Arquivos por chamada do gcc -E (limite de tamanho da linha de comando no Windows)
+BATCH_SIZE = 200
+TIMEOUT = 120
+# Nome do arquivo do aluno nas marcações de linha da saída
+SOURCE_NAME = "submissao.c"
+
+RE_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"]+)[>"]', re.MULTILINE)
+RE_LINE_MARKER = re.compile(r'^#\s*(\d+)\s+"([^"]*)"')
+RE_HEADER_DECLARATION = re.compile(r"^(?:typedef|extern)\b[^;]*?\b(\w+)\s*;$")
+RE_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+
+
+def find_compiler():
+    for name in COMPILERS:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def strip_unknown_includes(code):
+    """Apaga os #include sem cabeçalho falso correspondente (conio.h de outra
+    plataforma, .h do próprio aluno), mantendo a numeração das linhas."""
+
+    def replace(match):
+        header = match.group(1).replace("\\", "/")
+        if os.path.isfile(os.path.join(FAKE_LIBC_DIR, header)):
+            return match.group(0)
+        return ""
+
+    return RE_INCLUDE.sub(replace, code)
+
+
+def main_file_code(text):
+    """Só as linhas do arquivo do aluno, sem os cabeçalhos, cada uma na sua
+    linha original. Código que não passou pelo pré-processador volta igual."""
+    if not text.startswith("#") and "\n#" not in text:
+        return text
+    lines = []
+    current = None
+    line_number = 1
+    for line in text.split("\n"):
+        marker = RE_LINE_MARKER.match(line)
+        if marker:
+            line_number = int(marker.group(1))
+            current = marker.group(2)
+            continue
+        if current == SOURCE_NAME:
+            lines.extend([""] * (line_number - 1 - len(lines)))
+            lines.append(line)
+        line_number += 1
+    return "\n".join(lines)
+
+
+class PreprocessCache(SQLiteCache):
+    """Saída do pré-processador, indexada pelo hash do código original."""
+
+    table = "preprocessed"
+    label = "Cache do pré-processador"
+
+
+class CPreprocessor:
+    """Roda o pré-processador C (gcc -E) com os cabeçalhos falsos da libc,
+    vários arquivos por chamada."""
+
+    def __init__(self, cache_path=None, max_bytes=DEFAULT_MAX_BYTES, compiler=None):
+        self.compiler = compiler or find_compiler()
+        self.cache = PreprocessCache(cache_path, max_bytes) if cache_path else None
+        self.runs = 0
+        self.failures = 0
+        self.version = self._version() if self.compiler else None
+
+    @property
+    def available(self):
+        return self.compiler is not None
+
+    def _version(self):
+        """Identifica o compilador e os cabeçalhos falsos: mudar um deles
+        invalida o cache."""
+        digest = hashlib.sha256()
+        try:
+            result = subprocess.run(
+                [self.compiler, "--version"], capture_output=True, text=True, timeout=TIMEOUT
+            )
+            digest.update(result.stdout.split("\n", 1)[0].encode("utf-8"))
+        except (OSError, subprocess.SubprocessError) as e:
+            log_error(f"Erro ao consultar a versão de {self.compiler}: {e}")
+        for folder, _, files in sorted(os.walk(FAKE_LIBC_DIR)):
+            for name in sorted(files):
+                digest.update(name.encode("utf-8"))
+                with open(os.path.join(folder, name), "rb") as f:
+                    digest.update(f.read())
+        return digest.hexdigest()
+
+    def preprocess_many(self, sources):
+        """Código pré-processado de cada fonte, ou None onde o pré-processador falhou."""
+        results = [None] * len(sources)
+        pending = []
+        for pos, source in enumerate(sources):
+            key = signature_key(source, self.version)
+            cached = self.cache.get_bytes(key) if self.cache else None
+            if cached is None:
+                pending.append((pos, key))
+            elif cached:
+                # Vazio marca falha já registrada
+                results[pos] = cached.decode("utf-8")
+
+        batches = [pending[i : i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        if not batches:
+            return results
+        with ThreadPoolExecutor(max_workers=min(len(batches), os.cpu_count() or 1)) as executor:
+            outputs = executor.map(
+                lambda batch: self._run_batch([sources[pos] for pos, _ in batch]), batches
+            )
+            for batch, output in zip(batches, outputs):
+                for (pos, key), text in zip(batch, output):
+                    results[pos] = text
+                    if text is None:
+                        self.failures += 1
+                    if self.cache:
+                        self.cache.put_bytes(key, (text or "").encode("utf-8"))
+        return results
+
+    def _run_batch(self, sources):
+        self.runs += 1
+        names = [f"{pos:04d}.c" for pos in range(len(sources))]
+        with tempfile.TemporaryDirectory() as folder:
+            for name, source in zip(names, sources):
+                with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+                    f.write(strip_unknown_includes(source))
+            command = [self.compiler, "-E", "-nostdinc", "-I", FAKE_LIBC_DIR] + names
+            try:
+                result = subprocess.run(
+                    command,
+                    cwd=folder,
+                    capture_output=True,
+                    text=True,
+                    encoding="utf-8",
+                    errors="replace",
+                    timeout=TIMEOUT,
+                )
+            except subprocess.TimeoutExpired as e:
+                log_error(f"Pré-processador: timeout após {e.timeout}s")
+                return [None] * len(sources)
+            except OSError as e:
+                log_error(f"Pré-processador: falha ao invocar {self.compiler}: {e}")
+                return [None] * len(sources)
+
+        failed = {
+            name
+            for name in names
+            if re.search(
+                rf"^{re.escape(name)}:\d+(?::\d+)?: (?:fatal )?error", result.stderr, re.MULTILINE
+            )
+        }
+        if failed:
+            log_info(f"Pré-processador: {len(failed)} de {len(names)} arquivos com erro")
+        outputs = split_output(result.stdout, names)
+        return [
+            None if name in failed or name not in outputs else outputs[name] for name in names
+        ]
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "hits": self.cache.hits if self.cache else 0,
+        }
+
+    def close(self):
+        if self.cache:
+            self.cache.close()
+
+
+def split_output(stdout, names):
+    """Separa a saída de um gcc -E com vários arquivos: {nome: código}."""
+    expected = set(names)
+    outputs = {}
+    current = None
+    lines = []
+    for line in stdout.split("\n"):
+        marker = RE_LINE_MARKER.match(line)
+        if marker and marker.group(2) in expected and marker.group(2) != current:
+            if current is not None:
+                outputs[current] = normalize_output(lines, current)
+            current, lines = marker.group(2), []
+        if current is not None:
+            lines.append(line)
+    if current is not None:
+        outputs[current] = normalize_output(lines, current)
+    return outputs
+
+
+def normalize_output(lines, name):
+    """Deixa a saída de um arquivo independente do nome temporário e da pasta
+    de instalação (o mesmo código dá sempre o mesmo texto) e tira dos
+    cabeçalhos os typedef/extern que o aluno não usa, que só deixariam o
+    pycparser mais lento."""
+    used = set()
+    in_source = False
+    for line in lines:
+        marker = RE_LINE_MARKER.match(line)
+        if marker:
+            in_source = marker.group(2) == name
+        elif in_source:
+            used.update(RE_IDENTIFIER.findall(line))
+
+    result = []
+    in_source = False
+    for line in lines:
+        marker = RE_LINE_MARKER.match(line)
+        if marker:
+            file_name = marker.group(2)
+            in_source = file_name == name
+            if file_name.startswith("<"):
+                continue
+            if in_source:
+                line = f'# {marker.group(1)} "{SOURCE_NAME}"'
+            else:
+                line = line.replace(FAKE_LIBC_DIR, "fake_libc_include")
+        elif not in_source:
+            declaration = RE_HEADER_DECLARATION.match(line)
+            if not line.strip() or (declaration and declaration.group(1) not in used):
+                continue
+        result.append(line)
+    return "\n".join(result)
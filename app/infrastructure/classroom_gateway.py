@@ -3,10 +3,78 @@ from googleapiclient.errors import HttpError
 from utils.utils import log_error, log_info
 
 
+# Tamanho padrão das páginas nas listagens do Classroom
+DEFAULT_PAGE_SIZE = 100
+
+# Só os campos que o download usa de cada item
+COURSE_FIELDS = "id,name"
+COURSEWORK_FIELDS = "id,title"
+SUBMISSION_FIELDS = (
+    "userId,state,submissionHistory/stateHistory,"
+    "assignmentSubmission/attachments/driveFile(id,title)"
+)
+ROSTER_FIELDS = "userId,profile(emailAddress,name/fullName)"
+
+
+def iterate_pages(collection, result_key, fields=None, page_size=DEFAULT_PAGE_SIZE, **params):
+    """Os itens de result_key de todas as páginas de collection.list(**params),
+    um a um, buscando a próxima página (nextPageToken) só quando a anterior
+    acaba. fields é a máscara de campos de cada item."""
+    if fields:
+        params["fields"] = f"{result_key}({fields}),nextPageToken"
+    request = collection.list(pageSize=page_size, **params)
+    while request is not None:
+        response = request.execute()
+        yield from response.get(result_key, [])
+        request = collection.list_next(request, response)
+
+
+def list_courses(service, page_size=DEFAULT_PAGE_SIZE):
+    return iterate_pages(service.courses(), "courses", COURSE_FIELDS, page_size)
+
+
+def list_course_work(service, course_id, page_size=DEFAULT_PAGE_SIZE):
+    return iterate_pages(
+        service.courses().courseWork(), "courseWork", COURSEWORK_FIELDS, page_size, courseId=course_id
+    )
+
+
+def list_student_submissions(service, course_id, coursework_id, page_size=DEFAULT_PAGE_SIZE):
+    return iterate_pages(
+        service.courses().courseWork().studentSubmissions(),
+        "studentSubmissions",
+        SUBMISSION_FIELDS,
+        page_size,
+        courseId=course_id,
+        courseWorkId=coursework_id,
+    )
+
+
+def get_available_turma_letters(service, semester, course_name_filter="PIF"):
+
+    try:
+        letters = set()
+
+        for c in list_courses(service):
+            name = c.get("name", "") or ""
+            if semester in name and course_name_filter.upper() in name.upper():
+                m = re.search(r'\bTURMA\s*([A-Z])\b', name.upper())
+                if m:
+                    letters.add(m.group(1))
+
+        found = sorted(letters)
+        if not found:
+            print(f"Nenhuma turma encontrada para {semester}.\n")
+        else:
+            print(f"Turmas encontradas no semestre {semester}: {', '.join(found)}")
+        return found
+    except Exception:
+        return ["A", "B"]
+
+
 def list_classroom_data(service, semester, turma_type, saved_assignment_title=None):
     try:
-        results = service.courses().list().execute()
-        courses = results.get("courses", [])
+        courses = list(list_courses(service))
 
         pif_courses = [
             course for course in courses
@@ -25,8 +93,7 @@ def list_classroom_data(service, semester, turma_type, saved_assignment_title=No
         print(f"\nTurma selecionada automaticamente: {classroom_name}\n")
 
         print("Buscando listas de exercícios...\n")
-        assignments = service.courses().courseWork().list(courseId=classroom_id).execute()
-        course_work = assignments.get("courseWork", [])
+        course_work = list(list_course_work(service, classroom_id))
 
         def is_valid(assg):
             title = assg.get("title", "")
@@ -80,4 +147,38 @@ def list_classroom_data(service, semester, turma_type, saved_assignment_title=No
         return None, None, None, None, None
     except Exception as e:
         log_error(f"Erro inesperado ao selecionar dados do Classroom: {e}")
-        return None, None, None, None, None
\ No newline at end of file
+        return None, None, None, None, None
+
+def list_course_students(service, course_id, page_size=DEFAULT_PAGE_SIZE):
+    """{userId: {"email", "name"}} de todos os alunos da turma, seguindo a
+    paginação. None se a API falhar."""
+    try:
+        roster = {}
+        students = iterate_pages(
+            service.courses().students(), "students", ROSTER_FIELDS, page_size, courseId=course_id
+        )
+        for student in students:
+            profile = student.get("profile", {})
+            roster[student["userId"]] = {
+                "email": profile.get("emailAddress", ""),
+                "name": profile.get("name", {}).get("fullName", ""),
+            }
+        return roster
+    except HttpError as http_err:
+        log_error(f"Erro na API do Classroom ao listar alunos da turma {course_id}: {http_err}")
+        return None
+
+
+def get_course_roster(service, course_id, cache=None, refresh=False):
+    """Alunos da turma, do cache em disco quando ainda válido."""
+    if cache and not refresh:
+        roster = cache.get(course_id)
+        if roster is not None:
+            log_info(f"Lista de alunos da turma {course_id} lida do cache ({len(roster)} alunos)")
+            return roster
+    roster = list_course_students(service, course_id)
+    if roster is None:
+        return {}
+    if cache:
+        cache.put(course_id, roster)
+    return roster
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import shutil
+from utils.utils import log_error, log_info
+
+
+class DownloadCache:
+    """Anexos já baixados do Drive, um arquivo por (id, versão). A versão é o
+    md5Checksum do arquivo (ou o modifiedTime, quando o Drive não dá md5):
+    se o aluno reenviar o arquivo, a versão muda e ele é baixado de novo."""
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def _path(self, file_id, version):
+        digest = hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.folder, f"{file_id}.{digest}")
+
+    def fetch(self, file_id, version, destination):
+        """Coloca a versão em cache do arquivo em destination (hard link, ou
+        cópia se o link não for possível). False se ela não está no cache."""
+        path = self._path(file_id, version)
+        if not os.path.isfile(path):
+            return False
+        try:
+            link_or_copy(path, destination)
+            return True
+        except OSError as e:
+            log_error(f"Erro ao ler o anexo {file_id} do cache: {e}")
+            return False
+
+    def store(self, file_id, version, source):
+        """Guarda source como a versão atual do arquivo e apaga as anteriores."""
+        path = self._path(file_id, version)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            temporary = f"{path}.tmp"
+            link_or_copy(source, temporary)
+            os.replace(temporary, path)
+            for name in os.listdir(self.folder):
+                old = os.path.join(self.folder, name)
+                if name.startswith(f"{file_id}.") and old != path:
+                    os.remove(old)
+                    log_info(f"Versão antiga do anexo {file_id} removida do cache")
+        except OSError as e:
+            log_error(f"Erro ao salvar o anexo {file_id} no cache: {e}")
+
+
+def link_or_copy(source, destination):
+    # Os anexos nunca são alterados no lugar (só movidos ou apagados), então
+    # o hard link pode ser dividido entre o cache e a pasta da lista
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
@@ -0,0 +1,33 @@
+from googleapiclient.errors import HttpError
+from utils.utils import log_error, log_info
+
+# Limite de requisições por batch da API do Drive
+DRIVE_BATCH_SIZE = 100
+VERSION_FIELDS = "id,md5Checksum,modifiedTime"
+
+
+def get_file_versions(drive_service, file_ids, http=None):
+    """{file_id: versão} dos arquivos, com uma requisição em batch a cada
+    DRIVE_BATCH_SIZE arquivos. A versão é o md5Checksum, ou o modifiedTime
+    quando o arquivo não tem md5. Arquivos cuja consulta falha ficam de fora."""
+    versions = {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            log_info(f"Não foi possível obter a versão do arquivo {request_id}: {exception}")
+            return
+        version = response.get("md5Checksum") or response.get("modifiedTime")
+        if version:
+            versions[response["id"]] = version
+
+    unique_ids = list(dict.fromkeys(file_id for file_id in file_ids if file_id))
+    files = drive_service.files()
+    for start in range(0, len(unique_ids), DRIVE_BATCH_SIZE):
+        batch = drive_service.new_batch_http_request(callback=on_response)
+        for file_id in unique_ids[start:start + DRIVE_BATCH_SIZE]:
+            batch.add(files.get(fileId=file_id, fields=VERSION_FIELDS), request_id=file_id)
+        try:
+            batch.execute(http=http)
+        except HttpError as http_err:
+            log_error(f"Erro na API do Drive ao consultar versões dos anexos: {http_err}")
+    return versions
@@ -0,0 +1,129 @@
+#ifndef _FAKE_DEFINES_H
+#define _FAKE_DEFINES_H
+
+/* Cabeçalhos falsos da libc, no estilo do fake_libc_include do pycparser:
+   só as macros e os tipos que o pycparser precisa para entender o código,
+   sem as declarações reais das bibliotecas. */
+
+#define NULL 0
+#define EOF (-1)
+#define EXIT_SUCCESS 0
+#define EXIT_FAILURE 1
+#define RAND_MAX 2147483647
+#define BUFSIZ 8192
+#define FILENAME_MAX 4096
+#define FOPEN_MAX 16
+#define L_tmpnam 20
+#define TMP_MAX 238328
+#define SEEK_SET 0
+#define SEEK_CUR 1
+#define SEEK_END 2
+#define _IOFBF 0
+#define _IOLBF 1
+#define _IONBF 2
+#define CLOCKS_PER_SEC 1000000
+#define MB_CUR_MAX 1
+#define MB_LEN_MAX 16
+#define WEOF (-1)
+
+#define bool _Bool
+#define true 1
+#define false 0
+#define __bool_true_false_are_defined 1
+
+#define CHAR_BIT 8
+#define SCHAR_MIN (-128)
+#define SCHAR_MAX 127
+#define UCHAR_MAX 255
+#define CHAR_MIN (-128)
+#define CHAR_MAX 127
+#define SHRT_MIN (-32768)
+#define SHRT_MAX 32767
+#define USHRT_MAX 65535
+#define INT_MIN (-2147483647 - 1)
+#define INT_MAX 2147483647
+#define UINT_MAX 4294967295U
+#define LONG_MIN (-9223372036854775807L - 1)
+#define LONG_MAX 9223372036854775807L
+#define ULONG_MAX 18446744073709551615UL
+#define LLONG_MIN (-9223372036854775807LL - 1)
+#define LLONG_MAX 9223372036854775807LL
+#define ULLONG_MAX 18446744073709551615ULL
+#define SIZE_MAX 18446744073709551615UL
+#define INT8_MIN (-128)
+#define INT8_MAX 127
+#define UINT8_MAX 255
+#define INT16_MIN (-32768)
+#define INT16_MAX 32767
+#define UINT16_MAX 65535
+#define INT32_MIN (-2147483647 - 1)
+#define INT32_MAX 2147483647
+#define UINT32_MAX 4294967295U
+#define INT64_MIN (-9223372036854775807LL - 1)
+#define INT64_MAX 9223372036854775807LL
+#define UINT64_MAX 18446744073709551615ULL
+
+#define FLT_DIG 6
+#define FLT_EPSILON 1.19209290e-7F
+#define FLT_MAX 3.40282347e+38F
+#define FLT_MIN 1.17549435e-38F
+#define DBL_DIG 15
+#define DBL_EPSILON 2.2204460492503131e-16
+#define DBL_MAX 1.7976931348623157e+308
+#define DBL_MIN 2.2250738585072014e-308
+
+#define M_E 2.7182818284590452354
+#define M_LOG2E 1.4426950408889634074
+#define M_LOG10E 0.43429448190325182765
+#define M_LN2 0.69314718055994530942
+#define M_LN10 2.30258509299404568402
+#define M_PI 3.14159265358979323846
+#define M_PI_2 1.57079632679489661923
+#define M_PI_4 0.78539816339744830962
+#define M_1_PI 0.31830988618379067154
+#define M_2_PI 0.63661977236758134308
+#define M_SQRT2 1.41421356237309504880
+#define M_SQRT1_2 0.70710678118654752440
+#define INFINITY (1.0 / 0.0)
+#define NAN (0.0 / 0.0)
+#define HUGE_VAL INFINITY
+
+#define EDOM 33
+#define ERANGE 34
+#define EILSEQ 84
+
+#define LC_ALL 6
+#define LC_COLLATE 3
+#define LC_CTYPE 0
+#define LC_MONETARY 4
+#define LC_NUMERIC 1
+#define LC_TIME 2
+
+#define SIGABRT 6
+#define SIGFPE 8
+#define SIGILL 4
+#define SIGINT 2
+#define SIGSEGV 11
+#define SIGTERM 15
+#define SIG_DFL 0
+#define SIG_IGN 1
+#define SIG_ERR (-1)
+
+#define va_start(ap, last) ((void) 0)
+#define va_arg(ap, type) (*(type *) 0)
+#define va_end(ap) ((void) 0)
+#define va_copy(dest, src) ((void) 0)
+
+/* Extensões do GNU e do MSVC que o pycparser não conhece */
+#define __attribute__(x)
+#define __extension__
+#define __inline inline
+#define __inline__ inline
+#define __restrict
+#define __restrict__
+#define __asm__(x)
+#define __declspec(x)
+#define __cdecl
+#define __stdcall
+
+#endif
@@ -0,0 +1,88 @@
+#ifndef _FAKE_TYPEDEFS_H
+#define _FAKE_TYPEDEFS_H
+
+typedef int size_t;
+typedef int ssize_t;
+typedef int ptrdiff_t;
+typedef int max_align_t;
+typedef int wchar_t;
+typedef int wint_t;
+typedef int wctype_t;
+typedef int wctrans_t;
+typedef int mbstate_t;
+typedef int char16_t;
+typedef int char32_t;
+
+typedef int FILE;
+typedef int fpos_t;
+typedef int va_list;
+
+typedef int time_t;
+typedef int clock_t;
+typedef int suseconds_t;
+typedef int useconds_t;
+
+typedef int div_t;
+typedef int ldiv_t;
+typedef int lldiv_t;
+typedef int imaxdiv_t;
+typedef int jmp_buf;
+typedef int sig_atomic_t;
+typedef int fenv_t;
+typedef int fexcept_t;
+typedef int errno_t;
+typedef int locale_t;
+
+typedef int int8_t;
+typedef int uint8_t;
+typedef int int16_t;
+typedef int uint16_t;
+typedef int int32_t;
+typedef int uint32_t;
+typedef int int64_t;
+typedef int uint64_t;
+typedef int int_least8_t;
+typedef int uint_least8_t;
+typedef int int_least16_t;
+typedef int uint_least16_t;
+typedef int int_least32_t;
+typedef int uint_least32_t;
+typedef int int_least64_t;
+typedef int uint_least64_t;
+typedef int int_fast8_t;
+typedef int uint_fast8_t;
+typedef int int_fast16_t;
+typedef int uint_fast16_t;
+typedef int int_fast32_t;
+typedef int uint_fast32_t;
+typedef int int_fast64_t;
+typedef int uint_fast64_t;
+typedef int intptr_t;
+typedef int uintptr_t;
+typedef int intmax_t;
+typedef int uintmax_t;
+
+typedef int pid_t;
+typedef int off_t;
+typedef int mode_t;
+typedef int uid_t;
+typedef int gid_t;
+
+/* windows.h */
+typedef int BOOL;
+typedef int BYTE;
+typedef int WORD;
+typedef int DWORD;
+typedef int HANDLE;
+typedef int UINT;
+typedef int LONG;
+typedef int LPSTR;
+typedef int LPCSTR;
+typedef int COORD;
+
+extern FILE *stdin;
+extern FILE *stdout;
+extern FILE *stderr;
+extern int errno;
+
+#endif
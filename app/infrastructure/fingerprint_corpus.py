@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import time
+from utils.utils import log_error, log_info
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Na compactação, impressões presentes em mais que essa fração dos documentos
+# de uma questão viram "comuns" (main, leitura da entrada...) e saem do índice
+MAX_DOCUMENT_FREQUENCY = 0.5
+MIN_DOCUMENTS_FOR_FREQUENCY = 20
+
+
+class FingerprintCorpus:
+    """Impressões digitais (winnowing) de todas as listas já processadas.
+
+    Cada documento é a submissão de um aluno para uma questão, e vem de uma
+    origem (semestre + lista). A busca usa o índice (questão, impressão), sem
+    percorrer os documentos antigos."""
+
+    def __init__(self, path, version, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.version = version
+        self.max_bytes = max_bytes
+        self._common = {}
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id INTEGER PRIMARY KEY, origin TEXT NOT NULL, question TEXT NOT NULL,"
+            " student TEXT NOT NULL, version TEXT NOT NULL, size INTEGER NOT NULL,"
+            " added REAL NOT NULL, UNIQUE (origin, question, student));"
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " question TEXT NOT NULL, hash INTEGER NOT NULL, document INTEGER NOT NULL,"
+            " PRIMARY KEY (question, hash, document)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS idx_fingerprints_document ON fingerprints (document);"
+            "CREATE TABLE IF NOT EXISTS common ("
+            " question TEXT NOT NULL, hash INTEGER NOT NULL,"
+            " PRIMARY KEY (question, hash)) WITHOUT ROWID;"
+        )
+
+    def common(self, question):
+        if question not in self._common:
+            self._common[question] = {
+                value
+                for (value,) in self.conn.execute(
+                    "SELECT hash FROM common WHERE question = ?", (question,)
+                )
+            }
+        return self._common[question]
+
+    def query(self, question, fingerprints, exclude_origin):
+        """Documentos de outras origens com impressões em comum.
+
+        Retorna (tamanho indexável da consulta, [(origem, aluno, em comum,
+        tamanho do documento)])."""
+        indexed = fingerprints - self.common(question)
+        if not indexed:
+            return 0, []
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS query (hash INTEGER PRIMARY KEY)")
+        self.conn.execute("DELETE FROM query")
+        self.conn.executemany("INSERT INTO query (hash) VALUES (?)", ((v,) for v in indexed))
+        rows = self.conn.execute(
+            "SELECT d.origin, d.student, m.shared, d.size FROM ("
+            "  SELECT f.document, COUNT(*) AS shared FROM query q"
+            "  JOIN fingerprints f ON f.question = ? AND f.hash = q.hash"
+            "  GROUP BY f.document) m"
+            " JOIN documents d ON d.id = m.document"
+            " WHERE d.origin != ? AND d.version = ?",
+            (question, exclude_origin, self.version),
+        ).fetchall()
+        return len(indexed), rows
+
+    def add_origin(self, origin, documents):
+        """documents: iterável de (questao, aluno, impressoes). Substitui o que
+        já existia dessa origem (a mesma lista processada de novo)."""
+        try:
+            self.remove_origin(origin)
+            now = time.time()
+            for question, student, fingerprints in documents:
+                indexed = fingerprints - self.common(question)
+                cursor = self.conn.execute(
+                    "INSERT INTO documents (origin, question, student, version, size, added)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (origin, question, student, self.version, len(indexed), now),
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO fingerprints (question, hash, document) VALUES (?, ?, ?)",
+                    ((question, value, cursor.lastrowid) for value in indexed),
+                )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            log_error(f"Erro ao gravar {origin} no histórico de impressões: {e}")
+
+    def remove_origin(self, origin):
+        self.conn.execute(
+            "DELETE FROM fingerprints WHERE document IN"
+            " (SELECT id FROM documents WHERE origin = ?)",
+            (origin,),
+        )
+        self.conn.execute("DELETE FROM documents WHERE origin = ?", (origin,))
+
+    def used_bytes(self):
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def compact(self, keep=None):
+        """Tira do índice as impressões comuns e, se o arquivo passar de
+        max_bytes, remove as origens mais antigas (nunca a origem keep)."""
+        changed = False
+        try:
+            questions = self.conn.execute(
+                "SELECT question, COUNT(*) FROM documents GROUP BY question"
+            ).fetchall()
+            for question, total in questions:
+                if total < MIN_DOCUMENTS_FOR_FREQUENCY:
+                    continue
+                frequent = self.conn.execute(
+                    "SELECT hash FROM fingerprints WHERE question = ?"
+                    " GROUP BY hash HAVING COUNT(*) > ?",
+                    (question, int(total * MAX_DOCUMENT_FREQUENCY)),
+                ).fetchall()
+                if not frequent:
+                    continue
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO common (question, hash) VALUES (?, ?)",
+                    ((question, value) for (value,) in frequent),
+                )
+                self.conn.executemany(
+                    "DELETE FROM fingerprints WHERE question = ? AND hash = ?",
+                    ((question, value) for (value,) in frequent),
+                )
+                self.conn.execute(
+                    "UPDATE documents SET size ="
+                    " (SELECT COUNT(*) FROM fingerprints WHERE document = documents.id)"
+                    " WHERE question = ?",
+                    (question,),
+                )
+                self._common.pop(question, None)
+                changed = True
+
+            origins = [
+                origin
+                for (origin,) in self.conn.execute(
+                    "SELECT origin FROM documents GROUP BY origin ORDER BY MIN(added)"
+                )
+                if origin != keep
+            ]
+            while origins and self.used_bytes() > self.max_bytes:
+                origin = origins.pop(0)
+                self.remove_origin(origin)
+                log_info(f"Histórico de impressões: {origin} removida por falta de espaço")
+                changed = True
+
+            self.conn.commit()
+            if changed:
+                self.conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            log_error(f"Erro ao compactar o histórico de impressões: {e}")
+        return changed
+
+    def stats(self):
+        origins, documents = self.conn.execute(
+            "SELECT COUNT(DISTINCT origin), COUNT(*) FROM documents"
+        ).fetchone()
+        return {"origins": origins, "documents": documents, "bytes": self.used_bytes()}
+
+    def close(self):
+        try:
+            self.conn.commit()
+        except sqlite3.Error as e:
+            log_error(f"Erro ao salvar o histórico de impressões em {self.path}: {e}")
+        finally:
+            self.conn.close()
@@ -84,113 +84,110 @@ def rename_directory_if_needed(directory_path, expected_name, student_obj):
     except Exception as e:
         log_error(f"Erro ao renomear o diretório se necessário: {str(e)}")
 
-def organize_extracted_files(download_folder, students, class_name):
+def organize_student_archive(download_folder, submissions_folder, student):
+    """Extrai e organiza o .zip/.rar de um aluno em submissions_folder/<login>."""
+    student_login = student.login
     try:
-        submissions_folder = os.path.join(download_folder, f"submissions_{class_name}")
-        os.makedirs(submissions_folder, exist_ok=True)
+        zip_path = os.path.join(download_folder, f"{student_login}.zip")
+        rar_path = os.path.join(download_folder, f"{student_login}.rar")
+        extraction_path = os.path.join(submissions_folder, student_login)
+        create_folder_if_not_exists(extraction_path)
 
-        for student in students:
-            student_login = student.login
-            zip_path = os.path.join(download_folder, f"{student_login}.zip")
-            rar_path = os.path.join(download_folder, f"{student_login}.rar")
-            extraction_path = os.path.join(submissions_folder, student_login)
-            create_folder_if_not_exists(extraction_path)
-
-            try:
-                if os.path.exists(zip_path):
-                    extract_zip(student_login, zip_path, extraction_path, student)
-                elif os.path.exists(rar_path):
-                    extract_rar(student_login, rar_path, extraction_path, student)
-                else:
-                    continue
-            except (zipfile.BadZipFile, rarfile.Error) as e:
-                log_info(f"Erro ao extrair o arquivo de {student_login}: {e}")
-                student.update_field('entregou', 0)
-                student.add_comment("Erro de submissão: compactação com erro")
-                continue
+        try:
+            if os.path.exists(zip_path):
+                extract_zip(student_login, zip_path, extraction_path, student)
+            elif os.path.exists(rar_path):
+                extract_rar(student_login, rar_path, extraction_path, student)
+            else:
+                return
+        except (zipfile.BadZipFile, rarfile.Error) as e:
+            log_info(f"Erro ao extrair o arquivo de {student_login}: {e}")
+            student.update_field('entregou', 0)
+            student.add_comment("Erro de submissão: compactação com erro")
+            return
 
-            extracted_items = os.listdir(extraction_path)
-            if not extracted_items:
-                student.update_field('entregou', 0)
-                student.add_comment("Erro de submissão: zip vazio")
-                continue
+        extracted_items = os.listdir(extraction_path)
+        if not extracted_items:
+            student.update_field('entregou', 0)
+            student.add_comment("Erro de submissão: zip vazio")
+            return
 
-            if len(extracted_items) == 1 and os.path.isdir(os.path.join(extraction_path, extracted_items[0])):
-                extracted_folder = os.path.join(extraction_path, extracted_items[0])
-                rename_directory_if_needed(extracted_folder, student_login, student)
-
-            for extracted_item in os.listdir(extraction_path):
-                extracted_item_path = os.path.join(extraction_path, extracted_item)
-
-                if os.path.exists(extracted_item_path) and os.path.isfile(extracted_item_path):
-                    if extracted_item.endswith('.zip'):
-                        student.add_comment("Erro de formatação de pasta: zip dentro do zip.")
-                        try:
-                            extract_zip(student_login, extracted_item_path, extraction_path, student)
-                            os.remove(extracted_item_path)
-                        except zipfile.BadZipFile:
-                            log_info(f"Erro ao extrair zip: {extracted_item_path}")
-                    elif extracted_item.endswith('.rar'):
-                        student.add_comment("Erro de formatação de pasta: rar dentro do rar.")
-                        try:
-                            extract_rar(student_login, extracted_item_path, extraction_path, student)
-                            os.remove(extracted_item_path)
-                        except rarfile.Error:
-                            log_info(f"Erro ao extrair rar: {extracted_item_path}")
-
-            extracted_items = os.listdir(extraction_path)
-            log_info(f"\nArquivos extraídos de {student_login}: {extracted_items}")
-            for_not_executed = True
-            if len(extracted_items) == 1:
-                extracted_path = os.path.join(extraction_path, extracted_items[0])
-
-                if os.path.isdir(extracted_path):
-                    extracted_folder = extracted_path
-
-                    if extracted_items[0] == student_login:
-                        log_info(f"A pasta extraída {extracted_items[0]} já tem o nome correto. Movendo arquivos para {extraction_path}.")
-
-                        for file in os.listdir(extracted_folder):
-                            for_not_executed = False
-                            source_file_path = os.path.join(extracted_folder, file)
-                            destination_file_path = os.path.join(extraction_path, file)
-
-                            if os.path.exists(source_file_path):
-                                log_info(f"Movendo arquivo: {source_file_path} -> {destination_file_path}")
-                                move_file(source_file_path, destination_file_path)
-                            else:
-                                log_info(f"Arquivo não encontrado: {source_file_path}")
-
-                        if not os.listdir(extracted_folder):
-                            shutil.rmtree(extracted_folder)
-                            log_info(f"Pasta extra deletada: {extracted_folder}")
-                            if for_not_executed:
-                                student.update_field('entregou', 0)
-                                student.add_comment("Não tem arquivos dentro da pasta: pasta deletada.")
+        if len(extracted_items) == 1 and os.path.isdir(os.path.join(extraction_path, extracted_items[0])):
+            extracted_folder = os.path.join(extraction_path, extracted_items[0])
+            rename_directory_if_needed(extracted_folder, student_login, student)
+
+        for extracted_item in os.listdir(extraction_path):
+            extracted_item_path = os.path.join(extraction_path, extracted_item)
+
+            if os.path.exists(extracted_item_path) and os.path.isfile(extracted_item_path):
+                if extracted_item.endswith('.zip'):
+                    student.add_comment("Erro de formatação de pasta: zip dentro do zip.")
+                    try:
+                        extract_zip(student_login, extracted_item_path, extraction_path, student)
+                        os.remove(extracted_item_path)
+                    except zipfile.BadZipFile:
+                        log_info(f"Erro ao extrair zip: {extracted_item_path}")
+                elif extracted_item.endswith('.rar'):
+                    student.add_comment("Erro de formatação de pasta: rar dentro do rar.")
+                    try:
+                        extract_rar(student_login, extracted_item_path, extraction_path, student)
+                        os.remove(extracted_item_path)
+                    except rarfile.Error:
+                        log_info(f"Erro ao extrair rar: {extracted_item_path}")
+
+        extracted_items = os.listdir(extraction_path)
+        log_info(f"\nArquivos extraídos de {student_login}: {extracted_items}")
+        for_not_executed = True
+        if len(extracted_items) == 1:
+            extracted_path = os.path.join(extraction_path, extracted_items[0])
+
+            if os.path.isdir(extracted_path):
+                extracted_folder = extracted_path
+
+                if extracted_items[0] == student_login:
+                    log_info(f"A pasta extraída {extracted_items[0]} já tem o nome correto. Movendo arquivos para {extraction_path}.")
+
+                    for file in os.listdir(extracted_folder):
+                        for_not_executed = False
+                        source_file_path = os.path.join(extracted_folder, file)
+                        destination_file_path = os.path.join(extraction_path, file)
+
+                        if os.path.exists(source_file_path):
+                            log_info(f"Movendo arquivo: {source_file_path} -> {destination_file_path}")
+                            move_file(source_file_path, destination_file_path)
                         else:
-                            log_info(f"Pasta extra {extracted_folder} ainda contém arquivos e não será deletada.")
+                            log_info(f"Arquivo não encontrado: {source_file_path}")
+
+                    if not os.listdir(extracted_folder):
+                        shutil.rmtree(extracted_folder)
+                        log_info(f"Pasta extra deletada: {extracted_folder}")
+                        if for_not_executed:
+                            student.update_field('entregou', 0)
+                            student.add_comment("Não tem arquivos dentro da pasta: pasta deletada.")
                     else:
-                        log_info(f"A pasta extraída {extracted_items[0]} é diferente do nome esperado {student_login}")
+                        log_info(f"Pasta extra {extracted_folder} ainda contém arquivos e não será deletada.")
+                else:
+                    log_info(f"A pasta extraída {extracted_items[0]} é diferente do nome esperado {student_login}")
 
-                        student.add_comment(f"Erro de formatação de pasta: a pasta extraída {extracted_items[0]} é diferente do nome esperado {student_login}.")
+                    student.add_comment(f"Erro de formatação de pasta: a pasta extraída {extracted_items[0]} é diferente do nome esperado {student_login}.")
 
-                        for file in os.listdir(extracted_folder):
-                            source_file_path = os.path.join(extracted_folder, file)
-                            destination_file_path = os.path.join(extraction_path, file)
+                    for file in os.listdir(extracted_folder):
+                        source_file_path = os.path.join(extracted_folder, file)
+                        destination_file_path = os.path.join(extraction_path, file)
 
-                            if os.path.exists(source_file_path):
-                                log_info(f"Movendo arquivo: {source_file_path} -> {destination_file_path}")
-                                move_file(source_file_path, destination_file_path)
-                            else:
-                                log_info(f"Arquivo não encontrado: {source_file_path}")
+                        if os.path.exists(source_file_path):
+                            log_info(f"Movendo arquivo: {source_file_path} -> {destination_file_path}")
+                            move_file(source_file_path, destination_file_path)
+                        else:
+                            log_info(f"Arquivo não encontrado: {source_file_path}")
 
-                        shutil.rmtree(extracted_folder)
-                        log_info(f"Pasta deletada: {extracted_folder}")
-                else:
-                    log_info(f"Erro de formatação: {student_login} enviou arquivos soltos sem pasta.")
-                    student.add_comment("Erro de formatação de pasta: enviou sem pasta")
+                    shutil.rmtree(extracted_folder)
+                    log_info(f"Pasta deletada: {extracted_folder}")
+            else:
+                log_info(f"Erro de formatação: {student_login} enviou arquivos soltos sem pasta.")
+                student.add_comment("Erro de formatação de pasta: enviou sem pasta")
     except Exception as e:
-        log_error(f"Erro ao organizar arquivos extraídos: {str(e)}")
+        log_error(f"Erro ao organizar arquivos extraídos de {student_login}: {str(e)}")
 
 def if_there_is_a_folder_inside(students, submissions_folder):
     try:
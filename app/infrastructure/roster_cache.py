@@ -0,0 +1,46 @@
+import json
+import os
+import time
+from utils.utils import log_error, log_info
+
+# A lista de alunos de uma turma quase não muda ao longo do semestre
+DEFAULT_TTL = 12 * 60 * 60
+
+
+class RosterCache:
+    """Alunos de cada turma ({userId: {"email", "name"}}), um JSON por turma
+    em disco, válido por ttl segundos."""
+
+    def __init__(self, folder, ttl=DEFAULT_TTL):
+        self.folder = folder
+        self.ttl = ttl
+
+    def _path(self, course_id):
+        return os.path.join(self.folder, f"roster_{course_id}.json")
+
+    def get(self, course_id):
+        """Alunos da turma, ou None se não estão no cache ou expiraram."""
+        path = self._path(course_id)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log_error(f"Erro ao ler a lista de alunos em cache {path}: {e}")
+            return None
+        if time.time() - data.get("fetched", 0) > self.ttl:
+            return None
+        return data.get("students", {})
+
+    def put(self, course_id, roster):
+        path = self._path(course_id)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            temporary = f"{path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump({"fetched": time.time(), "students": roster}, f, ensure_ascii=False)
+            os.replace(temporary, path)
+            log_info(f"Lista de alunos da turma {course_id} salva em cache ({len(roster)} alunos)")
+        except OSError as e:
+            log_error(f"Erro ao salvar a lista de alunos em cache {path}: {e}")
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from core.models.student_submission import StudentSubmission
+from utils.utils import log_error
+
+JOURNAL_NAME = "download_journal.jsonl"
+
+# Etapas de cada aluno, em ordem
+PROFILE = "perfil"
+DOWNLOADED = "baixado"
+EXTRACTED = "extraido"
+
+# Etapas de cada turma e do download todo
+ORGANIZED = "organizado"
+RENAMED = "renomeado"
+MERGED = "unificado"
+FINISHED = "concluido"
+
+
+class RunJournal:
+    """Diário de um download: uma linha JSON por etapa concluída, só
+    acrescentada, com o StudentSubmission do aluno naquele momento. Se o
+    download for interrompido, a próxima execução retoma cada aluno e cada
+    turma depois da última etapa registrada."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._students = {}
+        self._stages = set()
+        self._torn = False
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            line = "\n"
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Linha cortada: o processo morreu no meio da escrita
+                        continue
+                    self._apply(record)
+            # O próximo registro não pode continuar a linha cortada
+            self._torn = not line.endswith("\n")
+        except OSError as e:
+            log_error(f"Erro ao ler o diário de download {self.path}: {e}")
+
+    def _apply(self, record):
+        if "login" in record:
+            self._students[(record["turma"], record["login"])] = (record["etapa"], record["aluno"])
+        else:
+            self._stages.add((record["turma"], record["etapa"]))
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def done(self, stage, class_letter=None):
+        return (class_letter, stage) in self._stages
+
+    def record(self, stage, class_letter=None, student=None):
+        record = {"hora": time.time(), "turma": class_letter, "etapa": stage}
+        if student is not None:
+            record["login"] = student.login
+            record["aluno"] = asdict(student)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(("\n" if self._torn else "") + line + "\n")
+                self._torn = False
+            except OSError as e:
+                log_error(f"Erro ao escrever no diário de download {self.path}: {e}")
+            self._apply(record)
+
+    def student(self, class_letter, login):
+        """(etapa, StudentSubmission) do último registro do aluno, ou None."""
+        entry = self._students.get((class_letter, login))
+        if entry is None:
+            return None
+        stage, data = entry
+        return stage, StudentSubmission(**data)
+
+    def for_class(self, class_letter):
+        return ClassJournal(self, class_letter)
+
+
+class ClassJournal:
+    """Os registros de uma turma do RunJournal."""
+
+    def __init__(self, journal, class_letter):
+        self.journal = journal
+        self.class_letter = class_letter
+
+    def done(self, stage):
+        return self.journal.done(stage, self.class_letter)
+
+    def record(self, stage, student=None):
+        self.journal.record(stage, self.class_letter, student)
+
+    def student(self, login):
+        return self.journal.student(self.class_letter, login)
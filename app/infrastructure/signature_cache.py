@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from utils.utils import log_error, log_info
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def signature_key(clean_code, version):
+    return hashlib.sha256(f"{version}\0{clean_code}".encode("utf-8")).hexdigest()
+
+
+class SQLiteCache:
+    """Cache LRU em SQLite de valores comprimidos, limitado a max_bytes."""
+
+    table = "entries"
+    label = "Cache"
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            " key TEXT PRIMARY KEY,"
+            " payload BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self.conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table}_access"
+            f" ON {self.table} (last_access)"
+        )
+
+    def get_bytes(self, key):
+        """Valor descomprimido da chave, ou None quando ela não está no cache."""
+        try:
+            row = self.conn.execute(
+                f"SELECT payload FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log_error(f"Erro ao ler {self.label.lower()}: {e}")
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute(
+            f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        return zlib.decompress(row[0])
+
+    def put_bytes(self, key, data):
+        payload = zlib.compress(data)
+        try:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, payload, size, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+        except sqlite3.Error as e:
+            log_error(f"Erro ao gravar {self.label.lower()}: {e}")
+
+    def evict(self):
+        """Remove as entradas menos usadas até o cache caber em max_bytes."""
+        total = self.conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        rows = self.conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY last_access ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+
+        self.evictions += removed
+        log_info(f"{self.label}: {removed} entradas removidas ({self.path})")
+        return removed
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        try:
+            self.evict()
+            self.conn.commit()
+            if self.evictions:
+                self.conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            log_error(f"Erro ao fechar {self.label.lower()}: {e}")
+        finally:
+            self.conn.close()
+
+
+class SignatureCache(SQLiteCache):
+    """Cache das assinaturas AST, indexado pelo hash do código limpo."""
+
+    table = "signatures"
+    label = "Cache de assinaturas"
+
+    def get(self, key):
+        """Retorna (assinatura, funcoes), (None, None) para falha de parse já
+        registrada, ou None quando a chave não está no cache."""
+        raw = self.get_bytes(key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        if data is None:
+            return None, None
+        return data["assinatura"], data["funcoes"]
+
+    def put(self, key, assinatura, funcoes):
+        data = None if assinatura is None else {"assinatura": assinatura, "funcoes": funcoes}
+        self.put_bytes(key, json.dumps(data, separators=(",", ":")).encode("utf-8"))
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+from utils.utils import log_error, log_info
+
+
+class SimilarityStore:
+    """Similaridades por par e hashes dos arquivos de uma lista, em SQLite.
+
+    Permite que uma nova execução compare só os pares que envolvem arquivos
+    novos ou alterados e reaproveite o resto."""
+
+    def __init__(self, path, parameters):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS files ("
+            " login TEXT NOT NULL, question INTEGER NOT NULL, hash TEXT NOT NULL,"
+            " PRIMARY KEY (login, question));"
+            "CREATE TABLE IF NOT EXISTS pairs ("
+            " question INTEGER NOT NULL, login_a TEXT NOT NULL, login_b TEXT NOT NULL,"
+            " score REAL NOT NULL, PRIMARY KEY (question, login_a, login_b));"
+        )
+        row = self.conn.execute(
+            "SELECT value FROM config WHERE key = 'parameters'"
+        ).fetchone()
+        if row is None or row[0] != parameters:
+            if row is not None:
+                log_info(f"Parâmetros mudaram, descartando similaridades salvas em {path}")
+            self.conn.execute("DELETE FROM files")
+            self.conn.execute("DELETE FROM pairs")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO config (key, value) VALUES ('parameters', ?)",
+                (parameters,),
+            )
+
+    def sync_files(self, current):
+        """Recebe {(login, questao): hash} dos arquivos atuais e devolve o
+        conjunto de (login, questao) novos ou alterados. Pares de arquivos
+        alterados ou removidos saem do armazenamento."""
+        stored = {
+            (login, question): file_hash
+            for login, question, file_hash in self.conn.execute(
+                "SELECT login, question, hash FROM files"
+            )
+        }
+        changed = {key for key, file_hash in current.items() if stored.get(key) != file_hash}
+        stale = changed | (stored.keys() - current.keys())
+
+        for login, question in stale:
+            self.conn.execute(
+                "DELETE FROM pairs WHERE question = ? AND (login_a = ? OR login_b = ?)",
+                (question, login, login),
+            )
+            self.conn.execute(
+                "DELETE FROM files WHERE login = ? AND question = ?", (login, question)
+            )
+        self.conn.executemany(
+            "INSERT INTO files (login, question, hash) VALUES (?, ?, ?)",
+            [(login, question, current[(login, question)]) for login, question in changed],
+        )
+        return changed
+
+    def load_scores(self, question, pairs):
+        """{(login_a, login_b): score} dos pares pedidos que estão salvos.
+        pairs: (login_a, login_b) com login_a < login_b, como em save_pairs."""
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS wanted (login_a TEXT NOT NULL, login_b TEXT NOT NULL)"
+        )
+        self.conn.execute("DELETE FROM wanted")
+        self.conn.executemany("INSERT INTO wanted (login_a, login_b) VALUES (?, ?)", pairs)
+        rows = self.conn.execute(
+            "SELECT pairs.login_a, pairs.login_b, pairs.score FROM wanted"
+            " JOIN pairs ON pairs.question = ? AND pairs.login_a = wanted.login_a"
+            " AND pairs.login_b = wanted.login_b",
+            (question,),
+        )
+        return {(login_a, login_b): score for login_a, login_b, score in rows}
+
+    def save_pairs(self, pairs):
+        """pairs: iterável de (questao, login_a, login_b, score)."""
+        rows = [
+            (question, *sorted((login_a, login_b)), score)
+            for question, login_a, login_b, score in pairs
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO pairs (question, login_a, login_b, score)"
+            " VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+    def close(self, commit=True):
+        """Grava as mudanças da execução; com commit=False (execução
+        interrompida) descarta todas, inclusive as de sync_files."""
+        try:
+            if commit:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        except sqlite3.Error as e:
+            log_error(f"Erro ao salvar similaridades em {self.path}: {e}")
+        finally:
+            self.conn.close()
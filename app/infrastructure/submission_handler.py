@@ -1,10 +1,18 @@
 import io
 import os
+import random
 import shutil
 import stat, subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import google_auth_httplib2
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.http import MediaIoBaseDownload, build_http
 from core.models.student_submission import StudentSubmission
+from infrastructure.classroom_gateway import get_course_roster
+from infrastructure.drive_gateway import get_file_versions
+from infrastructure.run_journal import PROFILE, DOWNLOADED, EXTRACTED
 from utils.permission_utils import relax_permissions
 from utils.utils import extract_prefix, get_submission_timestamp, calculate_delay, get_due_date, log_info, log_error
 
@@ -34,62 +42,157 @@ def rename_file_if_needed(file_name, student_folder, student_obj):
             student_obj.add_comment(f"Renomeado {file_name} para {expected_name}.")
        
 
-def handle_attachment(file_id, file_name, student_folder, student_obj, drive_service):
-    try:
-        file_path = os.path.join(student_folder, file_name)
-        request = drive_service.files().get_media(fileId=file_id)
-        with io.FileIO(file_path, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            progress_percentage = 0
-            while not done:
-                status, done = downloader.next_chunk()
-                progress_percentage = int(status.progress() * 100)
-                log_info(f"Baixando {file_name} de {student_obj.name}: {progress_percentage}%")
-
-        if progress_percentage == 0:
-            student_obj.update_field('entregou', 0)
-            student_obj.add_comment("Erro de submissão ou submissão não foi baixada.")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            return
-
-        raw_code_extensions = ['.c', '.cpp', '.py', '.java', '.js', '.rb', '.hs']
-        if any(file_name.endswith(ext) for ext in raw_code_extensions):
-            student_obj.update_field('entregou', 1)
-            student_obj.add_comment("Erro de submissão: enviou arquivo(s), mas não enviou numa pasta compactada.")
-
-            student_folder = create_student_folder_if_needed(student_folder, student_obj.login)
-            new_path = os.path.join(student_folder, file_name)
-            shutil.move(file_path, new_path)
-            file_path = new_path 
-
-        rename_file_if_needed(file_name, student_folder, student_obj)
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_SECONDS = 1
+PARTIAL_FOLDER = ".parciais"
+
+_worker_state = threading.local()
+
+def worker_http(credentials):
+    # httplib2 não é thread-safe: cada thread do pool tem a sua conexão
+    if getattr(_worker_state, "http", None) is None:
+        _worker_state.http = google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+    return _worker_state.http
+
+def download_drive_file(drive_service, file_id, file_path, label, credentials=None):
+    """Baixa o arquivo do Drive, tentando de novo com espera exponencial em 429
+    e 5xx. Retorna o progresso final (0 a 100)."""
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            request = drive_service.files().get_media(fileId=file_id)
+            if credentials is not None:
+                request.http = worker_http(credentials)
+            with io.FileIO(file_path, 'wb') as fh:
+                downloader = MediaIoBaseDownload(fh, request)
+                done = False
+                progress_percentage = 0
+                while not done:
+                    status, done = downloader.next_chunk()
+                    progress_percentage = int(status.progress() * 100)
+                    log_info(f"Baixando {label}: {progress_percentage}%")
+            return progress_percentage
+        except HttpError as error:
+            if error.resp.status not in RETRY_STATUSES or attempt == DOWNLOAD_RETRIES:
+                raise
+            delay = BACKOFF_SECONDS * 2 ** attempt + random.uniform(0, BACKOFF_SECONDS)
+            log_info(f"Erro {error.resp.status} ao baixar {label}; nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+
+def finish_attachment(file_name, student_folder, student_obj, result):
+    """Atualiza o aluno com o resultado do download: o progresso final, ou o
+    HttpError que interrompeu o download."""
+    file_path = os.path.join(student_folder, file_name)
+    if isinstance(result, HttpError):
+        record_download_error(result, file_name, file_path, student_obj)
+        return
+    progress_percentage = result
+
+    if progress_percentage == 0:
+        student_obj.update_field('entregou', 0)
+        student_obj.add_comment("Erro de submissão ou submissão não foi baixada.")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return
+
+    raw_code_extensions = ['.c', '.cpp', '.py', '.java', '.js', '.rb', '.hs']
+    if any(file_name.endswith(ext) for ext in raw_code_extensions):
+        student_obj.update_field('entregou', 1)
+        student_obj.add_comment("Erro de submissão: enviou arquivo(s), mas não enviou numa pasta compactada.")
+
+        student_folder = create_student_folder_if_needed(student_folder, student_obj.login)
+        new_path = os.path.join(student_folder, file_name)
+        shutil.move(file_path, new_path)
+        file_path = new_path 
+
+    rename_file_if_needed(file_name, student_folder, student_obj)
+
+def record_download_error(error, file_name, file_path, student_obj):
+    if error.resp.status == 403 and 'cannotDownloadAbusiveFile' in str(error):
+        student_obj.update_field('entregou', 0)
+        student_obj.add_comment("Erro de submissão: arquivo identificado como malware ou spam.")
+        log_info(f"O arquivo {file_name} de {student_obj.name} foi identificado como malware/spam.\n")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    else:
+        student_obj.update_field('entregou', 0)
+        student_obj.add_comment(f"Erro de submissão: erro ao baixar arquivo {file_name}.")
+        log_info(f"Erro ao baixar arquivo {file_name} de {student_obj.name}: {error}")
+
+def fetch_student_profile(classroom_service, classroom_id, student_id):
+    student = classroom_service.courses().students().get(courseId=classroom_id, userId=student_id).execute()
+    return {
+        "email": student['profile']['emailAddress'],
+        "name": student['profile']['name']['fullName'],
+    }
 
+def load_roster(classroom_service, classroom_id, submissions, roster_cache=None):
+    roster = get_course_roster(classroom_service, classroom_id, roster_cache)
+    user_ids = {submission['userId'] for submission in submissions.get('studentSubmissions', [])}
+    missing = user_ids - roster.keys()
+    if missing and roster_cache:
+        # Aluno que entrou na turma depois que o cache foi gravado
+        log_info(f"{len(missing)} alunos fora da lista em cache; buscando a lista de novo.")
+        roster = get_course_roster(classroom_service, classroom_id, roster_cache, refresh=True)
+    return roster
+
+def download_attachment(drive_service, credentials, file_id, partial_path, label, download_cache=None, version=None):
+    if download_cache and version and download_cache.fetch(file_id, version, partial_path):
+        log_info(f"{label} sem alterações desde o último download: copiado do cache")
+        return 100
+    try:
+        progress_percentage = download_drive_file(drive_service, file_id, partial_path, label, credentials)
     except HttpError as error:
-        if error.resp.status == 403 and 'cannotDownloadAbusiveFile' in str(error):
-            student_obj.update_field('entregou', 0)
-            student_obj.add_comment("Erro de submissão: arquivo identificado como malware ou spam.")
-            log_info(f"O arquivo {file_name} de {student_obj.name} foi identificado como malware/spam.\n")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        else:
-            student_obj.update_field('entregou', 0)
-            student_obj.add_comment(f"Erro de submissão: erro ao baixar arquivo {file_name}.")
-            log_info(f"Erro ao baixar arquivo {file_name} de {student_obj.name}: {error}")
-
-def download_submissions(classroom_service, drive_service, submissions, download_folder, classroom_id, coursework_id, num_questions):
+        return error
+    if download_cache and version and progress_percentage == 100:
+        download_cache.store(file_id, version, partial_path)
+    return progress_percentage
+
+def download_submissions(classroom_service, drive_service, submissions, download_folder, classroom_id, coursework_id, num_questions, roster_cache=None, credentials=None, workers=DOWNLOAD_WORKERS, executor=None, on_student_ready=None, download_cache=None, journal=None):
+    """Monta os alunos na ordem das submissões e baixa os anexos em paralelo.
+
+    Cada anexo é baixado num arquivo temporário e só depois, na ordem das
+    submissões, vai para download_folder e atualiza o aluno: o resultado não
+    depende da ordem em que os downloads terminam. Sem credentials as threads
+    dividiriam a conexão do drive_service, então o download fica sequencial.
+
+    executor permite dividir o mesmo pool (e o mesmo limite de downloads
+    simultâneos) entre turmas. on_student_ready(aluno) é chamado assim que
+    todos os anexos do aluno estão em download_folder, enquanto os downloads
+    dos próximos continuam.
+
+    Com download_cache, os anexos cuja versão no Drive (md5Checksum ou
+    modifiedTime, consultados em batch) já está no cache não são baixados.
+
+    Com journal (o ClassJournal da turma), cada aluno é registrado ao montar
+    o perfil e ao terminar os anexos; alunos que já passaram dessa etapa numa
+    execução interrompida são restaurados do diário sem baixar nada."""
     try:
         students = []
+        student_jobs = []
         due_date = get_due_date(classroom_service, classroom_id, coursework_id)
+        roster = load_roster(classroom_service, classroom_id, submissions, roster_cache)
+        partial_folder = os.path.join(download_folder, PARTIAL_FOLDER)
+        os.makedirs(partial_folder, exist_ok=True)
+        job_count = 0
 
         for submission in submissions.get('studentSubmissions', []):
+            jobs = []
             try:
                 student_id = submission['userId']
-                student = classroom_service.courses().students().get(courseId=classroom_id, userId=student_id).execute()
-                student_email = student['profile']['emailAddress']
+                profile = roster.get(student_id) or fetch_student_profile(classroom_service, classroom_id, student_id)
+                student_email = profile['email']
                 student_login = extract_prefix(student_email)
-                student_name = student['profile']['name']['fullName']
+                student_name = profile['name']
+
+                previous = journal.student(student_login) if journal else None
+                if previous and previous[0] in (DOWNLOADED, EXTRACTED):
+                    resumed_stage, student_obj = previous
+                    log_info(f"{student_name}: retomando depois da etapa '{resumed_stage}'.")
+                    students.append(student_obj)
+                    student_jobs.append((student_obj, [], resumed_stage))
+                    continue
 
                 entregou = 1
                 atrasou = 0
@@ -124,7 +227,12 @@ def download_submissions(classroom_service, drive_service, submissions, download
                     for attachment in attachments:
                         file_id = attachment.get('driveFile', {}).get('id')
                         file_name = attachment.get('driveFile', {}).get('title')
-                        handle_attachment(file_id, file_name, download_folder, student_obj, drive_service)
+                        partial_path = os.path.join(partial_folder, f"{job_count:05d}_{file_id}")
+                        job_count += 1
+                        jobs.append((file_id, file_name, partial_path))
+
+                if journal:
+                    journal.record(PROFILE, student_obj)
 
             except Exception as e:
                 log_error(f"Erro ao processar submissão de aluno: {student_name} ({getattr(student_obj, 'email', 'sem email')}): {e}")
@@ -133,6 +241,51 @@ def download_submissions(classroom_service, drive_service, submissions, download
                 log_info(f"Nenhum anexo encontrado para {student_name}")
 
             students.append(student_obj)
+            student_jobs.append((student_obj, jobs, None))
+
+        versions = {}
+        if download_cache:
+            versions = get_file_versions(
+                drive_service,
+                [file_id for _, jobs, _ in student_jobs for file_id, _, _ in jobs],
+                worker_http(credentials) if credentials is not None else None,
+            )
+
+        own_executor = None
+        if executor is None or credentials is None:
+            own_executor = executor = ThreadPoolExecutor(
+                max_workers=max(1, workers if credentials is not None else 1)
+            )
+        try:
+            futures = [
+                [
+                    executor.submit(
+                        download_attachment, drive_service, credentials, file_id, partial_path,
+                        f"{file_name} de {student_obj.name}", download_cache, versions.get(file_id)
+                    )
+                    for file_id, file_name, partial_path in jobs
+                ]
+                for student_obj, jobs, _ in student_jobs
+            ]
+            for (student_obj, jobs, resumed_stage), student_futures in zip(student_jobs, futures):
+                for (file_id, file_name, partial_path), future in zip(jobs, student_futures):
+                    try:
+                        result = future.result()
+                        if os.path.exists(partial_path):
+                            shutil.move(partial_path, os.path.join(download_folder, file_name))
+                        finish_attachment(file_name, download_folder, student_obj, result)
+                    except Exception as e:
+                        log_error(f"Erro ao processar anexo {file_name} de {student_obj.name}: {e}")
+                        student_obj.update_field('entregou', 0)
+                        student_obj.add_comment("Erro ao processar submissão.")
+                if journal and resumed_stage is None:
+                    journal.record(DOWNLOADED, student_obj)
+                if on_student_ready and resumed_stage != EXTRACTED:
+                    on_student_ready(student_obj)
+        finally:
+            if own_executor:
+                own_executor.shutdown()
+        shutil.rmtree(partial_folder, ignore_errors=True)
 
         return students
 
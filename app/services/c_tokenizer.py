@@ -0,0 +1,653 @@
+import re
+
+# Analisador tolerante a erros, usado quando o pycparser não consegue montar a
+# AST (typedefs desconhecidos, extensões do GNU, restos de #include...) ou como
+# modo rápido. Lê os tokens com uma única expressão regular e gera a mesma
+# sequência normalizada de ASTSignature: os nós em pré-ordem, ID -> VAR,
+# chamadas -> FUNC, constantes -> CONST_*, operadores pelo símbolo.
+# Construções que ele não reconhece são puladas em vez de interromper a análise.
+# Os tipos dos tokens seguem os nomes do CLexer do pycparser.
+
+TOKEN_RE = re.compile(
+    r"""
+    (?P<NEWLINE>\n)
+    |(?P<SKIP>[ \t\r\f\v]+|\\\n)
+    |(?P<FLOAT>(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?[fFlL]?|\d+[eE][+-]?\d+[fFlL]?)
+    |(?P<INT>0[xX][0-9a-fA-F]+[uUlL]*|0[bB][01]+[uUlL]*|\d+[uUlL]*)
+    |(?P<CHAR>[LuU]?'(?:\\.|[^\\'\n])+')
+    |(?P<STRING>(?:u8|[LuU])?"(?:\\.|[^\\"\n])*")
+    |(?P<ID>[A-Za-z_$][A-Za-z0-9_$]*)
+    |(?P<OP>\.\.\.|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^]=
+        |[-+*/%<>=!~&|^?:;,.(){}\[\]])
+    |(?P<OTHER>.)
+    """,
+    re.VERBOSE,
+)
+
+KEYWORDS = {
+    name: name.upper()
+    for name in (
+        "auto break case char const continue default do double else enum extern "
+        "float for goto if inline int long register restrict return short signed "
+        "sizeof static struct switch typedef union unsigned void volatile while "
+        "_Bool _Complex _Noreturn _Thread_local _Atomic _Alignof"
+    ).split()
+}
+PUNCTUATORS = {
+    "...": "ELLIPSIS", "<<=": "LSHIFTEQUAL", ">>=": "RSHIFTEQUAL", "->": "ARROW",
+    "++": "PLUSPLUS", "--": "MINUSMINUS", "<<": "LSHIFT", ">>": "RSHIFT",
+    "<=": "LE", ">=": "GE", "==": "EQ", "!=": "NE", "&&": "LAND", "||": "LOR",
+    "+=": "PLUSEQUAL", "-=": "MINUSEQUAL", "*=": "TIMESEQUAL", "/=": "DIVEQUAL",
+    "%=": "MODEQUAL", "&=": "ANDEQUAL", "|=": "OREQUAL", "^=": "XOREQUAL",
+    "+": "PLUS", "-": "MINUS", "*": "TIMES", "/": "DIVIDE", "%": "MOD",
+    "<": "LT", ">": "GT", "=": "EQUALS", "!": "LNOT", "~": "NOT", "&": "AND",
+    "|": "OR", "^": "XOR", "?": "CONDOP", ":": "COLON", ";": "SEMI",
+    ",": "COMMA", ".": "PERIOD", "(": "LPAREN", ")": "RPAREN", "{": "LBRACE",
+    "}": "RBRACE", "[": "LBRACKET", "]": "RBRACKET",
+}
+# Extensões do GNU que não mudam a estrutura do programa
+GNU_IGNORED = {"__extension__", "__inline", "__inline__", "__restrict", "__restrict__"}
+GNU_WITH_ARGS = {"__attribute__", "__asm__", "__asm", "asm", "__declspec"}
+
+TYPE_SPECIFIERS = {
+    "VOID", "CHAR", "SHORT", "INT", "LONG", "FLOAT", "DOUBLE", "SIGNED",
+    "UNSIGNED", "_BOOL", "_COMPLEX",
+}
+QUALIFIERS = {
+    "AUTO", "REGISTER", "STATIC", "EXTERN", "CONST", "VOLATILE", "RESTRICT",
+    "INLINE", "_NORETURN", "_THREAD_LOCAL", "_ATOMIC",
+}
+TAGS = {"STRUCT": "Struct", "UNION": "Union", "ENUM": "Enum"}
+
+BINARY_PRECEDENCE = {
+    "LOR": 1, "LAND": 2, "OR": 3, "XOR": 4, "AND": 5, "EQ": 6, "NE": 6,
+    "LT": 7, "LE": 7, "GT": 7, "GE": 7, "LSHIFT": 8, "RSHIFT": 8,
+    "PLUS": 9, "MINUS": 9, "TIMES": 10, "DIVIDE": 10, "MOD": 10,
+}
+ASSIGNMENTS = {
+    "EQUALS", "TIMESEQUAL", "DIVEQUAL", "MODEQUAL", "PLUSEQUAL", "MINUSEQUAL",
+    "LSHIFTEQUAL", "RSHIFTEQUAL", "ANDEQUAL", "XOREQUAL", "OREQUAL",
+}
+UNARY = {"PLUS", "MINUS", "TIMES", "AND", "NOT", "LNOT", "PLUSPLUS", "MINUSMINUS"}
+STRINGS = {"STRING_LITERAL", "WSTRING_LITERAL"}
+CONSTANTS = {"INT_CONST", "FLOAT_CONST", "CHAR_CONST", "WCHAR_CONST"}
+
+
+def lex(code):
+    """Lista de (tipo, valor, linha) dos tokens do código."""
+    tokens = []
+    line = 1
+    gnu_args = False
+    depth = 0
+    for match in TOKEN_RE.finditer(code):
+        group = match.lastgroup
+        value = match.group()
+        if group == "NEWLINE" or group == "SKIP":
+            line += value.count("\n")
+            continue
+        if group == "OTHER":
+            continue
+        if group == "ID":
+            if value in GNU_IGNORED:
+                continue
+            if value in GNU_WITH_ARGS:
+                gnu_args = True
+                continue
+            kind = KEYWORDS.get(value, "ID")
+        elif group == "OP":
+            kind = PUNCTUATORS[value]
+        elif group == "INT":
+            kind = "INT_CONST"
+        elif group == "FLOAT":
+            kind = "FLOAT_CONST"
+        elif group == "CHAR":
+            kind = "CHAR_CONST" if value[0] == "'" else "WCHAR_CONST"
+        else:
+            kind = "STRING_LITERAL" if value[0] == '"' else "WSTRING_LITERAL"
+
+        # Pula o "(...)" que vem depois de __attribute__ e afins
+        if depth:
+            depth += (kind == "LPAREN") - (kind == "RPAREN")
+            continue
+        if gnu_args:
+            gnu_args = False
+            if kind == "LPAREN":
+                depth = 1
+                continue
+        tokens.append((kind, value, line))
+    return tokens
+
+
+def constant_token(kind, value):
+    """Mesmo CONST_* que ASTSignature daria para o tipo do Constant do pycparser."""
+    suffix = value.lower()
+    if kind == "INT_CONST":
+        return "CONST" if suffix.endswith(("l", "u")) else "CONST_INT"
+    if kind == "FLOAT_CONST":
+        if suffix.endswith("f"):
+            return "CONST_FLOAT"
+        return "CONST" if suffix.endswith("l") else "CONST_DOUBLE"
+    if kind == "CHAR_CONST":
+        return "CONST_CHAR"
+    return "CONST"
+
+
+class LexerSignature:
+    """Assinatura de um arquivo a partir dos tokens, sem montar a AST.
+
+    Depois de run(): tokens e lines (linha de cada token), como ASTSignature
+    com com_linhas, e functions com os tokens de cada função, como
+    ASTFunctionVisitor."""
+
+    def __init__(self):
+        self.tokens = []
+        self.lines = []
+        self.functions = {}
+        self.typedefs = set()
+        self._source = []
+        self._pos = 0
+
+    # --- leitura dos tokens --------------------------------------------
+    def _peek(self, offset=0):
+        pos = self._pos + offset
+        return self._source[pos][0] if pos < len(self._source) else None
+
+    def _line(self):
+        if self._pos < len(self._source):
+            return self._source[self._pos][2]
+        return self._source[-1][2] if self._source else 1
+
+    def _next(self):
+        tok = self._source[self._pos]
+        self._pos += 1
+        return tok
+
+    def _accept(self, kind):
+        if self._peek() == kind:
+            self._pos += 1
+            return True
+        return False
+
+    def _skip_balanced(self, opening, closing):
+        """Pula um bloco ( ) / [ ] / { } inteiro, a partir do símbolo de abertura."""
+        depth = 0
+        while self._peek() is not None:
+            kind = self._next()[0]
+            if kind == opening:
+                depth += 1
+            elif kind == closing:
+                depth -= 1
+                if depth <= 0:
+                    return
+
+    # --- saída ------------------------------------------------------------
+    def _emit(self, token, line=None):
+        self.tokens.append(token)
+        self.lines.append(self._line() if line is None else line)
+
+    def _extend(self, items):
+        for token, line in items:
+            self._emit(token, line)
+
+    def _capture(self, parse, *args):
+        """Roda parse e devolve o que ele emitiu, sem deixar na saída."""
+        start = len(self.tokens)
+        parse(*args)
+        items = list(zip(self.tokens[start:], self.lines[start:]))
+        del self.tokens[start:], self.lines[start:]
+        return items
+
+    # --- declarações --------------------------------------------------------
+    def _starts_declaration(self):
+        kind = self._peek()
+        if kind in TYPE_SPECIFIERS or kind in QUALIFIERS or kind in TAGS:
+            return True
+        if kind == "TYPEDEF":
+            return True
+        if kind == "ID":
+            name = self._source[self._pos][1]
+            # Tipo declarado com typedef, ou "Tipo nome" com typedef de outro arquivo
+            return name in self.typedefs or self._peek(1) == "ID" or (
+                self._peek(1) == "TIMES" and self._peek(2) == "ID"
+                and self._peek(3) in ("SEMI", "EQUALS", "COMMA", "LBRACKET")
+            )
+        return False
+
+    def _specifiers(self):
+        """Consome os especificadores de tipo. Devolve (é typedef, tokens do tipo)."""
+        is_typedef = False
+        type_tokens = None
+        seen_type = False
+        while True:
+            kind = self._peek()
+            if kind == "TYPEDEF":
+                is_typedef = True
+                self._pos += 1
+            elif kind in QUALIFIERS:
+                self._pos += 1
+            elif kind in TYPE_SPECIFIERS:
+                seen_type = True
+                self._pos += 1
+            elif kind in TAGS and type_tokens is None:
+                line = self._line()
+                self._pos += 1
+                self._accept("ID")
+                body = []
+                if self._peek() == "LBRACE":
+                    body = self._capture(self._tag_body, kind)
+                type_tokens = [(TAGS[kind], line)] + body
+            elif kind == "ID" and not seen_type and type_tokens is None:
+                # Nome de tipo (typedef): só quando ainda há um declarador depois
+                if self._peek(1) in ("ID", "TIMES", "LPAREN"):
+                    seen_type = True
+                    self._pos += 1
+                else:
+                    break
+            else:
+                break
+        return is_typedef, type_tokens or [("IdentifierType", self._line())]
+
+    def _tag_body(self, kind):
+        self._pos += 1  # {
+        if kind == "ENUM":
+            self._emit("EnumeratorList")
+            while self._peek() not in ("RBRACE", None):
+                if self._accept("ID"):
+                    self._emit("Enumerator")
+                    if self._accept("EQUALS"):
+                        self._extend(self._capture(self._conditional))
+                elif not self._accept("COMMA"):
+                    self._pos += 1
+        else:
+            while self._peek() not in ("RBRACE", None):
+                start = self._pos
+                self._declaration()
+                if self._pos == start:
+                    self._pos += 1
+        self._accept("RBRACE")
+
+    def _declarator_prefix(self):
+        pointers = 0
+        while self._peek() in ("TIMES", "CONST", "VOLATILE", "RESTRICT"):
+            if self._next()[0] == "TIMES":
+                pointers += 1
+        name = self._next()[1] if self._peek() == "ID" else None
+        return pointers, name
+
+    def _array_suffixes(self):
+        """Consome os [dim] do declarador: ("ArrayDecl" de cada um, tokens das dimensões)."""
+        arrays, dims = [], []
+        while self._peek() == "LBRACKET":
+            arrays.append(("ArrayDecl", self._line()))
+            self._pos += 1
+            if self._peek() != "RBRACKET":
+                dims.extend(self._capture(self._expression))
+            while self._peek() not in ("RBRACKET", None):
+                self._pos += 1
+            self._accept("RBRACKET")
+        return arrays, dims
+
+    def _parameters(self):
+        """Consome "(...)" da declaração de função e emite a ParamList."""
+        self._pos += 1  # (
+        if self._accept("RPAREN"):
+            return
+        self._emit("ParamList")
+        while self._peek() not in ("RPAREN", None):
+            if self._accept("ELLIPSIS"):
+                self._emit("EllipsisParam")
+                continue
+            if self._accept("COMMA"):
+                continue
+            line = self._line()
+            start = self._pos
+            _, type_tokens = self._specifiers()
+            pointers, name = self._declarator_prefix()
+            arrays, dims = self._array_suffixes()
+            self._emit("Decl" if name else "Typename", line)
+            self._extend([("PtrDecl", line)] * pointers + arrays)
+            self._emit("TypeDecl", line)
+            self._extend(type_tokens + dims)
+            if self._pos == start:
+                self._pos += 1
+        self._accept("RPAREN")
+
+    def _declaration(self):
+        line = self._line()
+        is_typedef, type_tokens = self._specifiers()
+        if self._accept("SEMI"):
+            # Só a definição de struct/enum
+            self._emit("Decl", line)
+            self._extend(type_tokens)
+            return
+        while self._peek() not in ("SEMI", None):
+            line = self._line()
+            pointers, name = self._declarator_prefix()
+            if name is None and self._peek() != "LPAREN":
+                break
+            if is_typedef and name:
+                self.typedefs.add(name)
+            start = len(self.tokens)
+            self._emit("Typedef" if is_typedef else "Decl", line)
+            self._extend([("PtrDecl", line)] * pointers)
+
+            if self._peek() == "LPAREN" and name:
+                self._emit("FuncDecl", line)
+                self._parameters()
+                self._emit("TypeDecl", line)
+                self._extend(type_tokens)
+                if self._peek() == "LBRACE":
+                    self.tokens.insert(start, "FuncDef")
+                    self.lines.insert(start, line)
+                    self._compound()
+                    self.functions[name] = self.tokens[start:]
+                    return
+            else:
+                if self._peek() == "LPAREN":
+                    # Ponteiro para função e afins: pula o declarador
+                    self._skip_balanced("LPAREN", "RPAREN")
+                    if self._peek() == "LPAREN":
+                        self._skip_balanced("LPAREN", "RPAREN")
+                arrays, dims = self._array_suffixes()
+                self._extend(arrays)
+                self._emit("TypeDecl", line)
+                self._extend(type_tokens + dims)
+                if self._accept("EQUALS"):
+                    self._initializer()
+            if not self._accept("COMMA"):
+                break
+        self._accept("SEMI")
+
+    def _initializer(self):
+        if self._peek() != "LBRACE":
+            self._assignment()
+            return
+        self._emit("InitList")
+        self._pos += 1
+        while self._peek() not in ("RBRACE", None):
+            if self._accept("COMMA"):
+                continue
+            start = self._pos
+            if self._peek() in ("PERIOD", "LBRACKET"):
+                # Inicializador designado (.campo = / [i] =): na AST o valor
+                # vem antes do designador
+                self._emit("NamedInitializer")
+                designators = self._capture(self._designators)
+                self._initializer()
+                self._extend(designators)
+            else:
+                self._initializer()
+            if self._pos == start:
+                self._pos += 1
+        self._accept("RBRACE")
+
+    def _designators(self):
+        while self._peek() in ("PERIOD", "LBRACKET"):
+            if self._next()[0] == "PERIOD":
+                if self._accept("ID"):
+                    self._emit("VAR", self._source[self._pos - 1][2])
+            else:
+                self._conditional()
+                self._accept("RBRACKET")
+        self._accept("EQUALS")
+
+    # --- comandos ------------------------------------------------------------
+    def _compound(self):
+        self._emit("Compound")
+        self._pos += 1  # {
+        while self._peek() not in ("RBRACE", None):
+            start = self._pos
+            self._block_item()
+            if self._pos == start:
+                self._pos += 1
+        self._accept("RBRACE")
+
+    def _block_item(self):
+        if self._starts_declaration():
+            self._declaration()
+        else:
+            self._statement()
+
+    def _parenthesized(self):
+        if self._accept("LPAREN"):
+            self._expression()
+            self._accept("RPAREN")
+
+    def _statement(self):
+        kind = self._peek()
+        if kind is None:
+            return
+        if kind == "LBRACE":
+            self._compound()
+        elif kind == "IF":
+            self._emit("If")
+            self._pos += 1
+            self._parenthesized()
+            self._statement()
+            if self._accept("ELSE"):
+                self._statement()
+        elif kind in ("WHILE", "SWITCH"):
+            self._emit("While" if kind == "WHILE" else "Switch")
+            self._pos += 1
+            self._parenthesized()
+            self._statement()
+        elif kind == "DO":
+            # Na AST a condição do DoWhile vem antes do corpo
+            self._emit("DoWhile")
+            self._pos += 1
+            body = self._capture(self._statement)
+            if self._accept("WHILE"):
+                self._parenthesized()
+            self._extend(body)
+            self._accept("SEMI")
+        elif kind == "FOR":
+            self._emit("For")
+            self._pos += 1
+            self._accept("LPAREN")
+            if self._starts_declaration():
+                self._emit("DeclList")
+                self._declaration()
+            else:
+                self._expression()
+                self._accept("SEMI")
+            self._expression()
+            self._accept("SEMI")
+            self._expression()
+            self._accept("RPAREN")
+            self._statement()
+        elif kind == "CASE":
+            self._emit("Case")
+            self._pos += 1
+            self._conditional()
+            self._accept("COLON")
+        elif kind == "DEFAULT":
+            self._emit("Default")
+            self._pos += 1
+            self._accept("COLON")
+        elif kind in ("RETURN", "BREAK", "CONTINUE", "GOTO"):
+            self._emit(kind.capitalize())
+            self._pos += 1
+            if kind == "GOTO":
+                self._accept("ID")
+            elif kind == "RETURN":
+                self._expression()
+            self._accept("SEMI")
+        elif kind == "SEMI":
+            self._emit("EmptyStatement")
+            self._pos += 1
+        elif kind == "ID" and self._peek(1) == "COLON":
+            self._emit("Label")
+            self._pos += 2
+        else:
+            self._expression()
+            self._accept("SEMI")
+
+    # --- expressões (emitidas em pré-ordem, como na AST) ------------------------
+    def _expression(self):
+        start = len(self.tokens)
+        self._assignment()
+        if self._peek() == "COMMA":
+            self.tokens.insert(start, "ExprList")
+            self.lines.insert(start, self.lines[start] if start < len(self.lines) else self._line())
+            while self._accept("COMMA"):
+                self._assignment()
+
+    def _assignment(self):
+        left = self._capture(self._conditional)
+        if self._peek() in ASSIGNMENTS:
+            self._emit("Assignment")
+            self._pos += 1
+            self._extend(left)
+            self._assignment()
+        else:
+            self._extend(left)
+
+    def _conditional(self):
+        condition = self._capture(self._binary, 1)
+        if self._peek() != "CONDOP":
+            self._extend(condition)
+            return
+        self._emit("TernaryOp")
+        self._pos += 1
+        self._extend(condition)
+        self._expression()
+        self._accept("COLON")
+        self._conditional()
+
+    def _binary(self, min_precedence):
+        left = self._capture(self._unary)
+        while BINARY_PRECEDENCE.get(self._peek(), 0) >= min_precedence:
+            kind, op, line = self._next()
+            right = self._capture(self._binary, BINARY_PRECEDENCE[kind] + 1)
+            left = [(op, line)] + left + right
+        self._extend(left)
+
+    def _starts_type_name(self, offset=0):
+        kind = self._peek(offset)
+        if kind in TYPE_SPECIFIERS or kind in TAGS or kind in ("CONST", "VOLATILE"):
+            return True
+        return kind == "ID" and self._source[self._pos + offset][1] in self.typedefs
+
+    def _type_name(self):
+        """Consome "(tipo)" e emite o Typename."""
+        line = self._line()
+        self._pos += 1  # (
+        _, type_tokens = self._specifiers()
+        pointers, _ = self._declarator_prefix()
+        arrays, dims = self._array_suffixes()
+        while self._peek() not in ("RPAREN", None):
+            self._pos += 1
+        self._accept("RPAREN")
+        self._emit("Typename", line)
+        self._extend([("PtrDecl", line)] * pointers + arrays)
+        self._emit("TypeDecl", line)
+        self._extend(type_tokens + dims)
+
+    def _unary(self):
+        kind = self._peek()
+        if kind in UNARY:
+            op = self._next()[1]
+            self._emit(op)
+            self._unary()
+        elif kind in ("SIZEOF", "_ALIGNOF"):
+            self._emit(self._next()[1])
+            if self._peek() == "LPAREN" and self._starts_type_name(1):
+                self._type_name()
+            else:
+                self._unary()
+        elif kind == "LPAREN" and self._starts_type_name(1):
+            line = self._line()
+            type_name = self._capture(self._type_name)
+            if self._peek() == "LBRACE":
+                # Literal composto: (tipo){...}
+                self._emit("CompoundLiteral", line)
+                self._extend(type_name)
+                self._initializer()
+            else:
+                self._emit("Cast", line)
+                self._extend(type_name)
+                self._unary()
+        else:
+            self._postfix()
+
+    def _postfix(self):
+        operand = self._capture(self._primary)
+        while True:
+            kind = self._peek()
+            line = self._line()
+            if kind == "LPAREN":
+                self._pos += 1
+                args = []
+                if self._peek() != "RPAREN":
+                    args = [("ExprList", line)]
+                    while self._peek() not in ("RPAREN", None):
+                        if not self._accept("COMMA"):
+                            start = self._pos
+                            args.extend(self._capture(self._assignment))
+                            if self._pos == start:
+                                self._pos += 1
+                self._accept("RPAREN")
+                operand = [("FUNC", line)] + operand + args
+            elif kind == "LBRACKET":
+                self._pos += 1
+                index = self._capture(self._expression)
+                self._accept("RBRACKET")
+                operand = [("ArrayRef", line)] + operand + index
+            elif kind in ("PERIOD", "ARROW"):
+                self._pos += 1
+                field = [("VAR", self._line())] if self._accept("ID") else []
+                operand = [("StructRef", line)] + operand + field
+            elif kind in ("PLUSPLUS", "MINUSMINUS"):
+                op = self._next()[1]
+                operand = [("p" + op, line)] + operand
+            else:
+                break
+        self._extend(operand)
+
+    def _primary(self):
+        kind = self._peek()
+        if kind == "ID":
+            self._emit("VAR")
+            self._pos += 1
+        elif kind in STRINGS:
+            self._emit("CONST")
+            while self._peek() in STRINGS:
+                self._pos += 1
+        elif kind in CONSTANTS:
+            self._emit(constant_token(kind, self._source[self._pos][1]))
+            self._pos += 1
+        elif kind == "LPAREN":
+            self._pos += 1
+            if self._peek() == "LBRACE":
+                # Expressão-comando do GNU: ({ ... })
+                self._compound()
+            else:
+                self._expression()
+            self._accept("RPAREN")
+        elif kind not in (None, "SEMI", "RBRACE", "RPAREN", "RBRACKET", "COMMA", "COLON"):
+            # Token inesperado: pula para não travar
+            self._pos += 1
+
+    # --- arquivo -------------------------------------------------------------
+    def run(self, code):
+        """Analisa o código. Retorna False quando não há nada a comparar."""
+        self._source = lex(code)
+        self._pos = 0
+        self._emit("FileAST", 1)
+        while self._peek() is not None:
+            start = self._pos
+            self._block_item()
+            if self._pos == start:
+                self._pos += 1
+        return len(self.tokens) > 1
+
+
+def lex_signature(code):
+    """(assinatura, funcoes) como em processar_codigo, ou (None, None)."""
+    visitor = LexerSignature()
+    try:
+        if not visitor.run(code):
+            return None, None
+    except RecursionError:
+        return None, None
+    return visitor.tokens, visitor.functions
@@ -0,0 +1,132 @@
+from itertools import accumulate
+
+# Menor trecho (em tokens da assinatura AST) considerado cópia
+MIN_MATCH = 12
+# Tamanho inicial de busca do Running-Karp-Rabin
+INITIAL_SEARCH = 40
+
+_MOD = (1 << 61) - 1
+_BASE = 1_000_003
+
+
+def _window_hashes(seq, size):
+    """Hash de Karp-Rabin de cada janela de `size` itens, em O(n)."""
+    if len(seq) < size:
+        return []
+    high = pow(_BASE, size - 1, _MOD)
+    value = 0
+    for item in seq[:size]:
+        value = (value * _BASE + item) % _MOD
+    hashes = [value]
+    for pos in range(size, len(seq)):
+        value = ((value - seq[pos - size] * high) * _BASE + seq[pos]) % _MOD
+        hashes.append(value)
+    return hashes
+
+
+def _unmarked_windows(marked, size):
+    """Posições iniciais das janelas de `size` itens sem nenhum item marcado."""
+    prefix = [0] + list(accumulate(marked))
+    return [
+        start
+        for start in range(len(marked) - size + 1)
+        if prefix[start + size] == prefix[start]
+    ]
+
+
+def _scan_pattern(a, b, marked_a, marked_b, size):
+    """Encontra os trechos máximos de tamanho >= size entre partes não marcadas.
+
+    Retorna (maior tamanho, lista de (pos_a, pos_b, tamanho))."""
+    hashes_b = _window_hashes(b, size)
+    table = {}
+    for start in _unmarked_windows(marked_b, size):
+        table.setdefault(hashes_b[start], []).append(start)
+
+    hashes_a = _window_hashes(a, size)
+    matches = []
+    longest = 0
+    for start_a in _unmarked_windows(marked_a, size):
+        for start_b in table.get(hashes_a[start_a], ()):
+            if a[start_a : start_a + size] != b[start_b : start_b + size]:
+                continue
+            length = size
+            while (
+                start_a + length < len(a)
+                and start_b + length < len(b)
+                and a[start_a + length] == b[start_b + length]
+                and not marked_a[start_a + length]
+                and not marked_b[start_b + length]
+            ):
+                length += 1
+            matches.append((start_a, start_b, length))
+            longest = max(longest, length)
+            if longest > 2 * size:
+                # Vale recomeçar com janelas maiores
+                return longest, matches
+    return longest, matches
+
+
+def _mark_tiles(matches, marked_a, marked_b, tiles):
+    for start_a, start_b, length in sorted(matches, key=lambda m: -m[2]):
+        if any(marked_a[start_a : start_a + length]) or any(
+            marked_b[start_b : start_b + length]
+        ):
+            continue
+        for offset in range(length):
+            marked_a[start_a + offset] = 1
+            marked_b[start_b + offset] = 1
+        tiles.append((start_a, start_b, length))
+
+
+def greedy_string_tiling(
+    a, b, min_match=MIN_MATCH, initial_search=INITIAL_SEARCH, ignored_a=None, ignored_b=None
+):
+    """Running-Karp-Rabin Greedy String Tiling entre duas sequências de inteiros.
+
+    ignored_a e ignored_b (bytearray, 1 nas posições a ignorar, como o código
+    base) começam marcados: nenhum ladrilho passa por eles.
+    Retorna os ladrilhos (pos_a, pos_b, tamanho), sem sobreposição."""
+    marked_a = bytearray(ignored_a) if ignored_a else bytearray(len(a))
+    marked_b = bytearray(ignored_b) if ignored_b else bytearray(len(b))
+    tiles = []
+    size = max(min_match, initial_search)
+
+    while True:
+        longest, matches = _scan_pattern(a, b, marked_a, marked_b, size)
+        if longest > 2 * size:
+            size = longest
+            continue
+        _mark_tiles(matches, marked_a, marked_b, tiles)
+        if size > 2 * min_match:
+            size //= 2
+        elif size > min_match:
+            size = min_match
+        else:
+            break
+
+    tiles.sort()
+    return tiles
+
+
+def tile_coverage(tiles, len_a, len_b):
+    if not len_a or not len_b:
+        return 0.0
+    covered = sum(length for _, _, length in tiles)
+    return 2 * covered / (len_a + len_b)
+
+
+def tiles_to_line_spans(tiles, lines_a, lines_b):
+    """Converte os ladrilhos em intervalos de linhas do código-fonte."""
+    spans = []
+    for start_a, start_b, length in tiles:
+        span_a = lines_a[start_a : start_a + length]
+        span_b = lines_b[start_b : start_b + length]
+        spans.append(
+            {
+                "linhas1": [min(span_a), max(span_a)],
+                "linhas2": [min(span_b), max(span_b)],
+                "tokens": length,
+            }
+        )
+    return spans
@@ -0,0 +1,150 @@
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+# Mesmos pesos e portões de compare_main.similaridade_caracteristicas
+PESO_NGRAM = 0.7
+PESO_COSSENO = 0.1
+PESO_JACCARD = 0.2
+
+
+def matrix_engine_available():
+    return np is not None and sparse is not None
+
+
+def build_sparse_rows(vectors, binary=False):
+    rows, cols, values = [], [], []
+    for row, vector in enumerate(vectors):
+        for col, value in vector.items():
+            rows.append(row)
+            cols.append(col)
+            values.append(1.0 if binary else value)
+    num_cols = max(cols) + 1 if cols else 1
+    return sparse.csr_matrix(
+        (values, (rows, cols)), shape=(len(vectors), num_cols), dtype=np.float64
+    )
+
+
+def cosine_matrix(vectors, norms):
+    matrix = build_sparse_rows(vectors)
+    dot = (matrix @ matrix.T).toarray()
+    norms = np.asarray(norms, dtype=np.float64)
+    return dot / (np.outer(norms, norms) + 1e-9)
+
+
+def combined_similarity_matrix(features):
+    """Similaridade combinada de todos os pares de uma lista de Caracteristicas."""
+    if not features:
+        return np.zeros((0, 0))
+
+    sizes = np.array([f.tamanho for f in features], dtype=np.float64)
+    token_sets = [dict.fromkeys(f.tokens, 1) for f in features]
+    token_rows = build_sparse_rows(token_sets, binary=True)
+    intersection = (token_rows @ token_rows.T).toarray()
+    set_sizes = np.array([len(f.tokens) for f in features], dtype=np.float64)
+    union = set_sizes[:, None] + set_sizes[None, :] - intersection
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(union > 0, intersection / union, 0.0)
+
+    cosine = cosine_matrix([f.pesos for f in features], [f.norma_pesos for f in features])
+    ngram = cosine_matrix(
+        [f.ngramas for f in features], [f.norma_ngramas for f in features]
+    )
+
+    gate = (
+        (sizes[:, None] > 0)
+        & (sizes[None, :] > 0)
+        & (sizes[:, None] >= 0.5 * sizes[None, :])
+        & (sizes[:, None] <= 2 * sizes[None, :])
+        & (intersection >= 2)
+    )
+    combined = PESO_NGRAM * ngram + PESO_COSSENO * cosine + PESO_JACCARD * jaccard
+    return np.where(gate, combined, 0.0)
+
+
+def fingerprint_similarity_matrix(features):
+    """Cosseno entre os conjuntos de n-gramas de todos os pares, como
+    compare_main.IndiceFuncoes.candidatas: zero fora da faixa de tamanho ou
+    sem n-grama em comum."""
+    sizes = np.array([f.tamanho for f in features], dtype=np.float64)
+    rows = build_sparse_rows([f.ngramas for f in features], binary=True)
+    shared = (rows @ rows.T).toarray()
+    roots = np.sqrt(np.array([len(f.ngramas) for f in features], dtype=np.float64))
+    gate = (
+        (sizes[:, None] >= 0.5 * sizes[None, :])
+        & (sizes[:, None] <= 2 * sizes[None, :])
+        & (shared > 0)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(gate, shared / np.outer(roots, roots), 0.0)
+
+
+def block_reduce(ufunc, matrix, starts):
+    """Reduz cada bloco aluno x aluno de uma matriz de funções a um valor."""
+    return ufunc.reduceat(ufunc.reduceat(matrix, starts, axis=0), starts, axis=1)
+
+
+def function_similarity_matrix(function_features):
+    """Por par, a soma das similaridades do emparelhamento guloso de funções
+    (cada função com a mais parecida do outro arquivo, qualquer que seja o
+    nome), dividida pelo número de funções do menor arquivo. O emparelhamento
+    é feito sobre fingerprint_similarity_matrix.
+
+    Os emparelhamentos de todos os pares de alunos andam juntos, uma rodada
+    por vez: em cada rodada cada bloco escolhe o maior valor ainda livre
+    (empate pela menor linha e depois pela menor coluna, como
+    compare_main.emparelhamento_guloso), e a linha e a coluna escolhidas saem
+    só daquele bloco. São tantas rodadas quanto funções no maior arquivo."""
+    total = len(function_features)
+    result = np.zeros((total, total))
+
+    features = []
+    owners = []
+    for student, functions in enumerate(function_features):
+        features.extend(functions.values())
+        owners.extend([student] * len(functions))
+    if not features:
+        return result
+
+    # Todas as funções da questão de uma vez; cada par de alunos é um bloco.
+    # Só os alunos com funções têm blocos: reduceat não aceita blocos vazios.
+    matrix = combined_similarity_matrix(features)
+    fingerprints = fingerprint_similarity_matrix(features)
+    students, starts, sizes = np.unique(owners, return_index=True, return_counts=True)
+    block_of = np.repeat(np.arange(len(students)), sizes)
+    num = len(features)
+    order = np.arange(num * num).reshape(num, num)
+
+    value = np.zeros((len(students), len(students)))
+    # row_used[f, b]: a função f já foi emparelhada no bloco com o aluno b
+    row_used = np.zeros((num, len(students)), dtype=bool)
+    col_used = np.zeros((len(students), num), dtype=bool)
+    for _ in range(sizes.max()):
+        free = np.where(row_used[:, block_of] | col_used[block_of, :], 0.0, fingerprints)
+        best = block_reduce(np.maximum, free, starts)
+        blocks_a, blocks_b = np.nonzero(best > 0)
+        if not len(blocks_a):
+            break
+        is_best = (free == best[block_of][:, block_of]) & (free > 0)
+        first = block_reduce(np.minimum, np.where(is_best, order, order.size), starts)
+        rows, cols = np.divmod(first[blocks_a, blocks_b], num)
+        value[blocks_a, blocks_b] += matrix[rows, cols]
+        row_used[rows, blocks_b] = True
+        col_used[blocks_a, cols] = True
+
+    value /= np.minimum(sizes[:, None], sizes[None, :])
+    # Como no motor Python, o par (a, b) usa o bloco com as funções de a nas linhas
+    value = np.triu(value, 1)
+    result[np.ix_(students, students)] = value + value.T
+    return result
+
+
+def final_similarity_matrix(questions):
+    """Matriz (arquivo + funções) / 2 para as Questao de uma mesma questão."""
+    files = combined_similarity_matrix([q.caracteristicas for q in questions])
+    functions = function_similarity_matrix([q.caracteristicas_funcoes for q in questions])
+    return np.round((files + functions) / 2, 4)
@@ -0,0 +1,308 @@
+import os
+import random
+import re
+from itertools import combinations
+from core.models.list_metadata import ListMetadata
+from core.models.student_submission import StudentSubmission, save_students_to_json
+
+# Transformações aplicadas nas cópias plantadas
+TRANSFORMATIONS = ("rename", "reorder", "dead_code")
+
+STATEMENT_KINDS = (
+    "assign", "compound", "increment", "print", "read", "call",
+    "if", "for", "while", "do", "switch", "ternary", "array", "logic",
+)
+OPERATORS = ("+", "-", "*", "/", "%")
+COMPARISONS = ("<", "<=", ">", ">=", "==", "!=")
+VARIABLE_NAMES = (
+    "a", "b", "c", "n", "x", "y", "z", "i", "j", "k", "soma", "total", "media",
+    "maior", "menor", "cont", "num", "valor", "aux", "res", "qtd", "idx", "acc",
+)
+FUNCTION_NAMES = (
+    "calcular", "somar", "verificar", "processar", "contar", "maximo", "minimo",
+    "ler_valor", "imprimir", "potencia", "fatorial", "media", "eh_primo", "trocar",
+)
+RE_IDENTIFIER = re.compile(r"\b[A-Za-z_]\w*\b")
+
+
+class QuestionProfile:
+    """O "enunciado" de uma questão: soluções independentes da mesma questão
+    se parecem um pouco (tipos de comando e quantidade de funções parecidos)."""
+
+    def __init__(self, rng):
+        self.weights = [rng.uniform(0.2, 3.0) for _ in STATEMENT_KINDS]
+        self.helpers = rng.randint(0, 3)
+        self.main_size = (rng.randint(3, 8), rng.randint(9, 20))
+        self.helper_size = (rng.randint(1, 3), rng.randint(4, 8))
+
+    def student_variant(self, rng):
+        """Cada aluno resolve do seu jeito: pesos e tamanhos variam em torno dos
+        da questão."""
+        variant = QuestionProfile.__new__(QuestionProfile)
+        variant.weights = [w * rng.uniform(0.1, 3.0) for w in self.weights]
+        variant.helpers = max(0, self.helpers + rng.randint(-1, 1))
+        variant.main_size = self.main_size
+        variant.helper_size = self.helper_size
+        return variant
+
+
+class Function:
+    def __init__(self, name, params, declarations, body, result):
+        self.name = name
+        self.params = params
+        self.declarations = declarations
+        self.body = body
+        self.result = result
+
+    def render(self):
+        params = ", ".join(f"int {p}" for p in self.params) or "void"
+        lines = [f"int {self.name}({params}) {{"]
+        lines += [f"    {d}" for d in self.declarations]
+        lines += [f"    {s}" for s in self.body]
+        lines.append(f"    return {self.result};")
+        lines.append("}")
+        return "\n".join(lines)
+
+
+class Program:
+    def __init__(self, helpers, main):
+        self.helpers = helpers
+        self.main = main
+
+    def render(self):
+        parts = ["#include <stdio.h>", "", "// Solução"]
+        for function in self.helpers + [self.main]:
+            parts.append(function.render())
+            parts.append("")
+        return "\n".join(parts)
+
+    def copy(self):
+        def clone(f):
+            return Function(f.name, list(f.params), list(f.declarations), list(f.body), f.result)
+
+        return Program([clone(f) for f in self.helpers], clone(self.main))
+
+
+def generate_statement(rng, profile, variables, helpers, depth=0):
+    kind = rng.choices(STATEMENT_KINDS, profile.weights)[0]
+    a, b, c = (rng.choice(variables) for _ in range(3))
+    nested = depth < 2
+
+    def block(first=""):
+        inner = [first] if first else []
+        inner += [
+            generate_statement(rng, profile, variables, helpers, depth + 1)
+            for _ in range(rng.randint(1, 3))
+        ]
+        return f"{{ {' '.join(inner)} }}"
+
+    if kind == "if" and nested:
+        condition = f"{a} {rng.choice(COMPARISONS)} {rng.randint(0, 100)}"
+        if rng.random() < 0.5:
+            return f"if ({condition}) {block()} else {block()}"
+        return f"if ({condition}) {block()}"
+    if kind == "for" and nested:
+        counter = f"i{depth}"
+        return f"for (int {counter} = 0; {counter} < {a}; {counter}++) {block()}"
+    if kind == "while" and nested:
+        step = f"{a} = {a} + {rng.randint(1, 9)};"
+        return f"while ({a} {rng.choice(COMPARISONS[:2])} {rng.randint(10, 500)}) {block(step)}"
+    if kind == "do" and nested:
+        step = f"{a}--;"
+        return f"do {block(step)} while ({a} > {rng.randint(0, 9)});"
+    if kind == "switch" and nested:
+        cases = " ".join(
+            f"case {value}: {generate_statement(rng, profile, variables, helpers, depth + 1)} break;"
+            for value in range(rng.randint(2, 4))
+        )
+        return f"switch ({a} % 4) {{ {cases} default: {b} = 0; }}"
+    if kind == "logic":
+        return f"{a} = ({b} > 0 && {c} < {rng.randint(1, 50)}) || !{a};"
+    if kind == "compound":
+        return f"{a} {rng.choice(OPERATORS[:3])}= {b};"
+    if kind == "increment":
+        return f"{a}{rng.choice(('++', '--'))};"
+    if kind == "print":
+        return f'printf("%d\\n", {a} {rng.choice(OPERATORS)} {b});'
+    if kind == "read":
+        return f'scanf("%d", &{a});'
+    if kind == "call" and helpers:
+        helper = rng.choice(helpers)
+        args = ", ".join(rng.choice(variables) for _ in helper.params)
+        return f"{a} = {helper.name}({args});"
+    if kind == "ternary":
+        return f"{a} = {b} {rng.choice(COMPARISONS)} {c} ? {b} : {c};"
+    if kind == "array":
+        return f"{a} = v[{b} % 10] {rng.choice(OPERATORS[:3])} {c};"
+    return f"{a} = {b} {rng.choice(OPERATORS)} {c};"
+
+
+def generate_function(rng, profile, name, params, size, helpers):
+    count = rng.randint(2, 5)
+    local = [v for v in rng.sample(VARIABLE_NAMES, len(VARIABLE_NAMES)) if v not in params]
+    local = local[:count]
+    variables = list(params) + local
+    declarations = [f"int {v} = {rng.randint(0, 9)};" for v in local]
+    values = ", ".join(str(rng.randint(0, 9)) for _ in range(rng.randint(1, 4)))
+    declarations.append(f"int v[10] = {{{values}}};")
+    body = [
+        generate_statement(rng, profile, variables, helpers) for _ in range(rng.randint(*size))
+    ]
+    return Function(name, params, declarations, body, rng.choice(variables))
+
+
+def generate_program(rng, profile):
+    profile = profile.student_variant(rng)
+    helpers = []
+    names = rng.sample(FUNCTION_NAMES, profile.helpers)
+    for name in names:
+        params = rng.sample(("p", "q", "r"), rng.randint(1, 3))
+        helpers.append(generate_function(rng, profile, name, params, profile.helper_size, helpers[:]))
+    main = generate_function(rng, profile, "main", [], profile.main_size, helpers)
+    main.result = "0"
+    return Program(helpers, main)
+
+
+def rename_identifiers(code, rng):
+    """Troca, de forma consistente, os nomes de variáveis e funções (menos main
+    e as da biblioteca)."""
+    names = set(VARIABLE_NAMES) | set(FUNCTION_NAMES) | {"p", "q", "r", "v", "i0", "i1"}
+    mapping = {}
+
+    def replace(match):
+        word = match.group(0)
+        if word not in names:
+            return word
+        if word not in mapping:
+            mapping[word] = f"{word}_{rng.choice(('x', 'novo', 'tmp', 'var', 'meu'))}{len(mapping)}"
+        return mapping[word]
+
+    # Só fora das strings e dos comentários
+    parts = re.split(r'("(?:\\.|[^"\\])*"|//[^\n]*|#[^\n]*)', code)
+    return "".join(part if i % 2 else RE_IDENTIFIER.sub(replace, part) for i, part in enumerate(parts))
+
+
+def reorder_statements(program, rng):
+    """Troca comandos vizinhos de lugar e muda a ordem das funções auxiliares
+    (que só são chamadas a partir da main)."""
+    for function in program.helpers + [program.main]:
+        body = function.body
+        for _ in range(max(1, len(body) // 3)):
+            if len(body) < 2:
+                break
+            pos = rng.randrange(len(body) - 1)
+            body[pos], body[pos + 1] = body[pos + 1], body[pos]
+        rng.shuffle(function.declarations)
+    # Uma auxiliar pode chamar as anteriores: só mudam de lugar as que não
+    # chamam nem são chamadas por outra auxiliar
+    def calls(f, g):
+        return f"{g.name}(" in " ".join(f.body)
+
+    independent = [
+        f
+        for f in program.helpers
+        if not any(calls(f, g) or calls(g, f) for g in program.helpers if g is not f)
+    ]
+    if len(independent) > 1:
+        order = independent[:]
+        rng.shuffle(order)
+        swap = dict(zip(independent, order))
+        program.helpers = [swap.get(f, f) for f in program.helpers]
+
+
+def insert_dead_code(program, rng):
+    """Acrescenta variáveis que ninguém usa e blocos que nunca executam."""
+    snippets = (
+        "int lixo{n} = {k};",
+        "if (0) {{ printf(\"%d\\n\", {k}); }}",
+        "while (0) {{ }}",
+        "for (int morto{n} = 0; morto{n} < 0; morto{n}++) {{ }}",
+        "{{ int tmp{n} = {k}; tmp{n} = tmp{n} * 2; }}",
+    )
+    for function in program.helpers + [program.main]:
+        for n in range(rng.randint(1, 3)):
+            snippet = rng.choice(snippets).format(n=n, k=rng.randint(0, 99))
+            function.body.insert(rng.randint(0, len(function.body)), snippet)
+
+
+def plagiarize(program, rng, transformations):
+    copy = program.copy()
+    if "reorder" in transformations:
+        reorder_statements(copy, rng)
+    if "dead_code" in transformations:
+        insert_dead_code(copy, rng)
+    code = copy.render()
+    if "rename" in transformations:
+        code = rename_identifiers(code, rng)
+    return code
+
+
+def generate_corpus(
+    folder,
+    students=100,
+    questions=4,
+    copy_rate=0.1,
+    missing_rate=0.03,
+    seed=1,
+    classes=("A",),
+):
+    """Escreve uma lista no formato de Downloads/<LISTA> (submissions e os
+    students/metadata de cada turma) com cópias plantadas.
+
+    Retorna {(questao, login_a, login_b): [transformações]} com os pares
+    plantados, login_a < login_b. Numa cópia da cópia valem as
+    transformações das duas."""
+    rng = random.Random(seed)
+    logins = [f"aluno{i:04d}" for i in range(students)]
+    submissions = os.path.join(folder, "submissions")
+    os.makedirs(submissions, exist_ok=True)
+    planted = {}
+
+    for q in range(1, questions + 1):
+        profile = QuestionProfile(random.Random(f"{seed}/{q}"))
+        delivered = [login for login in logins if rng.random() >= missing_rate]
+        copiers = set(rng.sample(delivered, int(copy_rate * len(delivered))))
+        originals = [login for login in delivered if login not in copiers]
+        programs = {
+            login: generate_program(random.Random(f"{seed}/{q}/{login}"), profile)
+            for login in originals
+        }
+        codes = {login: program.render() for login, program in programs.items()}
+
+        # Cada grupo tem um original e uma ou mais cópias dele
+        groups = {}
+        for login in sorted(copiers):
+            if not originals:
+                break
+            source = rng.choice(originals)
+            applied = [t for t in TRANSFORMATIONS if rng.random() < 0.5] or [rng.choice(TRANSFORMATIONS)]
+            codes[login] = plagiarize(programs[source], rng, applied)
+            groups.setdefault(source, []).append((login, applied))
+
+        for source, members in groups.items():
+            for (login_a, applied_a), (login_b, applied_b) in combinations(
+                [(source, [])] + members, 2
+            ):
+                both = [t for t in TRANSFORMATIONS if t in applied_a or t in applied_b]
+                planted[(q, *sorted((login_a, login_b)))] = both
+
+        for login, code in codes.items():
+            student_folder = os.path.join(submissions, login)
+            os.makedirs(student_folder, exist_ok=True)
+            with open(os.path.join(student_folder, f"q{q}_{login}.c"), "w", encoding="utf-8") as f:
+                f.write(code)
+
+    for pos, turma in enumerate(classes):
+        members = logins[pos :: len(classes)]
+        save_students_to_json(
+            [StudentSubmission(name=login, email=f"{login}@exemplo.com", login=login) for login in members],
+            os.path.join(folder, f"students_turma{turma}.json"),
+        )
+        ListMetadata(
+            class_name=f"TURMA {turma}",
+            list_name=os.path.basename(folder),
+            num_questions=questions,
+            score={},
+            language="c",
+        ).save_metadata_to_json(os.path.join(folder, f"metadata_turma{turma}.json"))
+    return planted
@@ -0,0 +1,142 @@
+import zlib
+
+# Tamanho dos k-gramas (em tokens da assinatura AST) e da janela do winnowing.
+# Qualquer trecho igual com pelo menos KGRAM + WINDOW - 1 tokens é detectado.
+KGRAM = 8
+WINDOW = 6
+# Documentos com menos impressões que isso (um arquivo que é quase só o
+# código base, depois de subtraído) contam como se tivessem esse tanto:
+# uma ou duas impressões em comum não viram 100% de cópia
+MIN_FINGERPRINTS = 10
+
+_MOD = (1 << 61) - 1
+_BASE = 1_000_003
+_TOKEN_CODES = {}
+
+
+def token_code(token):
+    # crc32 é estável entre execuções (hash() de str não é)
+    code = _TOKEN_CODES.get(token)
+    if code is None:
+        code = _TOKEN_CODES[token] = zlib.crc32(token.encode("utf-8")) + 1
+    return code
+
+
+def kgram_hashes(tokens, k=KGRAM):
+    """Hash de Karp-Rabin de cada k-grama, calculado de forma incremental."""
+    if len(tokens) < k:
+        return []
+    codes = [token_code(t) for t in tokens]
+    high = pow(_BASE, k - 1, _MOD)
+    value = 0
+    for code in codes[:k]:
+        value = (value * _BASE + code) % _MOD
+    hashes = [value]
+    for pos in range(k, len(codes)):
+        value = ((value - codes[pos - k] * high) * _BASE + codes[pos]) % _MOD
+        hashes.append(value)
+    return hashes
+
+
+def winnow(hashes, window=WINDOW):
+    """Seleciona o menor hash de cada janela (o mais à direita em empates).
+
+    Retorna a lista de (hash, posição) sem repetir a mesma seleção."""
+    if not hashes:
+        return []
+    if len(hashes) <= window:
+        pos = min(range(len(hashes)), key=lambda p: (hashes[p], -p))
+        return [(hashes[pos], pos)]
+
+    selected = []
+    last = -1
+    for start in range(len(hashes) - window + 1):
+        pos = start
+        for p in range(start + 1, start + window):
+            if hashes[p] <= hashes[pos]:
+                pos = p
+        if pos != last:
+            selected.append((hashes[pos], pos))
+            last = pos
+    return selected
+
+
+def fingerprints(tokens, k=KGRAM, window=WINDOW):
+    """Impressões do documento. Tokens None (trechos removidos, como o código
+    base) cortam o documento: nenhum k-grama atravessa o corte."""
+    if None not in tokens:
+        return {value for value, _ in winnow(kgram_hashes(tokens, k), window)}
+    result = set()
+    part = []
+    for token in [*tokens, None]:
+        if token is None:
+            result |= fingerprints(part, k, window)
+            part = []
+        else:
+            part.append(token)
+    return result
+
+
+class FingerprintIndex:
+    """Índice invertido impressão digital -> documentos."""
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+
+    def add(self, doc_id, doc_fingerprints):
+        self.documents[doc_id] = doc_fingerprints
+        for value in doc_fingerprints:
+            self.postings.setdefault(value, []).append(doc_id)
+
+    def shared_counts(self):
+        """Quantidade de impressões em comum de cada par que tem alguma."""
+        counts = {}
+        for docs in self.postings.values():
+            for pos, a in enumerate(docs):
+                for b in docs[pos + 1 :]:
+                    pair = (a, b)
+                    counts[pair] = counts.get(pair, 0) + 1
+        return counts
+
+
+def copy_percentage(shared, size, min_size=MIN_FINGERPRINTS):
+    """Percentual das `size` impressões de um documento que estão no outro."""
+    return round(100 * shared / max(size, min_size))
+
+
+def match_percentages(documents, k=KGRAM, window=WINDOW):
+    """documents: {id: tokens}. Gera (id1, pct1, id2, pct2), onde pct é a
+    fração das impressões de cada documento encontrada no outro (ver
+    copy_percentage)."""
+    index = FingerprintIndex()
+    for doc_id, tokens in documents.items():
+        doc_fingerprints = fingerprints(tokens, k, window)
+        if doc_fingerprints:
+            index.add(doc_id, doc_fingerprints)
+
+    for (a, b), shared in index.shared_counts().items():
+        yield (
+            a,
+            copy_percentage(shared, len(index.documents[a])),
+            b,
+            copy_percentage(shared, len(index.documents[b])),
+        )
+
+
+def winnowing_results(question_key, documents, copy_threshold=80):
+    """Pares da questão no mesmo formato de moss_handler.moss_script."""
+    results = []
+    for student1, percentage1, student2, percentage2 in match_percentages(documents):
+        if percentage1 >= copy_threshold or percentage2 >= copy_threshold:
+            results.append(
+                {
+                    "question": question_key,
+                    "student1": student1,
+                    "percentage1": percentage1,
+                    "student2": student2,
+                    "percentage2": percentage2,
+                }
+            )
+    results.sort(key=lambda r: (r["student1"], r["student2"]))
+    return results
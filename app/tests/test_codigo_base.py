@@ -0,0 +1,115 @@
+import compare_main as cm
+from services.winnowing import copy_percentage
+
+MODELO = """
+#include <stdio.h>
+
+int ler_vetor(int v[], int n) {
+    for (int i = 0; i < n; i++) {
+        if (scanf("%d", &v[i]) != 1) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+void imprimir_vetor(int v[], int n) {
+    for (int i = 0; i < n; i++) {
+        printf("%d ", v[i]);
+    }
+    printf("\\n");
+}
+
+int main() {
+    int n;
+    int v[100];
+    scanf("%d", &n);
+    if (!ler_vetor(v, n)) {
+        return 1;
+    }
+    /* RESOLVA AQUI */
+    imprimir_vetor(v, n);
+    return 0;
+}
+"""
+
+ORDENAR = """
+void ordenar(int v[], int n) {
+    for (int i = 0; i < n - 1; i++) {
+        int menor = i;
+        for (int j = i + 1; j < n; j++) {
+            if (v[j] < v[menor]) {
+                menor = j;
+            }
+        }
+        if (menor != i) {
+            int t = v[i];
+            v[i] = v[menor];
+            v[menor] = t;
+        }
+    }
+}
+"""
+
+SOMAR = """
+long somar_pares(int v[], int n) {
+    long total = 0;
+    int quantidade = 0;
+    while (n-- > 0) {
+        if (v[n] % 2 == 0) {
+            total += v[n] * 3 - 1;
+            quantidade++;
+        } else if (v[n] > 100) {
+            total -= v[n] / 7;
+        }
+    }
+    return quantidade > 0 ? total / quantidade : -1;
+}
+"""
+
+
+def questao(codigo):
+    codigo_limpo = cm.remover_hashtag(cm.remover_comentarios(codigo))
+    _, assinatura, funcoes = cm.processar_codigo(codigo_limpo)
+    return cm.Questao(1, assinatura, funcoes)
+
+
+def aluno(email, codigo):
+    novo = cm.Aluno(email, 1)
+    novo.addQuestao(questao(codigo))
+    return novo
+
+
+def resolver(funcao, chamada):
+    return funcao + MODELO.replace("/* RESOLVA AQUI */", chamada)
+
+
+def pares_winnowing(alunos):
+    modelo = cm.Caracteristicas(cm.ids_tokens(questao(MODELO).assinatura))
+    ngramas_base = cm.ngramas_do_codigo_base({0: set(modelo.ngramas)})
+    return {
+        frozenset((r["student1"], r["student2"]))
+        for r in cm.detectar_winnowing(alunos, ngramas_base=ngramas_base)
+    }
+
+
+def test_modelo_quase_sem_mudanca_nao_vira_copia():
+    # "modelo" entrega o modelo com uma linha a mais, que "soma" também
+    # escreveu: tirando o código base, sobram só as impressões dessa linha
+    linha = "if (n > 1) { v[0] = v[n - 1]; }"
+    alunos = [
+        aluno("modelo", MODELO.replace("/* RESOLVA AQUI */", linha)),
+        aluno("ordena1", resolver(ORDENAR, "ordenar(v, n);")),
+        aluno("ordena2", resolver(ORDENAR, "ordenar(v, n);")),
+        aluno("soma", resolver(SOMAR, linha)),
+    ]
+    pares = pares_winnowing(alunos)
+    assert not any("modelo" in par for par in pares)
+    assert frozenset(("ordena1", "ordena2")) in pares
+    assert frozenset(("ordena1", "soma")) not in pares
+
+
+def test_percentual_do_historico_com_poucas_impressoes():
+    # comparar_historico divide pelo menor dos dois arquivos
+    assert copy_percentage(1, min(1, 89)) < cm.LIMIAR_COPIA
+    assert copy_percentage(40, min(40, 50)) == 100
@@ -70,3 +70,14 @@ def list_questions(sheet_id, sheet_name):
     except Exception as e:
         log_error(f"Erro em pegar da planilha os nomes das questões: {str(e)}")
         
+
+
+def question_names(questions_dict):
+    """Nome estável de cada questão (número do beecrowd ou nome na planilha),
+    para reconhecer a mesma questão em listas de outros semestres."""
+    names = {}
+    for i, aliases in questions_dict.items():
+        # Os cinco primeiros são só variações do número da questão
+        specific = aliases[5:]
+        names[f"q{i}"] = specific[0] if specific else ""
+    return names
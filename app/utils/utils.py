@@ -21,29 +21,6 @@ def format_list_title(list_title):
         return f"LISTA {match.group(1).zfill(2)}"
     return list_title
 
-def get_available_turma_letters(service, semester, course_name_filter="PIF"):
-
-    try:
-        results = service.courses().list().execute()
-        courses = results.get("courses", []) or []
-        letters = set()
-
-        for c in courses:
-            name = c.get("name", "") or ""
-            if semester in name and course_name_filter.upper() in name.upper():
-                m = re.search(r'\bTURMA\s*([A-Z])\b', name.upper())
-                if m:
-                    letters.add(m.group(1))
-
-        found = sorted(letters)
-        if not found:
-            print(f"Nenhuma turma encontrada para {semester}.\n")
-        else:
-            print(f"Turmas encontradas no semestre {semester}: {', '.join(found)}")
-        return found
-    except Exception:
-        return ["A", "B"]
-    
 def get_available_turmas_from_folder(downloads_path: str):
 
     try: